@@ -0,0 +1,308 @@
+import argparse
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from db_logger import log_to_db
+from parquet_dataset import day_of_file, file_signature, load_state, save_state
+from parquet_store import ARCHIVE_ROOT, DEFAULT_PARQUET_FOLDER, read_fetched_dates, trade_dates
+from stock_query import day_files_in_range, query, query_day_files
+from ticker_registry import select_tickers
+
+# 수정 계수 폴더 (factors.parquet + 반영한 일별 파일 상태)
+DEFAULT_ADJUSTMENT_FOLDER = os.path.join(ARCHIVE_ROOT, "adjustments")
+FACTORS_FILE_NAME = "factors.parquet"
+
+# 배당 계수(1 - 배당금 / 전일 종가)에 쓸 전일 종가를 찾는 기간 (달력 일수, 연휴 포함)
+PREVIOUS_CLOSE_DAYS = 14
+
+# 수정 주가 결과를 메모리에 보관할 조회 조건 수 (가장 오래 안 쓴 것부터 버림)
+CACHE_ENTRIES = 32
+
+ADJUSTED_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+PRICE_COLUMNS = ["Open", "High", "Low", "Close"]
+
+# 종목별 기업 행위 (배당락일/분할일 단위) 와 누적 계수
+#   - price_factor / volume_factor: 그날 하루의 행위로 그 이전 가격/거래량에 곱할 값
+#   - cum_price_factor / cum_volume_factor: 그날 이후(포함) 모든 행위의 곱 = 이전 행위일 ~ 그날 전날 구간에 곱할 값
+FACTOR_SCHEMA = pa.schema([
+    pa.field("Ticker", pa.string(), nullable=False),
+    pa.field("Date", pa.date32(), nullable=False),
+    pa.field("Dividends", pa.float64()),
+    pa.field("Stock Splits", pa.float64()),
+    pa.field("previous_close", pa.float64()),
+    pa.field("price_factor", pa.float64()),
+    pa.field("volume_factor", pa.float64()),
+    pa.field("cum_price_factor", pa.float64()),
+    pa.field("cum_volume_factor", pa.float64()),
+])
+
+# 조회 조건 → (버전, 수정 주가 테이블), 계수 파일 → (파일 상태, 테이블)
+_adjusted_cache = OrderedDict()
+_factor_cache = {}
+
+
+def factors_path(folder=DEFAULT_ADJUSTMENT_FOLDER):
+    return os.path.join(folder, FACTORS_FILE_NAME)
+
+
+def load_factors(folder=DEFAULT_ADJUSTMENT_FOLDER):
+    """ 계수 테이블 (파일이 바뀌었을 때만 다시 읽음, 없으면 빈 테이블) """
+    file_path = factors_path(folder)
+    if not os.path.exists(file_path):
+        return FACTOR_SCHEMA.empty_table()
+
+    signature = file_signature(file_path)
+    cached = _factor_cache.get(file_path)
+    if cached is None or cached[0] != signature:
+        cached = (signature, pq.read_table(file_path).cast(FACTOR_SCHEMA))
+        _factor_cache[file_path] = cached
+    return cached[1]
+
+
+def find_actions(day_files):
+    """ 일별 파일들에서 배당/분할이 있는 행만 (Ticker, 거래일, Dividends, Stock Splits) 데이터프레임으로 추출 """
+    table = query_day_files(day_files, None, ["Date", "Ticker", "Dividends", "Stock Splits"])
+    has_action = pc.or_(pc.not_equal(pc.fill_null(table.column("Dividends"), 0.0), 0.0),
+                        pc.not_equal(pc.fill_null(table.column("Stock Splits"), 0.0), 0.0))
+    table = table.filter(has_action)
+    return pd.DataFrame({
+        "Ticker": table.column("Ticker").combine_chunks().dictionary_decode().to_pandas(),
+        "Date": trade_dates(table).to_pandas(),
+        "Dividends": table.column("Dividends").to_pandas().fillna(0.0),
+        "Stock Splits": table.column("Stock Splits").to_pandas().fillna(0.0),
+    })
+
+
+def previous_closes(actions, root=DEFAULT_PARQUET_FOLDER):
+    """ 각 행위일 직전 거래일의 종가 (배당 계수 계산용, 찾지 못하면 NaN) """
+    closes = pd.Series(np.nan, index=actions.index)
+    dividends = actions[actions["Dividends"] != 0]
+    if dividends.empty:
+        return closes
+
+    history = query(sorted(set(dividends["Ticker"])), dividends["Date"].min() - timedelta(days=PREVIOUS_CLOSE_DAYS),
+                    dividends["Date"].max(), ["Close"], root=root)
+    history = pd.DataFrame({
+        "Ticker": history.column("Ticker").combine_chunks().dictionary_decode().to_pandas().astype(str),
+        "day": pd.to_datetime(trade_dates(history).to_pandas()),
+        "Close": history.column("Close").to_pandas(),
+    }).sort_values("day", kind="stable")
+
+    # 종목별로 행위일보다 앞선(같은 날 제외) 마지막 거래일의 종가
+    events = pd.DataFrame({"row": dividends.index, "Ticker": dividends["Ticker"].astype(str).values,
+                           "day": pd.to_datetime(dividends["Date"]).values}).sort_values("day", kind="stable")
+    matched = pd.merge_asof(events, history, on="day", by="Ticker", allow_exact_matches=False)
+    closes.loc[matched["row"].to_numpy()] = matched["Close"].to_numpy()
+    return closes
+
+
+def factor_vectors(events):
+    """ 종목별 행위 목록에서 하루치 계수와 누적 계수(그날 이후 행위의 곱) 계산 """
+    events = events.sort_values(["Ticker", "Date"], kind="stable").reset_index(drop=True)
+    splits = events["Stock Splits"].where(events["Stock Splits"] > 0, 1.0)
+    dividend_factor = (1 - events["Dividends"] / events["previous_close"]).where(events["Dividends"] != 0, 1.0)
+
+    events["price_factor"] = dividend_factor.fillna(1.0) / splits
+    events["volume_factor"] = splits
+
+    # 누적 곱을 뒤에서부터 계산 (종목별)
+    reverse = events.iloc[::-1]
+    events["cum_price_factor"] = reverse.groupby("Ticker", sort=False)["price_factor"].cumprod().iloc[::-1]
+    events["cum_volume_factor"] = reverse.groupby("Ticker", sort=False)["volume_factor"].cumprod().iloc[::-1]
+    return events
+
+
+def update_factors(root=DEFAULT_PARQUET_FOLDER, folder=DEFAULT_ADJUSTMENT_FOLDER, full=False):
+    """
+    새로 생기거나 바뀐 일별 파일의 배당/분할로 계수 갱신 (증분)
+
+    바뀐 날짜의 기존 행위를 새로 읽은 행위로 바꾸고, 행위가 추가/삭제된 종목의 계수만 다시 계산한다.
+    가격 데이터는 다시 받거나 다시 쓰지 않는다. (수정 주가는 조회 시 계수를 곱해서 만듦)
+
+    :return: 계수를 다시 계산한 종목 리스트
+    """
+    start_time = datetime.now()
+    day_files = day_files_in_range(root=root)
+    state = {} if full else load_state(folder)
+    sources = state.get("sources", {})
+    signatures = {file_path: file_signature(file_path) for file_path in day_files}
+    changed_files = [file_path for file_path in day_files if sources.get(file_path) != signatures[file_path]]
+
+    if not changed_files:
+        print(f"[INFO] {folder} 최신 상태 (일별 파일 {len(day_files)}개 반영됨)")
+        return []
+
+    try:
+        existing = (FACTOR_SCHEMA.empty_table() if full else load_factors(folder)).to_pandas()
+        actions = find_actions(changed_files)
+        actions["previous_close"] = previous_closes(actions, root)
+
+        # 바뀐 날짜에 있던 기존 행위는 새로 읽은 값으로 교체 (행위가 정정/삭제된 경우 포함)
+        changed_days = set(trade_dates(query_day_files(changed_files, None, ["Date", "Ticker"])).to_pylist())
+        replaced = existing[existing["Date"].isin(changed_days)]
+        existing = existing[~existing["Date"].isin(changed_days)]
+        affected = sorted(set(actions["Ticker"]) | set(replaced["Ticker"]))
+
+        events = pd.concat([existing[existing["Ticker"].isin(affected)], actions], ignore_index=True)
+        updated = factor_vectors(events[["Ticker", "Date", "Dividends", "Stock Splits", "previous_close"]])
+        factors = pd.concat([existing[~existing["Ticker"].isin(affected)], updated], ignore_index=True)
+        factors = factors.sort_values(["Ticker", "Date"], kind="stable")
+
+        os.makedirs(folder, exist_ok=True)
+        factors_file = factors_path(folder)
+        pq.write_table(pa.Table.from_pandas(factors, schema=FACTOR_SCHEMA, preserve_index=False), factors_file + ".tmp")
+        os.replace(factors_file + ".tmp", factors_file)
+
+        sources.update({file_path: signatures[file_path] for file_path in changed_files})
+        save_state(folder, {"root": root, "sources": sources})
+    except Exception as e:
+        print(f"[ERROR] 수정 계수 갱신 실패: {e}")
+        log_to_db("수정 계수", "ERROR", "ALL", f"{folder} 수정 계수 갱신 실패: {e}", start_time=start_time,
+                  end_time=datetime.now(), result="실패")
+        raise
+
+    summary = f"일별 파일 {len(changed_files)}개 반영, 행위 {len(actions)}건, 계수 갱신 종목 {len(affected)}개"
+    print(f"[INFO] {summary}")
+    log_to_db("수정 계수", "INFO", "ALL", summary, start_time=start_time, end_time=datetime.now(), result="성공")
+    return affected
+
+
+def as_of_dates(day_files):
+    """
+    (종목, 거래일)별로 가격에 이미 반영된 행위의 기준일 데이터프레임 (Ticker, day, as_of)
+
+    yfinance 결과(auto_adjust)는 수집 시점까지의 배당/분할이 이미 반영된 가격이므로, 수집일까지의 행위는 다시 곱하지 않는다.
+    (그날 바로 수집한 행은 사실상 원 가격, 백필한 행은 백필 시점까지 수정된 가격)
+    수집일은 일별 파일 footer 에 종목별로 기록된 값을 쓰고(파일 수정 시각은 다시 쓰기/복사로 바뀌므로 쓰지 않음),
+    기록이 없는 이전 파일의 행은 거래일을 기준일로 본다. (거래일 이후 행위를 모두 곱함)
+    """
+    records = []
+    for file_path in day_files:
+        day = day_of_file(file_path)
+        for ticker, fetched in read_fetched_dates(pq.read_metadata(file_path).metadata).items():
+            records.append((ticker, day, max(day, datetime.strptime(fetched, "%Y-%m-%d").date())))
+    return pd.DataFrame(records, columns=["Ticker", "day", "as_of"])
+
+
+def apply_factors(table, factors, as_of=None):
+    """
+    STOCK_SCHEMA 테이블(OHLCV)에 종목별 누적 계수를 곱한 수정 주가 테이블 반환
+
+    각 행은 기준일(as_of: as_of_dates() 결과, 없는 (종목, 거래일)은 그 거래일)보다 뒤에 있는 첫 행위의 누적 계수를 곱한다.
+    (이후 행위가 없으면 그대로)
+    """
+    if table.num_rows == 0 or factors.num_rows == 0:
+        return table
+
+    tickers = table.column("Ticker").combine_chunks().dictionary_decode().to_numpy(zero_copy_only=False)
+    days = pd.DataFrame({"Ticker": tickers, "day": trade_dates(table).to_pylist()})
+    if as_of is not None and len(as_of):
+        days = days.merge(as_of, on=["Ticker", "day"], how="left")   # how="left" 는 왼쪽 행 순서 유지
+        days = days["as_of"].fillna(days["day"])
+    else:
+        days = days["day"]
+    days = days.to_numpy().astype("datetime64[D]")
+    price_factor = np.ones(table.num_rows)
+    volume_factor = np.ones(table.num_rows)
+
+    factor_tickers = factors.column("Ticker").to_numpy(zero_copy_only=False)
+    for ticker in np.intersect1d(np.unique(tickers), factor_tickers):
+        events = factors.filter(pc.equal(factors.column("Ticker"), ticker))
+        event_days = events.column("Date").to_numpy(zero_copy_only=False).astype("datetime64[D]")
+        cum_price = np.append(events.column("cum_price_factor").to_numpy(zero_copy_only=False), 1.0)
+        cum_volume = np.append(events.column("cum_volume_factor").to_numpy(zero_copy_only=False), 1.0)
+
+        rows = np.flatnonzero(tickers == ticker)
+        position = np.searchsorted(event_days, days[rows], side="right")
+        price_factor[rows] = cum_price[position]
+        volume_factor[rows] = cum_volume[position]
+
+    for name in PRICE_COLUMNS:
+        if name in table.column_names:
+            index = table.column_names.index(name)
+            table = table.set_column(index, name, pc.multiply(table.column(name), pa.array(price_factor)))
+    if "Volume" in table.column_names:
+        index = table.column_names.index("Volume")
+        volume = pc.round(pc.multiply(pc.cast(table.column("Volume"), pa.float64()), pa.array(volume_factor)))
+        table = table.set_column(index, "Volume", pc.cast(volume, pa.int64()))
+    return table
+
+
+def archive_version(day_files):
+    """ 조회 기간 일별 파일들의 (개수, 최종 수정 시각) - 가격 데이터가 바뀌었는지 확인용 """
+    return len(day_files), max((os.stat(file_path).st_mtime_ns for file_path in day_files), default=0)
+
+
+def adjusted(tickers=None, from_date=None, to_date=None, columns=None, root=DEFAULT_PARQUET_FOLDER,
+             folder=DEFAULT_ADJUSTMENT_FOLDER):
+    """
+    수정 주가 조회 (stock_query.query 결과에 계수를 곱함, 처음 조회할 때 계산하고 결과를 캐시)
+
+    각 행에는 그 행을 수집한 뒤에 생긴 배당/분할의 계수만 곱한다. (as_of_dates 참고)
+
+    같은 조회 조건이면 계수 파일과 기간 내 일별 파일이 바뀌지 않은 동안 캐시된 결과를 돌려준다.
+
+    :param columns: 값 컬럼 (None 이면 Open, High, Low, Close, Volume)
+    :return: (Ticker, Date) 순으로 정렬된 Arrow 테이블
+    """
+    columns = list(columns or ADJUSTED_COLUMNS)
+    key = (tuple(sorted(tickers)) if tickers else None, from_date, to_date, tuple(columns), root, folder)
+    factors_file = factors_path(folder)
+    day_files = day_files_in_range(from_date, to_date, root)
+    version = (file_signature(factors_file) if os.path.exists(factors_file) else None, archive_version(day_files))
+
+    cached = _adjusted_cache.get(key)
+    if cached is not None and cached[0] == version:
+        _adjusted_cache.move_to_end(key)
+        return cached[1]
+
+    table = apply_factors(query(tickers, from_date, to_date, columns, root=root), load_factors(folder),
+                          as_of_dates(day_files))
+    _adjusted_cache[key] = (version, table)
+    _adjusted_cache.move_to_end(key)
+    while len(_adjusted_cache) > CACHE_ENTRIES:
+        _adjusted_cache.popitem(last=False)
+    return table
+
+
+def adjusted_df(tickers=None, from_date=None, to_date=None, columns=None, root=DEFAULT_PARQUET_FOLDER,
+                folder=DEFAULT_ADJUSTMENT_FOLDER):
+    """ adjusted() 결과를 pandas 데이터프레임으로 반환 """
+    return adjusted(tickers, from_date, to_date, columns, root, folder).to_pandas()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="배당/분할 수정 계수 갱신 및 수정 주가 조회 프로그램")
+    parser.add_argument("--root", type=str, default=DEFAULT_PARQUET_FOLDER, help="일별 Parquet 루트 폴더")
+    parser.add_argument("--full", action="store_true", help="이전 상태를 무시하고 계수 전체 다시 계산")
+    parser.add_argument("--tickers", nargs="+", help="수정 주가를 조회할 종목 코드 (없으면 계수 갱신만)")
+    parser.add_argument("--from_date", type=str, help="시작 날짜 (예: 2020-01-01)")
+    parser.add_argument("--to_date", type=str, help="종료 날짜 (예: 2025-01-31)")
+    parser.add_argument("--output", type=str, help="결과 저장 파일 (.csv, 없으면 화면 출력)")
+    args = parser.parse_args()
+
+    update_factors(root=args.root, full=args.full)
+
+    if args.tickers:
+        from_date = datetime.strptime(args.from_date, "%Y-%m-%d").date() if args.from_date else None
+        to_date = datetime.strptime(args.to_date, "%Y-%m-%d").date() if args.to_date else None
+        result = adjusted_df(select_tickers(args.tickers), from_date, to_date, root=args.root)
+        if args.output:
+            os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+            result.to_csv(args.output, index=False)
+        else:
+            with pd.option_context("display.max_rows", 20, "display.width", 200):
+                print(result)
+
+
+"""
+# 새 일별 파일의 배당/분할로 계수 갱신
+python adjusted_prices.py
+# NVDA 수정 주가 조회 (2024-06-10 10:1 분할 전에 수집한 가격은 1/10 로 조정됨)
+python adjusted_prices.py --tickers NVDA --from_date 2024-05-01 --to_date 2024-06-30
+"""
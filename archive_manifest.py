@@ -0,0 +1,332 @@
+import argparse
+import hashlib                              # 파일 체크섬
+import json                                 # CSV 종목별 수집일
+import os
+import sqlite3                              # 단일 파일 manifest (추가 설치 불필요, 커밋 단위로 안전하게 기록)
+from contextlib import contextmanager
+from datetime import date, datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from parquet_store import ARCHIVE_ROOT, DEFAULT_CSV_FOLDER, DEFAULT_PARQUET_FOLDER, STOCK_SCHEMA, to_utc_timestamps, \
+    trade_dates
+
+# 일별 파일 목록/상태를 기록하는 manifest (csv_files.log / parquet_files.log 대신 사용)
+# 보관 루트(ARCHIVE_ROOT) 기준 - 다른 폴더에서 실행해도 빈 manifest 를 새로 만들지 않음
+# 파일 경로는 절대 경로로 기록 (예전 manifest 의 상대 경로는 manifest 가 있는 폴더 기준으로 해석)
+DEFAULT_MANIFEST_FILE = os.path.join(ARCHIVE_ROOT, "manifest.sqlite")
+
+# 변환(convert_status) / 적재(load_status) 상태
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+STATS_BATCH_ROWS = 100_000
+
+migrated_manifests = set()          # 이번 프로세스에서 상대 경로를 절대 경로로 바꾼 manifest
+
+
+@contextmanager
+def open_manifest(manifest_file=DEFAULT_MANIFEST_FILE):
+    """
+    manifest 연결을 열고 테이블이 없으면 생성 (정상 종료 시 커밋, 오류 시 롤백)
+
+    with open_manifest() as conn:
+        ...
+    """
+    conn = sqlite3.connect(manifest_file, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL;")   # 읽는 쪽이 쓰는 쪽을 기다리지 않도록
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS day_files (
+                day TEXT PRIMARY KEY,           -- 거래일 (YYYY-MM-DD)
+                csv_path TEXT,
+                parquet_path TEXT,
+                rows INTEGER,
+                tickers TEXT,                   -- 쉼표로 구분한 종목 목록 (정렬)
+                min_date TEXT,                  -- 파일 안의 최소/최대 거래일
+                max_date TEXT,
+                checksum TEXT,                  -- Parquet 파일 sha256
+                fetched TEXT,                   -- CSV 종목별 수집일 JSON {종목: YYYY-MM-DD} (Parquet 변환 시 footer 로 옮김)
+                convert_status TEXT,
+                load_status TEXT,
+                error TEXT,
+                updated_at TEXT
+            );
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_day_files_convert ON day_files (convert_status);")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_day_files_load ON day_files (load_status);")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_day_files_parquet_path ON day_files (parquet_path);")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_day_files_csv_path ON day_files (csv_path);")
+        if manifest_file not in migrated_manifests:
+            # 예전 manifest 는 실행 위치(= manifest 가 있는 폴더) 기준 상대 경로로 기록했음
+            prefix = os.path.dirname(os.path.abspath(manifest_file)) + os.sep
+            for column in ("csv_path", "parquet_path"):
+                conn.execute(f"UPDATE day_files SET {column} = ? || {column} "
+                             f"WHERE {column} IS NOT NULL AND {column} NOT LIKE '/%';", (prefix,))
+            # 수집일 컬럼이 없던 manifest 에 컬럼 추가
+            if "fetched" not in {row[1] for row in conn.execute("PRAGMA table_info(day_files);")}:
+                conn.execute("ALTER TABLE day_files ADD COLUMN fetched TEXT;")
+            migrated_manifests.add(manifest_file)
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def day_of_path(file_path):
+    """ 일별 파일명(stock_data_YYYY-MM-DD.csv/.parquet)에서 날짜 추출 (형식이 다르면 None) """
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    try:
+        return datetime.strptime(name.replace("stock_data_", ""), "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def file_checksum(file_path):
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHECKSUM_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def manifest_path(file_path):
+    """ manifest 에 기록/조회할 경로 (실행 위치와 관계없도록 절대 경로) """
+    return os.path.abspath(file_path)
+
+
+def stats_table(table):
+    """
+    통계용 Date(UTC)/Trade Date/Ticker(문자열) 테이블
+
+    이전 형식 파일(Date 문자열, 일반 문자열 Ticker)도 읽기만 해서 거래일을 계산한다. (normalize_table 은 Ticker ID 를
+    찾으므로 쓰지 않음 - 통계 계산이 종목 목록에 의존하지 않도록)
+    """
+    tickers = table.column("Ticker").combine_chunks()
+    if pa.types.is_dictionary(tickers.type):
+        tickers = tickers.dictionary_decode()
+    tickers = pc.utf8_trim_whitespace(tickers)
+    columns = {"Ticker": tickers}
+    if "Trade Date" in table.column_names:
+        columns["Trade Date"] = table.column("Trade Date")
+    elif table.schema.field("Date").type == STOCK_SCHEMA.field("Date").type:
+        columns["Date"] = table.column("Date")
+    else:
+        dates = to_utc_timestamps(table.column("Date").to_pandas(), pd.Series(tickers.to_pylist()))
+        columns["Date"] = pa.array(dates, type=STOCK_SCHEMA.field("Date").type)
+    return pa.table(columns)
+
+
+def parquet_file_stats(parquet_file):
+    """ 일별 Parquet 파일의 행 수, 종목 목록, 최소/최대 거래일, 체크섬 (Date/Trade Date/Ticker 컬럼만 배치 단위로 읽음) """
+    rows, tickers, min_date, max_date = 0, set(), None, None
+    parquet = pq.ParquetFile(parquet_file)
+    columns = [name for name in ("Date", "Trade Date", "Ticker") if name in parquet.schema_arrow.names]
+    for batch in parquet.iter_batches(batch_size=STATS_BATCH_ROWS, columns=columns):
+        if not batch.num_rows:
+            continue
+        table = stats_table(pa.Table.from_batches([batch]))
+        days = trade_dates(table)
+        rows += table.num_rows
+        tickers.update(pc.unique(table.column("Ticker").combine_chunks()).to_pylist())
+        min_date = min(filter(None, [min_date, pc.min(days).as_py()]))
+        max_date = max(filter(None, [max_date, pc.max(days).as_py()]))
+    return {
+        "rows": rows,
+        "tickers": ",".join(sorted(tickers)),
+        "min_date": str(min_date) if min_date else None,
+        "max_date": str(max_date) if max_date else None,
+        "checksum": file_checksum(parquet_file),
+    }
+
+
+def record_csv(csv_path, fetched=None, merge_existing=False, manifest_file=DEFAULT_MANIFEST_FILE):
+    """
+    수집한 CSV 기록 → Parquet 변환 대기, DB 적재 대기
+
+    :param fetched: CSV 에 쓴 종목별 수집일 {종목: 'YYYY-MM-DD'} (None 이면 기록된 값 유지, 예: scan_archive)
+    :param merge_existing: True 이면 기존 CSV 에서 유지한 종목의 수집일은 그대로 두고 fetched 종목만 바꿈
+    """
+    day = day_of_path(csv_path)
+    if day is None:
+        return
+    csv_path = manifest_path(csv_path)
+    with open_manifest(manifest_file) as conn:
+        if fetched is not None and merge_existing:
+            row = conn.execute("SELECT fetched FROM day_files WHERE day = ?;", (str(day),)).fetchone()
+            fetched = {**(json.loads(row[0]) if row and row[0] else {}), **fetched}
+        conn.execute("""
+            INSERT INTO day_files (day, csv_path, fetched, convert_status, load_status, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (day) DO UPDATE SET
+                csv_path = excluded.csv_path, fetched = COALESCE(excluded.fetched, day_files.fetched),
+                convert_status = excluded.convert_status, load_status = excluded.load_status, error = NULL,
+                updated_at = excluded.updated_at;
+        """, (str(day), csv_path, json.dumps(fetched, sort_keys=True) if fetched is not None else None, STATUS_PENDING,
+              STATUS_PENDING, datetime.now().isoformat()))
+
+
+def csv_fetched_dates(csv_path, manifest_file=DEFAULT_MANIFEST_FILE):
+    """ CSV 의 종목별 수집일 {종목: 'YYYY-MM-DD'} (기록이 없는 이전 CSV 는 빈 dict) """
+    if not os.path.exists(manifest_file):
+        return {}
+    with open_manifest(manifest_file) as conn:
+        row = conn.execute("SELECT fetched FROM day_files WHERE csv_path = ?;", (manifest_path(csv_path),)).fetchone()
+    return json.loads(row[0]) if row and row[0] else {}
+
+
+def record_parquet(parquet_path, stats=None, csv_path=None, manifest_file=DEFAULT_MANIFEST_FILE):
+    """
+    저장/변환이 끝난 Parquet 기록 → 변환 완료, DB 적재 대기
+
+    :param stats: parquet_file_stats() 결과 (없으면 여기서 계산, 병렬 변환에서는 작업 프로세스가 미리 계산해 전달)
+    """
+    day = day_of_path(parquet_path)
+    if day is None:
+        return
+    stats = stats or parquet_file_stats(parquet_path)
+    parquet_path = manifest_path(parquet_path)
+    csv_path = manifest_path(csv_path) if csv_path else None
+    with open_manifest(manifest_file) as conn:
+        conn.execute("""
+            INSERT INTO day_files (day, csv_path, parquet_path, rows, tickers, min_date, max_date, checksum,
+                                   convert_status, load_status, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (day) DO UPDATE SET
+                csv_path = COALESCE(excluded.csv_path, day_files.csv_path), parquet_path = excluded.parquet_path,
+                rows = excluded.rows, tickers = excluded.tickers, min_date = excluded.min_date,
+                max_date = excluded.max_date, checksum = excluded.checksum, convert_status = excluded.convert_status,
+                load_status = excluded.load_status, error = NULL, updated_at = excluded.updated_at;
+        """, (str(day), csv_path, parquet_path, stats["rows"], stats["tickers"], stats["min_date"], stats["max_date"],
+              stats["checksum"], STATUS_DONE, STATUS_PENDING, datetime.now().isoformat()))
+
+
+def mark_status(file_path, stage, status, error=None, manifest_file=DEFAULT_MANIFEST_FILE):
+    """
+    파일(CSV 또는 Parquet 경로)의 변환/적재 상태 변경
+
+    :param stage: 'convert' 또는 'load'
+    :param status: STATUS_PENDING / STATUS_DONE / STATUS_FAILED
+    """
+    column = {"convert": "convert_status", "load": "load_status"}[stage]
+    with open_manifest(manifest_file) as conn:
+        conn.execute(f"""
+            UPDATE day_files SET {column} = ?, error = ?, updated_at = ?
+            WHERE parquet_path = ? OR csv_path = ?;
+        """, (status, error, datetime.now().isoformat(), manifest_path(file_path), manifest_path(file_path)))
+
+
+def pending_conversions(manifest_file=DEFAULT_MANIFEST_FILE, retry_failed=True):
+    """ Parquet 변환이 끝나지 않은 CSV 경로 목록 (날짜순) """
+    statuses = (STATUS_PENDING, STATUS_FAILED) if retry_failed else (STATUS_PENDING,)
+    with open_manifest(manifest_file) as conn:
+        rows = conn.execute(f"""
+            SELECT csv_path FROM day_files
+            WHERE convert_status IN ({", ".join("?" * len(statuses))}) AND csv_path IS NOT NULL
+            ORDER BY day;
+        """, statuses).fetchall()
+    return [csv_path for (csv_path,) in rows]
+
+
+def pending_loads(manifest_file=DEFAULT_MANIFEST_FILE, retry_failed=True):
+    """ 변환은 끝났지만 DB 적재가 끝나지 않은 Parquet 경로 목록 (날짜순) """
+    statuses = (STATUS_PENDING, STATUS_FAILED) if retry_failed else (STATUS_PENDING,)
+    with open_manifest(manifest_file) as conn:
+        rows = conn.execute(f"""
+            SELECT parquet_path FROM day_files
+            WHERE convert_status = ? AND load_status IN ({", ".join("?" * len(statuses))})
+            ORDER BY day;
+        """, (STATUS_DONE,) + statuses).fetchall()
+    return [parquet_path for (parquet_path,) in rows]
+
+
+def tickers_by_day(from_date, to_date, manifest_file=DEFAULT_MANIFEST_FILE):
+    """ 기간 내 Parquet 파일이 있는 날짜별 종목 목록 {날짜: set(종목)} (파일을 열지 않고 manifest만 조회) """
+    if not os.path.exists(manifest_file):
+        return {}
+    with open_manifest(manifest_file) as conn:
+        rows = conn.execute("""
+            SELECT day, tickers FROM day_files
+            WHERE day BETWEEN ? AND ? AND convert_status = ? AND tickers IS NOT NULL;
+        """, (str(from_date), str(to_date), STATUS_DONE)).fetchall()
+    return {date.fromisoformat(day): set(tickers.split(",")) if tickers else set() for day, tickers in rows}
+
+
+def scan_archive(csv_root=DEFAULT_CSV_FOLDER, parquet_root=DEFAULT_PARQUET_FOLDER, manifest_file=DEFAULT_MANIFEST_FILE):
+    """
+    csv/, parquet/ 폴더를 한 번 훑어 manifest 생성/보완 (처음 도입할 때 또는 파일을 직접 옮긴 뒤 사용)
+
+    manifest에 없는 CSV는 변환 대기, Parquet는 변환 완료 + 적재 대기로 기록하고,
+    이미 있는 Parquet는 체크섬이 달라졌을 때만 통계를 다시 계산한다.
+    """
+    with open_manifest(manifest_file) as conn:
+        known = {day: (csv_path, parquet_path, checksum) for day, csv_path, parquet_path, checksum
+                 in conn.execute("SELECT day, csv_path, parquet_path, checksum FROM day_files;")}
+
+    known_days = set(known)
+    updated = 0
+    for root_folder, extension in ((csv_root, ".csv"), (parquet_root, ".parquet")):
+        for root, _, files in os.walk(root_folder):
+            for file in sorted(files):
+                file_path = manifest_path(os.path.join(root, file))
+                day = day_of_path(file_path)
+                if day is None or not file.endswith(extension):
+                    continue
+
+                csv_path, parquet_path, checksum = known.get(str(day), (None, None, None))
+                if extension == ".csv":
+                    if csv_path is None and parquet_path is None:
+                        record_csv(file_path, manifest_file=manifest_file)
+                elif parquet_path != file_path or checksum != file_checksum(file_path):
+                    record_parquet(file_path, csv_path=csv_path, manifest_file=manifest_file)
+                    updated += str(day) in known_days
+                known[str(day)] = (csv_path or (file_path if extension == ".csv" else None),
+                                   file_path if extension == ".parquet" else parquet_path, checksum)
+
+    added = len(set(known) - known_days)
+    print(f"[INFO] manifest 갱신: 추가 {added}개, 변경 {updated}개 ({manifest_file})")
+    return added, updated
+
+
+def status_counts(manifest_file=DEFAULT_MANIFEST_FILE):
+    """ 변환/적재 상태별 파일 수 {(convert_status, load_status): 개수} """
+    with open_manifest(manifest_file) as conn:
+        rows = conn.execute("""
+            SELECT convert_status, load_status, COUNT(*) FROM day_files
+            GROUP BY convert_status, load_status ORDER BY convert_status, load_status;
+        """).fetchall()
+    return {(convert_status, load_status): count for convert_status, load_status, count in rows}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="일별 파일 manifest 관리 프로그램")
+    parser.add_argument("--manifest", type=str, default=DEFAULT_MANIFEST_FILE, help="manifest 파일 경로")
+    parser.add_argument("--scan", action="store_true", help="csv/, parquet/ 폴더를 훑어 manifest 생성/보완")
+    parser.add_argument("--reset_load", action="store_true", help="모든 파일을 DB 적재 대기로 되돌림 (DB 재적재용)")
+    args = parser.parse_args()
+
+    if args.scan:
+        scan_archive(manifest_file=args.manifest)
+
+    if args.reset_load:
+        with open_manifest(args.manifest) as conn:
+            conn.execute("UPDATE day_files SET load_status = ? WHERE convert_status = ?;", (STATUS_PENDING, STATUS_DONE))
+
+    for (convert_status, load_status), count in status_counts(args.manifest).items():
+        print(f"변환 {convert_status} / 적재 {load_status}: {count}개")
+
+
+"""
+# 기존 csv/, parquet/ 파일로 manifest 만들기 (처음 한 번)
+python archive_manifest.py --scan
+# 상태별 파일 수 확인
+python archive_manifest.py
+# DB를 새로 만든 뒤 전체 재적재 대기로 되돌리기
+python archive_manifest.py --reset_load
+"""
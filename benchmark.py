@@ -0,0 +1,388 @@
+import argparse
+import contextlib                           # 단계 실행 중 화면 출력 숨김
+import glob
+import json                                 # 결과 저장 형식
+import multiprocessing                      # 단계마다 새 프로세스 (단계별 최대 메모리 측정)
+import os
+import platform
+import queue
+import resource                             # 최대 RSS (/proc 가 없을 때 ru_maxrss)
+import shutil
+import tempfile
+import time
+import types
+import zlib                                 # 종목 코드 → 고정 난수 시드
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+# 벤치마크 규모 (종목 수 x 달력 일수)
+DEFAULT_TICKER_COUNTS = [100, 1000, 10000]
+DEFAULT_DAY_COUNTS = [1, 30, 365]
+BENCH_FROM_DATE = datetime(2024, 1, 2).date()   # 첫날이 거래일이 되도록 (1일 벤치마크도 데이터 1일치)
+
+# 측정 단계 (순서대로 실행, 앞 단계가 만든 파일을 다음 단계가 사용)
+#   - fetch_stock_data:          가상 데이터 소스로 수집 루프만 실행 (응답은 작업 폴더의 cache/history 에 저장, 파일 저장은 건너뜀)
+#   - fetch_cached:              같은 수집을 응답 캐시에서만 다시 실행 (네트워크/데이터 소스 호출 없음)
+#   - save_csv:                  하루치 데이터프레임 → csv/YYYY/MM/ 저장
+#   - convert_csv_to_parquet:    CSV → Parquet 변환 (--jobs)
+#   - load_csv_to_db:            CSV → stock_data COPY/upsert (이전 pgfutter 적재 단계)
+#   - process_parquet:           Parquet → stock_data 적재
+STAGES = ["fetch_stock_data", "fetch_cached", "save_csv", "convert_csv_to_parquet", "load_csv_to_db", "process_parquet"]
+
+DEFAULT_OUTPUT = "bench_output.json"
+
+# 기준 결과 대비 이 배수 이상 느려지면 회귀로 표시
+REGRESSION_RATIO = 1.2
+
+SYNTHETIC_TIMEZONES = {".KS": "Asia/Seoul", ".KQ": "Asia/Seoul"}
+
+# 벤치마크 테이블(stock_data, 로그 테이블)을 만들 스키마 (운영 테이블이 있는 public 과 분리, STOCK_DB_SCHEMA 로 지정)
+BENCH_SCHEMA = "stock_bench"
+
+# 벤치마크를 허용하는 DB 호스트 (그 밖에는 / 로 시작하는 유닉스 소켓 경로만 허용)
+LOCAL_DB_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+
+class SyntheticTicker:
+    """
+    yf.Ticker 대신 쓰는 가상 데이터 소스 (네트워크 없음)
+
+    history(start, end)는 yfinance와 같은 컬럼/인덱스(거래소 시간대 Date)의 데이터프레임을 돌려주며,
+    같은 (종목, 날짜)에는 항상 같은 값을 만든다.
+    """
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+        self.seed = zlib.crc32(ticker.encode("utf-8"))
+        self.timezone = next((timezone for suffix, timezone in SYNTHETIC_TIMEZONES.items()
+                              if ticker.endswith(suffix)), "America/New_York")
+
+    def history(self, start=None, end=None, **kwargs):
+        dates = pd.bdate_range(start, pd.Timestamp(end) - timedelta(days=1), tz=self.timezone)
+        days = dates.tz_localize(None).to_numpy().astype("datetime64[D]").astype(np.int64)
+        base = 20 + self.seed % 480
+        close = base * (1 + 0.1 * np.sin(days / 17 + self.seed % 97))
+        return pd.DataFrame({
+            "Open": close * 0.995,
+            "High": close * 1.01,
+            "Low": close * 0.99,
+            "Close": close,
+            "Volume": (1_000_000 + (self.seed + days * 7919) % 5_000_000).astype(np.int64),
+            "Dividends": 0.0,
+            "Stock Splits": 0.0,
+        }, index=pd.DatetimeIndex(dates, name="Date"))
+
+
+SYNTHETIC_YF = types.SimpleNamespace(Ticker=SyntheticTicker)
+
+
+class OfflineTicker:
+    """ 응답 캐시 재생 확인용: 요청이 캐시에 없으면 오류 """
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+
+    def history(self, start=None, end=None, **kwargs):
+        raise RuntimeError(f"응답 캐시에 없는 요청: {self.ticker} {start} ~ {end}")
+
+
+OFFLINE_YF = types.SimpleNamespace(Ticker=OfflineTicker)
+
+
+def start_measure():
+    """ 입력 준비가 끝난 뒤 측정 시작: 최대 RSS(VmHWM)를 현재 값으로 되돌리고 시작 시각 반환 """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+    return time.perf_counter()
+
+
+def peak_rss_mb():
+    """ start_measure() 이후 최대 RSS (MB), /proc 가 없으면 프로세스 전체 최대값(ru_maxrss) """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def bench_tickers(count):
+    """ 가상 종목 코드 (미국 종목 형식, 예: SYN00001) """
+    return [f"SYN{i:05d}" for i in range(count)]
+
+
+def synthetic_day_frame(tickers, check_date):
+    """ 하루치 수집 결과와 같은 형태의 데이터프레임 (save_csv 단계 입력) """
+    frames = []
+    for ticker in tickers:
+        frame = SyntheticTicker(ticker).history(start=str(check_date), end=str(check_date + timedelta(days=1)))
+        frame = frame.reset_index()
+        frame["Ticker"] = ticker
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def run_fetch(tickers, from_date, to_date, source):
+    """ source(yf 대신 쓸 데이터 소스)로 수집 루프 실행, 응답 캐시는 작업 폴더의 cache/history 사용 """
+    import fetch_stock_data
+    import history_cache
+    rows = [0]
+
+    def count_rows(builder, *args, **kwargs):
+        rows[0] += builder.num_rows
+        return bool(builder.num_rows)
+
+    history_cache.HISTORY_CACHE_DIR = os.path.join("cache", "history")
+    fetch_stock_data.yf = source
+    fetch_stock_data.save_day_data = count_rows
+    start = start_measure()
+    fetch_stock_data.fetch_stock_data(tickers, str(from_date), str(to_date))
+    return rows[0], start
+
+
+def stage_fetch_stock_data(tickers, from_date, to_date, jobs):
+    return run_fetch(tickers, from_date, to_date, SYNTHETIC_YF)
+
+
+def stage_fetch_cached(tickers, from_date, to_date, jobs):
+    return run_fetch(tickers, from_date, to_date, OFFLINE_YF)
+
+
+def stage_save_csv(tickers, from_date, to_date, jobs):
+    from fetch_stock_data import save_csv
+    from market_calendar import open_tickers
+    frames = {}
+    for i in range((to_date - from_date).days + 1):
+        day = from_date + timedelta(days=i)
+        day_tickers = open_tickers(tickers, day)
+        if day_tickers:
+            frames[day] = synthetic_day_frame(day_tickers, day)
+
+    start = start_measure()
+    for day, frame in frames.items():
+        save_csv(frame, day)
+    return sum(len(frame) for frame in frames.values()), start
+
+
+def stage_convert_csv_to_parquet(tickers, from_date, to_date, jobs):
+    from csv_to_parquet import convert_csv_files
+    csv_files = sorted(glob.glob(os.path.join("csv", "*", "*", "*.csv")))
+    start = start_measure()
+    results = convert_csv_files(csv_files, jobs=jobs)
+    return sum(result["rows"] for result in results if result["rows"]), start
+
+
+def truncate_stock_data():
+    from db_config import get_connection
+    from schema_manager import create_stock_data_table
+    with get_connection() as conn:
+        cur = conn.cursor()
+        # search_path 가 벤치마크 스키마가 아니면 운영 stock_data 를 비울 수 있으므로 중단
+        cur.execute("SELECT current_schema();")
+        schema = cur.fetchone()[0]
+        if schema != BENCH_SCHEMA:
+            raise RuntimeError(f"벤치마크 스키마({BENCH_SCHEMA})가 아닌 {schema} 의 stock_data 는 비우지 않음")
+        create_stock_data_table(conn)
+        cur.execute("TRUNCATE stock_data;")
+        conn.commit()
+        cur.close()
+
+
+def stage_load_csv_to_db(tickers, from_date, to_date, jobs):
+    from stock_loader import load_file_to_db
+    truncate_stock_data()
+    csv_files = sorted(glob.glob(os.path.join("csv", "*", "*", "*.csv")))
+    start = start_measure()
+    for csv_file in csv_files:
+        load_file_to_db(csv_file)
+    return sum(len(pd.read_csv(csv_file, usecols=["Ticker"])) for csv_file in csv_files), start
+
+
+def stage_process_parquet(tickers, from_date, to_date, jobs):
+    import pyarrow.parquet as pq
+    from parquet_to_db import process_parquet
+    truncate_stock_data()
+    parquet_files = sorted(glob.glob(os.path.join("parquet", "*", "*", "*.parquet")))
+    start = start_measure()
+    for parquet_file in parquet_files:
+        process_parquet(parquet_file)
+    return sum(pq.ParquetFile(parquet_file).metadata.num_rows for parquet_file in parquet_files), start
+
+
+STAGE_FUNCTIONS = {
+    "fetch_stock_data": stage_fetch_stock_data,
+    "fetch_cached": stage_fetch_cached,
+    "save_csv": stage_save_csv,
+    "convert_csv_to_parquet": stage_convert_csv_to_parquet,
+    "load_csv_to_db": stage_load_csv_to_db,
+    "process_parquet": stage_process_parquet,
+}
+
+
+def run_stage(stage, ticker_count, day_count, workdir, jobs, result_queue):
+    """ (자식 프로세스) workdir에서 단계 하나를 실행하고 소요 시간/행 수/최대 RSS를 result_queue로 전달 """
+    # csv/, parquet/, manifest 등 보관 폴더를 workdir 로 (모듈을 import 하기 전에 지정, 변환 작업 프로세스도 환경 변수로 같은 폴더)
+    os.environ["STOCK_ARCHIVE_ROOT"] = workdir
+    from db_logger import flush_logs
+    import ticker_registry
+    os.chdir(workdir)
+    # 가상 종목(SYN00001 ...)이 실제 종목 목록에 등록되지 않도록 workdir 의 목록 사용 (변환 작업 프로세스도 환경 변수로 같은 목록)
+    ticker_registry.REGISTRY_FILE = os.environ["STOCK_TICKER_REGISTRY"] = os.path.abspath("tickers.csv")
+    ticker_registry.registry = None
+    tickers = bench_tickers(ticker_count)
+    ticker_registry.register(tickers)
+    to_date = BENCH_FROM_DATE + timedelta(days=day_count - 1)
+    result = {"stage": stage, "tickers": ticker_count, "days": day_count}
+
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            rows, start = STAGE_FUNCTIONS[stage](tickers, BENCH_FROM_DATE, to_date, jobs)
+            flush_logs()  # 비동기 로그 저장까지 단계 시간에 포함
+            seconds = time.perf_counter() - start
+        result.update(rows=rows, seconds=round(seconds, 4), rows_per_sec=round(rows / seconds, 1) if seconds else None)
+    except Exception as e:
+        result.update(error=str(e))
+
+    result["peak_rss_mb"] = peak_rss_mb()
+    result_queue.put(result)
+
+
+def run_case(ticker_count, day_count, stages, jobs):
+    """ 새 작업 폴더에서 단계들을 순서대로 각각 새 프로세스로 실행 """
+    workdir = tempfile.mkdtemp(prefix=f"bench_{ticker_count}x{day_count}_")
+    calendar_cache = os.path.join("cache", "calendar")
+    if os.path.isdir(calendar_cache):
+        # 거래소 캘린더 캐시만 공유 (응답 캐시는 작업 폴더마다 따로 만들어 가상 데이터가 실제 캐시에 섞이지 않게 함)
+        os.makedirs(os.path.join(workdir, "cache"))
+        os.symlink(os.path.abspath(calendar_cache), os.path.join(workdir, calendar_cache))
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    try:
+        for stage in stages:
+            result_queue = context.Queue()
+            process = context.Process(target=run_stage, args=(stage, ticker_count, day_count, workdir, jobs,
+                                                              result_queue))
+            process.start()
+            while True:
+                try:
+                    result = result_queue.get(timeout=1)
+                    break
+                except queue.Empty:
+                    if not process.is_alive():
+                        result = {"stage": stage, "tickers": ticker_count, "days": day_count,
+                                  "error": f"프로세스 비정상 종료 (exit code {process.exitcode})"}
+                        break
+            process.join()
+            results.append(result)
+            print_result(result)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def print_result(result):
+    if "error" in result:
+        print(f"[ERROR] {result['stage']:<24} {result['tickers']:>6} 종목 x {result['days']:>3}일: {result['error']}")
+        return
+    print(f"[INFO] {result['stage']:<24} {result['tickers']:>6} 종목 x {result['days']:>3}일: "
+          f"{result['rows']:>9}행 {result['seconds']:>9.3f}초 {result['rows_per_sec'] or 0:>11.1f}행/초 "
+          f"최대 RSS {result['peak_rss_mb']:>8.1f}MB")
+
+
+def compare_with_baseline(results, baseline_file):
+    """ 기준 결과 파일과 단계별 소요 시간 비교 (REGRESSION_RATIO 배 이상 느려진 항목 표시) """
+    with open(baseline_file, "r") as f:
+        baseline = {(item["stage"], item["tickers"], item["days"]): item for item in json.load(f)["results"]}
+
+    regressions = 0
+    for result in results:
+        before = baseline.get((result["stage"], result["tickers"], result["days"]))
+        if not before or "seconds" not in before or "seconds" not in result or not before["seconds"]:
+            continue
+        ratio = result["seconds"] / before["seconds"]
+        flag = "회귀" if ratio >= REGRESSION_RATIO else ""
+        regressions += bool(flag)
+        print(f"[비교] {result['stage']:<24} {result['tickers']:>6} x {result['days']:>3}: "
+              f"{before['seconds']:.3f}초 → {result['seconds']:.3f}초 (x{ratio:.2f}) {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="가상 데이터 소스와 로컬 PostgreSQL로 단계별 처리 시간/처리량/메모리 측정")
+    parser.add_argument("--tickers", type=int, nargs="+", default=DEFAULT_TICKER_COUNTS, help="종목 수 목록")
+    parser.add_argument("--days", type=int, nargs="+", default=DEFAULT_DAY_COUNTS, help="달력 일수 목록")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="측정할 단계")
+    parser.add_argument("--jobs", type=int, default=1, help="CSV → Parquet 변환 프로세스 수")
+    parser.add_argument("--output", type=str, default=DEFAULT_OUTPUT, help="결과 JSON 파일")
+    parser.add_argument("--baseline", type=str, help="비교할 이전 결과 JSON 파일")
+    parser.add_argument("--allow_truncate", action="store_true",
+                        help=f"{BENCH_SCHEMA} 스키마의 stock_data 를 비우는 것을 허용 (지정해야 실행)")
+    args = parser.parse_args()
+
+    # 벤치마크는 stock_data 를 비우고 로그를 남기므로 로컬 DB를 환경 변수로 지정하고 --allow_truncate 를 줘야 실행
+    db_host = os.environ.get("STOCK_DB_HOST", "")
+    if db_host not in LOCAL_DB_HOSTS and not db_host.startswith("/"):
+        print(f"[ERROR] STOCK_DB_HOST 환경 변수로 벤치마크용 로컬 PostgreSQL 을 지정하세요 "
+              f"({', '.join(LOCAL_DB_HOSTS)} 또는 유닉스 소켓 경로, 현재: {db_host or '없음'})")
+        return 1
+    if not args.allow_truncate:
+        print(f"[ERROR] 벤치마크는 {BENCH_SCHEMA} 스키마의 stock_data 를 비웁니다. 계속하려면 --allow_truncate 를 지정하세요")
+        return 1
+
+    # 모든 테이블을 벤치마크 스키마에 만들도록 db_config 를 import 하기 전에 지정 (단계 프로세스도 환경 변수로 같은 스키마)
+    os.environ["STOCK_DB_SCHEMA"] = BENCH_SCHEMA
+    from db_config import DB_CONFIG, get_connection
+    from db_logger import create_log_tables_if_not_exists
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"CREATE SCHEMA IF NOT EXISTS {BENCH_SCHEMA};")
+        conn.commit()
+        cur.close()
+    create_log_tables_if_not_exists()
+
+    started_at = datetime.now()
+    results = []
+    for ticker_count in args.tickers:
+        for day_count in args.days:
+            results.extend(run_case(ticker_count, day_count, args.stages, args.jobs))
+
+    report = {
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "db": f"{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['dbname']} (schema {BENCH_SCHEMA})",
+        "jobs": args.jobs,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1, ensure_ascii=False)
+    print(f"[INFO] 결과 저장: {args.output}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline)
+        print(f"[INFO] 회귀 {regressions}건 (기준: {args.baseline}, x{REGRESSION_RATIO} 이상)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
+
+
+"""
+# 로컬 PostgreSQL 에 대해 전체 규모(100/1,000/10,000 종목 x 1/30/365일) 측정
+# (stock_bench 스키마에 stock_data/로그 테이블을 만들고 비움, 운영 테이블이 있는 public 스키마는 건드리지 않음)
+STOCK_DB_HOST=127.0.0.1 STOCK_DB_PORT=5432 STOCK_DB_NAME=bench STOCK_DB_USER=bench STOCK_DB_PASSWORD=bench python benchmark.py --allow_truncate
+# 작은 규모로 일부 단계만 측정 후 이전 결과와 비교
+STOCK_DB_HOST=127.0.0.1 python benchmark.py --allow_truncate --tickers 100 --days 30 --stages save_csv convert_csv_to_parquet \\
+    --output bench/after.json --baseline bench/before.json
+"""
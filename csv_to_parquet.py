@@ -1,99 +1,98 @@
-import csv
 import os
-import pandas as pd
+import multiprocessing
 import argparse
-import psycopg2
+from concurrent.futures import ProcessPoolExecutor     # 폴더/백필 변환 시 CSV 파일 병렬 변환
 from datetime import datetime
-import subprocess
+from db_config import get_connection
+from db_logger import log_to_db
+from metrics import count, export_metrics, observe
+from archive_manifest import STATUS_FAILED, csv_fetched_dates, mark_status, parquet_file_stats, pending_conversions, \
+    pending_loads, record_parquet
+from parquet_store import DEFAULT_CSV_FOLDER, DEFAULT_PARQUET_FOLDER, iter_csv_tables, register_csv_tickers, \
+    write_parquet_stream
+from schema_manager import create_stock_data_table as create_partitioned_table
+from stock_loader import load_file_to_db, MERGE_MODES, DEFAULT_MERGE_MODE
 
-DEFAULT_PARQUET_LOG_FILE = "/home/hwechang_jeong/stock/exe/parquet_files.log"
+DEFAULT_JOBS = 1                    # 동시에 변환할 프로세스 수 (1이면 순차 변환)
 
 
-# PostgreSQL 연결 정보
-DB_CONFIG = {
-    "dbname": "hwechang",   # 사용할 PostgreSQL 데이터베이스 이름
-    "user": "hwechang",     # 데이터베이스 접속 사용자명
-    "password": "hwechang", # 데이터베이스 비밀번호
-    "host": "10.0.1.160",   # 데이터베이스 서버의 IP 주소 또는 호스트네임
-    "port": "5432"          # PostgreSQL 포트
-}
+def create_stock_data_table():
+    """ stock_data 파티션 테이블 생성 (schema_manager 사용) """
+    with get_connection() as conn:
+        create_partitioned_table(conn)
 
-DEFAULT_LOG_FILE_PATH = "/home/hwechang_jeong/stock/exe/csv_files.log"
-DEFAULT_PARQUET_FOLDER = "parquet"  # 기본 Parquet 저장 폴더
 
-# PostgreSQL 연결 정보
-DB_CONFIG = {
-    "dbname": "hwechang",
-    "user": "hwechang",
-    "password": "hwechang",
-    "host": "10.0.1.160",
-    "port": "5432"
-}
 
-def log_parquet_conversion_to_file(parquet_file):
-    """
-    변환된 Parquet 파일을 텍스트 파일 (parquet_files.log)에 기록
-    """
+def parquet_path_for_csv(csv_file):
+    """ CSV 파일에 대응하는 Parquet 파일 경로 (csv/ 기준 폴더 구조를 parquet/ 아래에 그대로 유지) """
+    csv_folder, csv_filename = os.path.split(csv_file)
+    relative_path = os.path.relpath(csv_folder, start=DEFAULT_CSV_FOLDER)  # "csv/" 폴더 기준 상대 경로
+    return os.path.join(DEFAULT_PARQUET_FOLDER, relative_path, csv_filename.replace(".csv", ".parquet"))
+
+
+def csv_file_dates(csv_file):
+    """ 파일명(stock_data_YYYY-MM-DD.csv)에서 from_date, to_date 추출 (형식이 다르면 None) """
     try:
-        with open(DEFAULT_PARQUET_LOG_FILE, "a") as log_file:
-            log_file.write(parquet_file + "\n")
-    except Exception as e:
-        print(f"[파일 로그 오류] {e}")
+        date_part = os.path.basename(csv_file).split("_")[-1].replace(".csv", "")
+        from_date = to_date = datetime.strptime(date_part, "%Y-%m-%d").date()
+    except ValueError:
+        from_date = to_date = None
+    return from_date, to_date
+
 
-def log_to_db(step, log_type, ticker, message, from_date=None, to_date=None, start_time=None, end_time=None, result=None):
+def convert_csv_file(csv_file):
     """
-    변환 과정의 로그를 stock_data_log 테이블에 저장
-
-    :param step: 단계 (예: 'Parquet 변환', 'CSV 삭제')
-    :param log_type: 로그 레벨 (INFO, ERROR)
-    :param ticker: 종목 코드 (없으면 None)
-    :param message: 상세 메시지
-    :param from_date: 데이터 조회 시작 날짜 (없으면 None)
-    :param to_date: 데이터 조회 종료 날짜 (없으면 None)
-    :param start_time: 프로세스 시작 시간
-    :param end_time: 프로세스 종료 시간
-    :param result: 변환 결과 (성공 / 실패)
+    CSV 파일 하나를 Parquet로 변환하고 결과를 dict로 반환
+
+    DB 로그를 남기지 않으므로 병렬 변환 작업 프로세스에서 그대로 실행할 수 있다. (로그는 호출한 쪽에서 결과로 기록)
+
+    :return: {"csv_file", "parquet_file", "rows", "stats", "from_date", "to_date", "start_time", "end_time", "result",
+              "error"} (stats: manifest에 기록할 파일 통계)
     """
-    conn = None
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
+    from_date, to_date = csv_file_dates(csv_file)
+    result = {"csv_file": csv_file, "parquet_file": None, "rows": 0, "stats": None, "from_date": from_date,
+              "to_date": to_date, "start_time": datetime.now(), "end_time": None, "result": "실패", "error": None}
 
-        query = """
-        INSERT INTO stock_data_log (step, log_type, ticker, message, from_date, to_date, start_time, end_time, result, created_at)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW());
-        """
-        cur.execute(query, (step, log_type, ticker, message, from_date, to_date, start_time, end_time, result))
+    if not os.path.exists(csv_file):
+        result["error"] = "파일이 존재하지 않음"
+    elif not csv_file.endswith(".csv"):
+        result["error"] = "CSV 파일이 아님"
+    else:
+        parquet_file = parquet_path_for_csv(csv_file)
+        try:
+            # CSV를 일정 행 수씩 읽어 헤더 정규화 → 명시적 스키마(STOCK_SCHEMA) → row group 하나씩 저장 (메모리 사용량 일정)
+            # 같은 날짜의 Parquet가 이미 있으면(증분 수집) 새 CSV에 없는 종목의 기존 행은 유지
+            # 종목별 수집일은 CSV 를 저장할 때 manifest 에 기록한 값 (변환한 날이 아님, 기록이 없으면 footer 에도 남기지 않음)
+            rows = write_parquet_stream(iter_csv_tables(csv_file), parquet_file, merge_existing=True,
+                                        fetched=csv_fetched_dates(csv_file))
+            result.update(parquet_file=parquet_file, rows=rows, stats=parquet_file_stats(parquet_file), result="성공")
+        except Exception as e:
+            result["error"] = str(e)
 
-        conn.commit()
-        cur.close()
-    except Exception as e:
-        print(f"[DB 로그 오류] {e}")
-    finally:
-        if conn:
-            conn.close()
+    result["end_time"] = datetime.now()
+    return result
 
-def create_stock_data_table():
-    conn = psycopg2.connect(**DB_CONFIG)
-    cur = conn.cursor()
-    create_table_query = """
-    CREATE TABLE IF NOT EXISTS stock_data (
-        date DATE,
-        open NUMERIC,
-        high NUMERIC,
-        low NUMERIC,
-        close NUMERIC,
-        volume BIGINT,
-        dividends NUMERIC,
-        stock_splits NUMERIC,
-        ticker TEXT
-    );
+
+def record_conversion(result):
+    """
+    변환 결과를 manifest에 기록 (성공: 변환 완료 + DB 적재 대기, 실패: 변환 실패)
+
+    변환은 작업 프로세스에서 실행되므로 소요 시간/행 수 지표도 결과 dict로 받아 여기(메인 프로세스)서 기록한다.
     """
-    cur.execute(create_table_query)
-    conn.commit()
-    cur.close()
-    conn.close()
+    observe("stage_seconds", (result["end_time"] - result["start_time"]).total_seconds(), stage="convert")
+    if result["result"] == "성공":
+        count("rows_converted_total", result["rows"], stage="convert")
+        count("bytes_written_total", os.path.getsize(result["parquet_file"]), stage="convert")
+    else:
+        count("stage_errors_total", stage="convert")
 
+    try:
+        if result["result"] == "성공":
+            record_parquet(result["parquet_file"], stats=result["stats"], csv_path=result["csv_file"])
+        else:
+            mark_status(result["csv_file"], "convert", STATUS_FAILED, error=result["error"])
+    except Exception as e:
+        print(f"[ERROR] manifest 기록 실패: {result['csv_file']}: {e}")
 
 
 def convert_csv_to_parquet(csv_file, delete_csv=False):
@@ -102,212 +101,174 @@ def convert_csv_to_parquet(csv_file, delete_csv=False):
 
     :param csv_file: 변환할 CSV 파일 경로
     :param delete_csv: 변환 후 CSV 파일 삭제 여부
+    :return: 변환 결과 dict (convert_csv_file 참고)
     """
-    start_time = datetime.now()     # 변환 시작 시간 기록
+    result = convert_csv_file(csv_file)
+    record_conversion(result)
+    from_date, to_date = result["from_date"], result["to_date"]
+    start_time, end_time = result["start_time"], result["end_time"]
 
-    if not os.path.exists(csv_file):
-        print(f"[Error] 파일이 존재하지 않음: {csv_file}")
-        log_to_db("Parquet 변환", "ERROR", "ALL", "파일이 존재하지 않음", start_time=start_time, result="실패")
-        return
+    if result["result"] != "성공":
+        print(f"[Error] {csv_file}: {result['error']}")
+        log_to_db("Parquet 변환", "ERROR", "ALL", f"오류 발생: {result['error']}", from_date, to_date, start_time,
+                  end_time, "실패")
+        return result
 
-    if not csv_file.endswith(".csv"):
-        print(f"[Error] CSV 파일이 아님: {csv_file}")
-        log_to_db("Parquet 변환", "ERROR", "ALL", "CSV 파일이 아님", start_time=start_time, result="실패")
-        return
+    parquet_file = result["parquet_file"]
+    print(f"[Parquet 변환 완료] {parquet_file}")
+    log_to_db("Parquet 변환", "INFO", "ALL", f"변환 완료: {parquet_file}", from_date, to_date, start_time, end_time, "성공")
 
-    # 원본 CSV 파일이 있는 폴더 구조 유지하여 Parquet 저장
-    csv_folder, csv_filename = os.path.split(csv_file)
-    relative_path = os.path.relpath(csv_folder, start="csv")  # "csv/" 폴더 기준 상대 경로
-    parquet_folder = os.path.join(DEFAULT_PARQUET_FOLDER, relative_path)
+    if delete_csv:
+        os.remove(csv_file)
+        print(f"[CSV 삭제] {csv_file}")
+        log_to_db("CSV 삭제", "INFO", "ALL", "CSV 파일 삭제 완료", from_date, to_date, end_time, end_time, "성공")
+    return result
 
-    # Parquet 폴더 생성
-    os.makedirs(parquet_folder, exist_ok=True)
 
-    # 날짜 범위 추출 (파일명에서 from_date, to_date 파악)
-    try:
-        date_part = csv_filename.split("_")[-1].replace(".csv", "")
-        from_date = to_date = datetime.strptime(date_part, "%Y-%m-%d").date()
-    except ValueError:
-        from_date = to_date = None
-
-    # Parquet 파일 경로 설정
-    parquet_file = os.path.join(parquet_folder, csv_filename.replace(".csv", ".parquet"))
-
-    try:
-        df = pd.read_csv(csv_file)
-        df.to_parquet(parquet_file, engine="pyarrow", compression="snappy")
-
-        end_time = datetime.now()
-        print(f"[Parquet 변환 완료] {parquet_file}")
-        log_to_db("Parquet 변환", "INFO", "ALL", f"변환 완료: {parquet_file}", from_date, to_date, start_time, end_time, "성공")
-        log_parquet_conversion_to_file(parquet_file)
-
-        if delete_csv:
-            os.remove(csv_file)
-            print(f"[CSV 삭제] {csv_file}")
-            log_to_db("CSV 삭제", "INFO", "ALL", "CSV 파일 삭제 완료", from_date, to_date, end_time, end_time, "성공")
-
-    except Exception as e:
-        end_time = datetime.now()
-        print(f"[Error] {csv_file}: {e}")
-        log_to_db("Parquet 변환", "ERROR", "ALL", f"오류 발생: {e}", from_date, to_date, start_time, end_time, "실패")
+def convert_csv_files(csv_files, jobs=DEFAULT_JOBS):
+    """
+    여러 CSV 파일을 Parquet로 변환 (jobs > 1 이면 프로세스 풀로 병렬 변환)
 
+    작업 프로세스는 변환만 하고 결과를 돌려주며, 결과 정리/manifest 기록/DB 로그(요약 1건)는 메인 프로세스에서 한 번에 기록한다.
 
-def fix_csv_headers(input_file, output_file):
-    """
-    CSV 파일의 헤더에서 공백을 언더스코어(_)로 변경
+    :param csv_files: 변환할 CSV 파일 경로 리스트
+    :param jobs: 동시에 변환할 프로세스 수
+    :return: 파일별 변환 결과 리스트 (csv_files 순서)
     """
-    with open(input_file, newline='', encoding='utf-8') as infile, open(output_file, "w", newline='', encoding='utf-8') as outfile:
-        reader = csv.reader(infile)
-        writer = csv.writer(outfile)
-
-        # (1) 헤더 수정: 공백을 언더스코어(_)로 변경
-        header = next(reader)
-        new_header = [col.replace(" ", "_") for col in header]  # 공백 → "_"
-        writer.writerow(new_header)
+    start_time = datetime.now()
+
+    # 새 종목은 작업 프로세스를 시작하기 전에 여기서 한 번 등록 (작업 프로세스는 종목 목록을 읽기만 함)
+    register_csv_tickers(csv_files)
+
+    # CPU 코어 수보다 많은 프로세스는 시작 비용만 늘어나므로 코어 수로 제한
+    cpu_count = os.cpu_count() or 1
+    if jobs > cpu_count:
+        print(f"[INFO] --jobs {jobs} → CPU 코어 수({cpu_count})로 제한")
+        jobs = cpu_count
+
+    if jobs > 1 and len(csv_files) > 1:
+        # 부모 프로세스의 로그 스레드/커넥션 풀을 물려받지 않도록 spawn 방식으로 작업 프로세스 생성
+        chunksize = max(1, len(csv_files) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as executor:
+            results = list(executor.map(convert_csv_file, csv_files, chunksize=chunksize))
+    else:
+        results = [convert_csv_file(csv_file) for csv_file in csv_files]
+
+    failed = []
+    for result in results:
+        record_conversion(result)
+        if result["result"] == "성공":
+            print(f"[Parquet 변환 완료] {result['parquet_file']} ({result['rows']}행)")
+        else:
+            print(f"[Error] {result['csv_file']}: {result['error']}")
+            failed.append(result)
+
+    end_time = datetime.now()
+    dates = [result["from_date"] for result in results if result["from_date"] is not None]
+    from_date, to_date = (min(dates), max(dates)) if dates else (None, None)
+    rows = sum(result["rows"] for result in results)
+    summary = f"변환 {len(results) - len(failed)}/{len(results)}개 파일, {rows}행 (프로세스 {jobs}개, 소요 시간: {end_time - start_time})"
+
+    if failed:
+        failed_files = ", ".join(f"{result['csv_file']}({result['error']})" for result in failed)
+        log_to_db("Parquet 변환", "ERROR", "ALL", f"{summary}, 실패: {failed_files}", from_date, to_date, start_time,
+                  end_time, "일부 실패")
+    else:
+        log_to_db("Parquet 변환", "INFO", "ALL", summary, from_date, to_date, start_time, end_time, "성공")
+    return results
 
-        # (2) 데이터 그대로 복사
-        for row in reader:
-            writer.writerow(row)
 
+def delete_csv_file(csv_file):
+    """ 처리가 끝난 CSV 파일 삭제 """
+    os.remove(csv_file)
+    print(f"[INFO] CSV 파일 삭제 완료: {csv_file}")
+    log_to_db("CSV 삭제", "INFO", "ALL", "CSV 파일 삭제 완료", result="성공")
 
 
-def store_csv_to_db_with_pgfutter(csv_file, target_table="stock_data"):
+def load_converted_to_db(results, delete_csv=False, mode=DEFAULT_MERGE_MODE):
     """
-    pgfutter를 사용하여 CSV 데이터를 PostgreSQL에 저장한 후, 원하는 테이블로 데이터 이동.
+    변환에 성공한 Parquet 파일을 순서대로 하나씩 DB에 적재 (병렬 변환과 분리된 직렬 단계라 테이블 경합 없음)
 
-    :param csv_file: 변환할 CSV 파일 경로
-    :param target_table: 최종 저장할 PostgreSQL 테이블명
+    :param results: convert_csv_files 결과 리스트
+    :param delete_csv: 적재 완료 후 CSV 파일 삭제 여부
+    :param mode: DB 적재 시 upsert 모드 ('nothing' 또는 'update')
     """
-    conn = None
-    schema = "public"
-    table_name = target_table + '_temp'
+    for result in results:
+        if result["result"] != "성공":
+            continue
 
-    fixed_csv_file = csv_file.replace(".csv", "_fixed.csv")
-    fix_csv_headers(csv_file, fixed_csv_file)
+        # ✅ PostgreSQL에 적재 (COPY 사용)
+        success = load_file_to_db(result["parquet_file"], mode=mode)
 
+        # ✅ 적재 완료 후 CSV 삭제 (옵션에 따라)
+        if delete_csv and success:
+            delete_csv_file(result["csv_file"])
 
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-
-        # 환경 변수 설정
-        env = os.environ.copy()
-        env["DB_NAME"] = DB_CONFIG["dbname"]
-        env["DB_USER"] = DB_CONFIG["user"]
-        env["DB_PASS"] = DB_CONFIG["password"]
-        env["DB_HOST"] = DB_CONFIG["host"]
-        env["DB_PORT"] = str(DB_CONFIG["port"])
-        env["DB_SCHEMA"] = schema
-        env["DB_TABLE"] = table_name
-
-        # pgfutter 실행 명령어
-        command = [
-                "pgfutter", "csv", 
-            fixed_csv_file  # 삽입할 CSV 파일
-        ]
-
-        try:
-            result = subprocess.run(command, check=True, env=env, capture_output=True, text=True)
-            print(f"[INFO] CSV 데이터를 '{schema}.{table_name}' 테이블에 저장 완료")
-            log_to_db("CSV 적재", "INFO", "ALL", f"pgfutter 실행 완료: {result.stdout}")
-        except subprocess.CalledProcessError as e:
-            print(f"[ERROR] pgfutter 실행 실패: {e}")
-            log_to_db("CSV 적재", "ERROR", "ALL", f"pgfutter 실행 실패: {e.stderr}")
-            return False
-
-        # ✅ (2) 중복 데이터 제거 후, target_table로 이동
-        cur.execute(f"""
-            DELETE FROM {table_name} 
-            WHERE (ticker, date::TEXT) IN (SELECT ticker, date::TEXT FROM {target_table});
-        """)
-        conn.commit()
-        # print(f"[INFO] 중복 데이터 제거 완료")
-
-        cur.execute(f"""
-            INSERT INTO {target_table} (date, open, high, low, close, volume, dividends, stock_splits, ticker)
-            SELECT 
-                date::DATE, 
-                NULLIF(REPLACE(open, '\r', ''), '')::NUMERIC, 
-                NULLIF(REPLACE(high, '\r', ''), '')::NUMERIC, 
-                NULLIF(REPLACE(low, '\r', ''), '')::NUMERIC, 
-                NULLIF(REPLACE(close, '\r', ''), '')::NUMERIC, 
-                NULLIF(REPLACE(volume, '\r', ''), '')::NUMERIC, 
-                NULLIF(REPLACE(dividends, '\r', ''), '')::NUMERIC, 
-                NULLIF(REPLACE(stock_splits, '\r', ''), '')::NUMERIC, 
-                REPLACE(ticker, '\r', '')
-            FROM {table_name};
-        """)
-        conn.commit()
-
-        print(f"[INFO] 데이터 `{target_table}`로 이동 완료")
-
-        # ✅ (3) 원본 테이블 삭제
-        cur.execute(f"DROP TABLE {table_name};")
-        conn.commit()
-        # print(f"[INFO] 자동 생성된 테이블 `{table_name}` 삭제 완료")
-
-        return True
-
-    except subprocess.CalledProcessError as e:
-        print(f"[Error] pgfutter 실행 실패: {e}")
-        return False
 
-    except Exception as e:
-        print(f"[Error] 데이터베이스 작업 중 오류 발생: {e}")
-        return False
+def convert_and_load(csv_files, delete_csv=False, mode=DEFAULT_MERGE_MODE, jobs=DEFAULT_JOBS, load_db=True):
+    """ CSV 변환 단계(병렬 가능) → DB 적재 단계(직렬) 순서로 실행 """
+    results = convert_csv_files(csv_files, jobs=jobs)
 
-    finally:
-        if conn:
-            conn.close()
+    if load_db:
+        load_converted_to_db(results, delete_csv=delete_csv, mode=mode)
+    elif delete_csv:
+        for result in results:
+            if result["result"] == "성공":
+                delete_csv_file(result["csv_file"])
+    return results
 
 
-def convert_logged_csv_to_parquet(log_file=DEFAULT_LOG_FILE_PATH, delete_csv=False):
+def convert_pending_csv_to_parquet(delete_csv=False, mode=DEFAULT_MERGE_MODE, jobs=DEFAULT_JOBS, load_db=True):
     """
-    로그 파일에서 변환할 CSV 목록을 읽어 Parquet 변환
-    """
-    if not os.path.exists(log_file):
-        print("[INFO] 변환할 CSV 파일 없음")
-        return
+    manifest에서 아직 변환되지 않은 CSV를 변환하고, 적재되지 않은 Parquet를 모두 DB에 적재
 
-    with open(log_file, "r") as f:
-        csv_files = f.read().splitlines()
+    파일마다 변환/적재가 끝날 때 상태를 기록하므로 중간에 중단되어도 다시 실행하면 남은 파일부터 이어서 처리한다.
 
-    if not csv_files:
+    :param mode: DB 적재 시 upsert 모드 ('nothing' 또는 'update')
+    :param jobs: 동시에 변환할 프로세스 수
+    :param load_db: 변환 후 DB 적재 여부
+    """
+    csv_files = pending_conversions()
+    if csv_files:
+        results = convert_csv_files(csv_files, jobs=jobs)
+    else:
         print("[INFO] 변환할 CSV 파일 없음")
-        return
+        results = []
 
-    for csv_file in csv_files:
-        convert_csv_to_parquet(csv_file)
-        store_csv_to_db_with_pgfutter(csv_file)
+    converted = {result["parquet_file"]: result["csv_file"] for result in results if result["result"] == "성공"}
+    if not load_db:
+        if delete_csv:
+            for csv_file in converted.values():
+                delete_csv_file(csv_file)
+        return
 
-    # 변환 완료 후 로그 파일 초기화
-    os.remove(log_file)
+    # 이번에 변환한 파일 + 이전 실행에서 적재하지 못한 파일 (fetch_stock_data.py --output parquet 결과 포함)
+    for parquet_file in pending_loads():
+        success = load_file_to_db(parquet_file, mode=mode)
+        if delete_csv and success and parquet_file in converted:
+            delete_csv_file(converted[parquet_file])
 
 
-def convert_all_csv_to_parquet(root_folder="csv", delete_csv=False):
+def convert_all_csv_to_parquet(root_folder=DEFAULT_CSV_FOLDER, delete_csv=False, mode=DEFAULT_MERGE_MODE, jobs=DEFAULT_JOBS,
+                               load_db=True):
     """
     지정된 폴더 내의 모든 CSV 파일을 찾아 Parquet 파일로 변환한 후 PostgreSQL에 적재
 
     :param root_folder: CSV 파일이 저장된 루트 디렉토리
-    :param delete_csv: 변환 후 CSV 파일 삭제 여부
+    :param delete_csv: 적재(또는 load_db=False 이면 변환) 후 CSV 파일 삭제 여부
+    :param mode: DB 적재 시 upsert 모드 ('nothing' 또는 'update')
+    :param jobs: 동시에 변환할 프로세스 수
+    :param load_db: 변환 후 DB 적재 여부
     """
+    csv_files = []
     for root, _, files in os.walk(root_folder):
-        for file in files:
-            if file.endswith(".csv"):
-                csv_path = os.path.join(root, file)
+        csv_files.extend(os.path.join(root, file) for file in files if file.endswith(".csv"))
 
-                # ✅ CSV → Parquet 변환
-                convert_csv_to_parquet(csv_path, delete_csv=False)  # CSV 삭제는 후속 작업에서 처리
-
-                # ✅ PostgreSQL에 적재 (pgfutter 사용)
-                success = store_csv_to_db_with_pgfutter(csv_path)
+    if not csv_files:
+        print(f"[INFO] 변환할 CSV 파일 없음: {root_folder}")
+        return
 
-                # ✅ 적재 완료 후 CSV 삭제 (옵션에 따라)
-                if delete_csv and success:
-                    os.remove(csv_path)
-                    print(f"[INFO] CSV 파일 삭제 완료: {csv_path}")
-                    log_to_db("CSV 삭제", "INFO", "ALL", "CSV 파일 삭제 완료", result="성공")
+    convert_and_load(sorted(csv_files), delete_csv=delete_csv, mode=mode, jobs=jobs, load_db=load_db)
 
 
 if __name__ == "__main__":
@@ -315,9 +276,13 @@ if __name__ == "__main__":
 
     parser.add_argument("--csv_file", type=str, help="변환할 단일 CSV 파일 경로")
     parser.add_argument("--folder", type=str, help="CSV 파일이 저장된 폴더")
-    parser.add_argument("--log_file", type=str, default=DEFAULT_LOG_FILE_PATH, help="CSV 파일 로그 파일 경로")
+    parser.add_argument("--on_conflict", choices=MERGE_MODES, default=DEFAULT_MERGE_MODE,
+                        help="이미 있는 (date, ticker) 처리 방식 (nothing: 건너뜀, update: 수정 주가 덮어쓰기)")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="동시에 변환할 프로세스 수")
+    parser.add_argument("--skip_db", action="store_true", help="Parquet 변환만 하고 DB 적재 단계는 생략")
 
     args = parser.parse_args()
+    run_started_at = datetime.now()
 
     create_stock_data_table()
 
@@ -326,14 +291,17 @@ if __name__ == "__main__":
         convert_csv_to_parquet(args.csv_file)
     elif args.folder:
         # 특정 폴더의 모든 CSV 변환
-        convert_all_csv_to_parquet(root_folder=args.folder)
+        convert_all_csv_to_parquet(root_folder=args.folder, mode=args.on_conflict, jobs=args.jobs,
+                                   load_db=not args.skip_db)
     else:
-        # 로그 파일 기반으로 가장 최근 변환된 파일만 처리
-        convert_logged_csv_to_parquet(log_file=args.log_file)
+        # manifest 기준으로 변환/적재가 끝나지 않은 파일만 처리 (중단된 실행 이어서 처리)
+        convert_pending_csv_to_parquet(mode=args.on_conflict, jobs=args.jobs, load_db=not args.skip_db)
+
+    export_metrics("csv_to_parquet", run_started_at)
 
 
 """
-# 가장 마지막 실행으로 생성된 csv파일 변환
+# 아직 변환/적재되지 않은 csv파일 변환 후 DB 적재 (manifest.sqlite 기준)
 python csv_to_parquet.py
 # 특정 csv파일 하나 변환
 python csv_to_parquet.py --csv_file "csv/2024/02/stock_data_2024-02-06.csv"
@@ -341,5 +309,11 @@ python csv_to_parquet.py --csv_file "csv/2024/02/stock_data_2024-02-06.csv"
 python csv_to_parquet.py --folder "csv/2024/02"
 # csv 파일 삭제 추가
 python csv_to_parquet.py --folder "csv/2024/02" --delete_csv
+# 이미 있는 행도 새 값(수정 주가)으로 덮어쓰기
+python csv_to_parquet.py --folder "csv/2024/02" --on_conflict update
+# 5년치 백필: 8개 프로세스로 병렬 변환 후 DB 적재는 한 파일씩 순서대로
+python csv_to_parquet.py --folder "csv" --jobs 8
+# 변환만 병렬로 하고 DB 적재는 생략
+python csv_to_parquet.py --folder "csv" --jobs 8 --skip_db
 
 """
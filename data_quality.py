@@ -0,0 +1,237 @@
+import argparse
+import os
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from db_logger import log_to_db
+from metrics import count, observe
+from archive_manifest import day_of_path
+from parquet_store import ARCHIVE_ROOT, PARQUET_COMPRESSION, PRICE_COLUMNS, STOCK_SCHEMA, to_arrow_table, trade_dates
+
+# 검사를 통과하지 못한 행 보관 폴더: quarantine/YYYY/MM/stock_data_YYYY-MM-DD.parquet (원본 일별 파일과 같은 이름)
+DEFAULT_QUARANTINE_FOLDER = os.path.join(ARCHIVE_ROOT, "quarantine")
+
+# 검사 이름 → 설명 (한 행이 여러 검사에 걸리면 앞의 검사 이름을 Reason 으로 기록)
+CHECKS = {
+    "null_price": "Open/High/Low/Close 중 값 없음 또는 NaN",
+    "non_positive_price": "0 이하 가격",
+    "high_below_low": "High < Low",
+    "zero_volume": "거래량 0 또는 없음",
+    "duplicate_key": "같은 (종목, 거래일) 중복 행 (다른 검사를 통과한 행 중 처음 행만 적재)",
+}
+
+QUARANTINE_SCHEMA = STOCK_SCHEMA.append(pa.field("Reason", pa.string()))
+
+
+def quarantine_path(source, root=DEFAULT_QUARANTINE_FOLDER):
+    """ 원본 파일에 대응하는 격리 파일 경로 (일별 파일이면 quarantine/YYYY/MM/, 아니면 quarantine/ 바로 아래) """
+    day = day_of_path(source)
+    name = os.path.splitext(os.path.basename(source))[0] + ".parquet"
+    if day is None:
+        return os.path.join(root, name)
+    return os.path.join(root, f"{day:%Y}", f"{day:%m}", name)
+
+
+def row_keys(table):
+    """ 행마다 (Ticker ID, 거래소 현지 거래일) 을 하나로 합친 int64 키 (상위 32비트: Ticker ID, 하위: 1970-01-01 이후 일 수) """
+    ids = pc.cast(table.column("Ticker ID").combine_chunks(), pa.int64())
+    days = pc.cast(pc.cast(trade_dates(table), pa.int32()), pa.int64())
+    return pc.add(pc.shift_left(ids, 32), days)
+
+
+def check_table(table, keys, seen_keys=None):
+    """
+    모든 검사를 컬럼 단위로 한 번에 계산해 행마다 실패한 검사 이름(통과하면 null)을 반환
+
+    seen_keys: 앞 배치까지 적재하기로 한 행의 키 (파일을 배치로 나누어 읽어도 파일 전체 기준으로 중복 검사)
+    중복 검사는 다른 검사를 통과한 행끼리만 한다. (같은 키의 처음 행이 다른 이유로 격리되면 다음 정상 행을 적재)
+    """
+    prices = [table.column(name) for name in PRICE_COLUMNS]
+    masks = {
+        "null_price": or_all(pc.is_null(price, nan_is_null=True) for price in prices),
+        "non_positive_price": or_all(pc.fill_null(pc.less_equal(price, 0), False) for price in prices),
+        "high_below_low": pc.fill_null(pc.less(table.column("High"), table.column("Low")), False),
+        "zero_volume": pc.fill_null(pc.equal(table.column("Volume"), 0), True),
+    }
+
+    failed = np.zeros(table.num_rows, dtype=bool)
+    for mask in masks.values():
+        failed |= np.asarray(mask, dtype=bool)
+    valid = np.flatnonzero(~failed)
+
+    # 정상 행 중 같은 배치 안에서는 처음 나온 행만, 앞 배치에서 적재하기로 한 키는 모두 중복
+    _, first_index = np.unique(keys.to_numpy()[valid], return_index=True)
+    duplicate = np.zeros(table.num_rows, dtype=bool)
+    duplicate[valid] = True
+    duplicate[valid[first_index]] = False
+    if seen_keys is not None and len(seen_keys):
+        duplicate[valid] |= pc.is_in(keys, value_set=seen_keys).to_numpy(zero_copy_only=False)[valid]
+    masks["duplicate_key"] = duplicate
+
+    reasons = np.full(table.num_rows, None, dtype=object)
+    for name in reversed(list(CHECKS)):
+        reasons[np.asarray(masks[name], dtype=bool)] = name
+    return pa.array(reasons, type=pa.string())
+
+
+def or_all(masks):
+    result = None
+    for mask in masks:
+        result = mask if result is None else pc.or_(result, mask)
+    return result
+
+
+def write_quarantine(tables, source, root=DEFAULT_QUARANTINE_FOLDER):
+    """ 격리 행을 원본 파일 단위로 저장 (같은 파일을 다시 적재하면 새 검사 결과로 교체, 격리 행이 없으면 이전 파일 삭제) """
+    file_path = quarantine_path(source, root)
+    if not tables:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        return None
+
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    pq.write_table(pa.concat_tables(tables).unify_dictionaries(), file_path + ".tmp", compression=PARQUET_COMPRESSION)
+    os.replace(file_path + ".tmp", file_path)
+    return file_path
+
+
+def validated(tables, source, root=DEFAULT_QUARANTINE_FOLDER):
+    """
+    STOCK_SCHEMA 테이블 묶음(generator)을 검사해서 통과한 행만 반환 (generator, source: 원본 일별 파일 경로)
+
+    다 읽고 나면 실패한 행을 Reason 컬럼과 함께 격리 파일로 저장하고, 검사별 행 수를 stock_data_log 와 지표로 기록한다.
+    검사는 배치마다 컬럼 연산 한 번이므로 파일을 배치로 나누어 읽는 적재 흐름(메모리 일정)을 그대로 유지한다.
+    """
+    start_time = datetime.now()
+    counts = dict.fromkeys(CHECKS, 0)
+    seen_keys = None
+    quarantined = []
+    rows = 0
+    seconds = 0.0
+
+    for table in tables:
+        if not table.num_rows:
+            continue
+        started = time.perf_counter()
+        keys = row_keys(table)
+        reasons = check_table(table, keys, seen_keys)
+        failed = pc.is_valid(reasons)
+        passed_keys = keys.filter(pc.invert(failed))
+        seen_keys = passed_keys if seen_keys is None else pa.concat_arrays([seen_keys, passed_keys])
+
+        if pc.any(failed).as_py():
+            bad = table.filter(failed)
+            quarantined.append(bad.append_column(QUARANTINE_SCHEMA.field("Reason"), reasons.filter(failed)))
+            for name, value in zip(*np.unique(reasons.filter(failed).to_numpy(zero_copy_only=False),
+                                             return_counts=True)):
+                counts[name] += int(value)
+            table = table.filter(pc.invert(failed))
+        rows += len(keys)
+        seconds += time.perf_counter() - started
+        yield table
+
+    observe("stage_seconds", seconds, stage="validate")
+    day = day_of_path(source)
+    failed_rows = sum(counts.values())
+    for name, value in counts.items():
+        if value:
+            count("rows_quarantined_total", value, stage="validate", check=name)
+
+    write_quarantine(quarantined, source, root)
+    summary = ", ".join(f"{name} {value}행" for name, value in counts.items() if value)
+    if failed_rows:
+        print(f"[INFO] 데이터 검증 {source}: {rows}행 중 {failed_rows}행 격리 ({summary})")
+        log_to_db("데이터 검증", "INFO", "ALL", f"{source}: {rows}행 중 {failed_rows}행 격리 ({summary})", day, day,
+                  start_time=start_time, end_time=datetime.now(), result="격리")
+    else:
+        log_to_db("데이터 검증", "INFO", "ALL", f"{source}: {rows}행 검사 통과", day, day, start_time=start_time,
+                  end_time=datetime.now(), result="성공")
+
+
+# --self_test 예제: 배치마다 (종목, 날짜, Close, Volume, 기대하는 Reason) - 배치를 나누어도 파일 전체 기준으로 검사하는지 확인
+SELF_TEST_BATCHES = [
+    [
+        ("AAPL", "2024-03-04", None, 100, "null_price"),        # 같은 키의 처음 행이 다른 검사로 격리되면
+        ("AAPL", "2024-03-04", 10.0, 100, None),                # 다음 정상 행을 적재
+        ("MSFT", "2024-03-04", 10.0, 100, None),
+        ("MSFT", "2024-03-04", 11.0, 100, "duplicate_key"),     # 정상 행끼리는 처음 행만 적재
+        ("AAPL", "2024-03-05", 10.0, 0, "zero_volume"),
+    ],
+    [
+        ("AAPL", "2024-03-05", 10.0, 100, None),                # 앞 배치에서 격리만 된 키는 중복 아님
+        ("MSFT", "2024-03-04", 12.0, 100, "duplicate_key"),     # 앞 배치에서 적재한 키는 중복
+        ("AAPL", "2024-03-06", -1.0, 100, "non_positive_price"),
+    ],
+]
+
+
+def self_test():
+    """ SELF_TEST_BATCHES 를 검사해 기대한 Reason 과 다른 행 수를 반환 (DB/파일 기록 없음) """
+    mismatches = 0
+    seen_keys = None
+    for batch in SELF_TEST_BATCHES:
+        data = pd.DataFrame(batch, columns=["Ticker", "Date", "Close", "Volume", "Expected"])
+        data["Date"] = pd.to_datetime(data["Date"]).dt.tz_localize("America/New_York")
+        data["Open"] = data["High"] = data["Low"] = data["Close"].abs()
+        table = to_arrow_table(data)
+        keys = row_keys(table)
+        reasons = check_table(table, keys, seen_keys)
+        passed_keys = keys.filter(pc.is_null(reasons))
+        seen_keys = passed_keys if seen_keys is None else pa.concat_arrays([seen_keys, passed_keys])
+
+        for row, reason in zip(batch, reasons.to_pylist()):
+            if reason != row[-1]:
+                mismatches += 1
+                print(f"[ERROR] {row[0]} {row[1]}: 기대 {row[-1]}, 결과 {reason}")
+    return mismatches
+
+
+def read_quarantine(from_date=None, to_date=None, root=DEFAULT_QUARANTINE_FOLDER):
+    """ 격리 행 조회 (일별 격리 파일 중 기간에 해당하는 파일만 읽음) """
+    tables = []
+    for folder, _, names in sorted(os.walk(root)):
+        for name in sorted(names):
+            if not name.endswith(".parquet"):
+                continue
+            day = day_of_path(name)
+            if day and ((from_date and day < from_date) or (to_date and day > to_date)):
+                continue
+            tables.append(pq.read_table(os.path.join(folder, name)))
+    if not tables:
+        return QUARANTINE_SCHEMA.empty_table()
+    return pa.concat_tables(tables).unify_dictionaries()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="적재 전 데이터 검증에서 격리된 행 조회 프로그램")
+    parser.add_argument("--from_date", type=str, help="시작 날짜 (예: 2025-01-01)")
+    parser.add_argument("--to_date", type=str, help="종료 날짜 (예: 2025-01-31)")
+    parser.add_argument("--self_test", action="store_true", help="검사 예제(SELF_TEST_BATCHES)가 기대한 대로 걸러지는지 확인")
+    args = parser.parse_args()
+
+    if args.self_test:
+        failed = self_test()
+        print(f"[ERROR] 자체 검사 실패 {failed}행" if failed else "[INFO] 자체 검사 통과")
+        raise SystemExit(1 if failed else 0)
+
+    quarantine = read_quarantine(datetime.strptime(args.from_date, "%Y-%m-%d").date() if args.from_date else None,
+                                 datetime.strptime(args.to_date, "%Y-%m-%d").date() if args.to_date else None)
+    print(f"[INFO] 격리 행 {quarantine.num_rows}개")
+    if quarantine.num_rows:
+        reasons = quarantine.column("Reason").value_counts().to_pylist()
+        for item in reasons:
+            print(f"[INFO]   {item['values']:<20} {item['counts']:>8}행  ({CHECKS.get(item['values'], '')})")
+        print(quarantine.to_pandas().head(50).to_string())
+
+
+"""
+# 격리된 행 확인 (검사별 행 수 + 처음 50행)
+python data_quality.py
+python data_quality.py --from_date 2025-01-01 --to_date 2025-01-31
+# 검사 예제 확인 (같은 키의 처음 행이 격리되면 다음 정상 행을 적재하는지 등)
+python data_quality.py --self_test
+"""
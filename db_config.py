@@ -0,0 +1,67 @@
+import os                           # 환경 변수로 접속 정보 변경 (벤치마크/로컬 테스트용)
+import threading                    # 커넥션 풀 생성 동기화용
+from contextlib import contextmanager
+from psycopg2 import pool           # psycopg2 기본 제공 커넥션 풀
+
+# PostgreSQL 연결 정보 (fetch_stock_data / csv_to_parquet / parquet_to_db 공용)
+# STOCK_DB_NAME / STOCK_DB_USER / STOCK_DB_PASSWORD / STOCK_DB_HOST / STOCK_DB_PORT 환경 변수가 있으면 그 값을 사용
+DB_CONFIG = {
+    "dbname": os.environ.get("STOCK_DB_NAME", "hwechang"),        # 사용할 PostgreSQL 데이터베이스 이름
+    "user": os.environ.get("STOCK_DB_USER", "hwechang"),          # 데이터베이스 접속 사용자명
+    "password": os.environ.get("STOCK_DB_PASSWORD", "hwechang"),  # 데이터베이스 비밀번호
+    "host": os.environ.get("STOCK_DB_HOST", "10.0.1.160"),        # 데이터베이스 서버의 IP 주소 또는 호스트네임
+    "port": os.environ.get("STOCK_DB_PORT", "5432")               # PostgreSQL 포트
+}
+
+# STOCK_DB_SCHEMA 가 있으면 그 스키마만 search_path 로 사용 (벤치마크가 운영 테이블과 분리된 스키마에 stock_data 등을 만듦)
+DB_SCHEMA = os.environ.get("STOCK_DB_SCHEMA")
+if DB_SCHEMA:
+    DB_CONFIG["options"] = f"-c search_path={DB_SCHEMA}"
+
+# 커넥션 풀 크기
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = 8
+
+connection_pool = None
+pool_lock = threading.Lock()
+
+
+def get_pool():
+    """ 프로세스 공용 커넥션 풀을 반환 (처음 호출될 때 생성) """
+    global connection_pool
+
+    with pool_lock:
+        if connection_pool is None or connection_pool.closed:
+            connection_pool = pool.ThreadedConnectionPool(POOL_MIN_CONN, POOL_MAX_CONN, **DB_CONFIG)
+        return connection_pool
+
+
+@contextmanager
+def get_connection():
+    """
+    커넥션 풀에서 연결을 빌려오고 사용이 끝나면 반납
+
+    with get_connection() as conn:
+        ...
+    """
+    db_pool = get_pool()
+    conn = db_pool.getconn()
+    try:
+        yield conn
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        # 끊어진 연결은 풀에 되돌리지 않고 닫음
+        db_pool.putconn(conn, close=bool(conn.closed))
+
+
+def close_pool():
+    """ 커넥션 풀의 모든 연결 종료 """
+    global connection_pool
+
+    with pool_lock:
+        if connection_pool is not None and not connection_pool.closed:
+            connection_pool.closeall()
+        connection_pool = None
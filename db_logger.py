@@ -0,0 +1,152 @@
+import atexit                       # 프로그램 종료 시 남은 로그 flush
+import queue                        # 로그를 모아두는 메모리 큐
+import threading                    # 큐를 비우는 백그라운드 스레드
+from psycopg2.extras import execute_values  # 여러 행을 한 번의 INSERT로 저장
+from db_config import get_connection, close_pool
+
+# DB 저장 실패 시 로그를 백업할 파일
+BACKUP_LOG_FILE = "log_backup.txt"
+
+# 한 번의 INSERT로 저장할 최대 로그 수 / 큐에서 로그를 기다리는 최대 시간(초)
+FLUSH_BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0
+
+INSERT_LOG_QUERY = """
+    INSERT INTO stock_data_log (step, log_type, ticker, message, from_date, to_date, start_time, end_time, result, created_at)
+    VALUES %s
+"""
+INSERT_LOG_TEMPLATE = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())"
+
+log_queue = queue.Queue()
+writer_thread = None
+writer_lock = threading.Lock()
+stop_event = threading.Event()
+
+
+def create_log_tables_if_not_exists():
+    """ PostgreSQL에 테이블 및 인덱스가 없을 경우 생성 """
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+
+            # 로그 테이블 생성 쿼리
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS stock_data_log (
+                    log_id SERIAL PRIMARY KEY,
+                    step VARCHAR(50) NOT NULL,
+                    log_type VARCHAR(50) NOT NULL,
+                    ticker VARCHAR(20),
+                    message TEXT,
+                    from_date DATE,
+                    to_date DATE,
+                    start_time TIMESTAMP DEFAULT NOW(),
+                    end_time TIMESTAMP,
+                    result VARCHAR(20),
+                    created_at TIMESTAMP DEFAULT NOW()
+                );
+            """)
+
+            # 인덱스 추가 (성능 최적화를 위해)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_stock_data_log_step ON stock_data_log(step);
+                CREATE INDEX IF NOT EXISTS idx_stock_data_log_log_type ON stock_data_log(log_type);
+                CREATE INDEX IF NOT EXISTS idx_stock_data_log_ticker ON stock_data_log(ticker);
+            """)
+
+            conn.commit()
+            cur.close()
+    except Exception as e:
+        print(f"[테이블 생성 오류] {e}")
+
+
+def log_to_db(step, log_type, ticker, message, from_date=None, to_date=None, start_time=None, end_time=None, result=None):
+    """
+    stock_data_log 테이블에 로그 저장 (비동기)
+
+    로그는 화면에 바로 출력한 뒤 메모리 큐에 쌓이고, 백그라운드 스레드가 모아서 한 번의 INSERT로 저장한다.
+    DB에 저장하지 못한 로그는 log_backup.txt에 백업한다.
+
+    :param step: 단계 (예: '추출', 'Parquet 변환')
+    :param log_type: 로그 레벨 (INFO, ERROR)
+    :param ticker: 종목 코드 (전체 대상이면 'ALL')
+    :param message: 상세 메시지
+    :param from_date: 데이터 조회 시작 날짜 (없으면 None)
+    :param to_date: 데이터 조회 종료 날짜 (없으면 None)
+    :param start_time: 프로세스 시작 시간
+    :param end_time: 프로세스 종료 시간
+    :param result: 결과 (성공 / 실패 등)
+    """
+    log_msg = f"[{step}] {log_type} | {ticker or '전체'} | {message} | {from_date} ~ {to_date}"
+    print(log_msg)
+
+    start_writer()
+    log_queue.put(((step, log_type, ticker, message, from_date, to_date, start_time, end_time, result), log_msg))
+
+
+def start_writer():
+    """ 로그 저장 백그라운드 스레드 시작 (이미 실행 중이면 무시) """
+    global writer_thread
+
+    with writer_lock:
+        if writer_thread is not None and writer_thread.is_alive():
+            return
+
+        stop_event.clear()
+        writer_thread = threading.Thread(target=writer_loop, name="db-log-writer", daemon=True)
+        writer_thread.start()
+
+
+def writer_loop():
+    """ 큐에 쌓인 로그를 FLUSH_BATCH_SIZE 개씩 모아 저장 (stop_event 설정 후 큐가 비면 종료) """
+    while not (stop_event.is_set() and log_queue.empty()):
+        try:
+            batch = [log_queue.get(timeout=FLUSH_INTERVAL)]
+        except queue.Empty:
+            continue
+
+        while len(batch) < FLUSH_BATCH_SIZE:
+            try:
+                batch.append(log_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        write_batch(batch)
+
+        for _ in batch:
+            log_queue.task_done()
+
+
+def write_batch(batch):
+    """ 로그 묶음을 한 번의 multi-row INSERT로 저장, 실패 시 log_backup.txt에 백업 """
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            execute_values(cur, INSERT_LOG_QUERY, [record for record, _ in batch], template=INSERT_LOG_TEMPLATE,
+                           page_size=FLUSH_BATCH_SIZE)
+            conn.commit()
+            cur.close()
+    except Exception as e:
+        print(f"[ERROR] 로그 입력 실패 ({len(batch)}건): {e}")
+        try:
+            with open(BACKUP_LOG_FILE, "a") as log_file:
+                for _, log_msg in batch:
+                    log_file.write(f"{log_msg} | [로그 저장 실패] {e}\n")
+        except Exception as backup_error:
+            print(f"[ERROR] 로그 백업 실패: {backup_error}")
+
+
+def flush_logs():
+    """ 큐에 쌓인 로그가 모두 저장될 때까지 대기 """
+    if writer_thread is not None and writer_thread.is_alive():
+        log_queue.join()
+
+
+def shutdown_logger():
+    """ 남은 로그를 모두 저장하고 백그라운드 스레드 종료 (프로그램 종료 시 자동 호출) """
+    stop_event.set()
+    if writer_thread is not None and writer_thread.is_alive():
+        writer_thread.join()
+    close_pool()
+
+
+atexit.register(shutdown_logger)
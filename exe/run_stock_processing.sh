@@ -24,36 +24,22 @@ eval "$(pyenv init -)"
 eval "$(pyenv virtualenv-init -)"
 pyenv activate hwetenv
 
-# 주식 데이터 추출  (인자 포함)
-echo "[INFO] fetch_stock_data.py 실행 중..."
-# /home/hwechang_jeong/.pyenv/versions/3.9.16/bin/python /home/hwechang_jeong/stock/fetch_stock_data.py $ARGS >> /home/hwechang_jeong/stock/exe/stock_data.log 2>&1
+# 수집 → Parquet 저장 → DB 적재 → 수정 계수 → 피처를 한 프로세스에서 실행 (인자 포함)
+# (무거운 라이브러리 import 는 한 번만, 단계 사이 데이터는 파일 대신 메모리로 전달)
+# 중간에 실패하면 python pipeline.py --from_stage load 처럼 실패한 단계부터 이어서 실행
+echo "[INFO] pipeline.py 실행 중..."
 
-python /home/hwechang_jeong/stock/fetch_stock_data.py $ARGS >> /home/hwechang_jeong/stock/exe/stock_data.log 2>&1
-# 실행 결과 확인
+python /home/hwechang_jeong/stock/pipeline.py $ARGS >> /home/hwechang_jeong/stock/exe/stock_data.log 2>&1
 if [ $? -ne 0 ]; then
-    echo "[ERROR] fetch_stock_data.py 실행 실패" >> /home/hwechang_jeong/stock/exe/stock_data.log
+    echo "[ERROR] pipeline.py 실행 실패" >> /home/hwechang_jeong/stock/exe/stock_data.log
     exit 1
 fi
 
-# CSV 파일 Parquet파일 변환
-echo "[INFO] csv_to_parquet.py 실행 중..."
-#/home/hwechang_jeong/.pyenv/versions/3.9.16/bin/python /home/hwechang_jeong/stock/csv_to_parquet.py >> /home/hwechang_jeong/stock/exe/stock_data.log 2>&1
-
-python /home/hwechang_jeong/stock/csv_to_parquet.py >> /home/hwechang_jeong/stock/exe/stock_data.log 2>&1
-if [ $? -ne 0 ]; then
-    echo "[ERROR] csv_to_parquet.py 실행 실패" >> /home/hwechang_jeong/stock/exe/stock_data.log
-    exit 1
-fi
-
-# Parquet파일 DB 저장
-#echo "[INFO] parquet_to_db.py 실행 중..."
-#/home/hwechang_jeong/.pyenv/versions/3.9.16/bin/python /home/hwechang_jeong/stock/parquet_to_db.py >> /home/hwechang_jeong/stock/exe/stock_data.log 2>&1
-
-#python /home/hwechang_jeong/stock/parquet_to_db.py >> /home/hwechang_jeong/stock/exe/stock_data.log 2>&1
-#if [ $? -ne 0 ]; then
-#    echo "[ERROR] parquet_to_db.py 실행 실패" >> /home/hwechang_jeong/stock/exe/stock_data.log
-#    exit 1
-#fi
+# 이전 방식 (단계별 별도 실행)
+#python /home/hwechang_jeong/stock/fetch_stock_data.py $ARGS >> /home/hwechang_jeong/stock/exe/stock_data.log 2>&1
+#python /home/hwechang_jeong/stock/csv_to_parquet.py >> /home/hwechang_jeong/stock/exe/stock_data.log 2>&1
+#python /home/hwechang_jeong/stock/adjusted_prices.py >> /home/hwechang_jeong/stock/exe/stock_data.log 2>&1
+#python /home/hwechang_jeong/stock/feature_store.py >> /home/hwechang_jeong/stock/exe/stock_data.log 2>&1
 
 echo "[INFO] 실행 완료"
 
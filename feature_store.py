@@ -0,0 +1,357 @@
+import argparse
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds                # 피처 데이터셋 조회 (경로/row group 통계 기반 필터)
+import pyarrow.parquet as pq
+from db_logger import log_to_db
+from parquet_dataset import file_signature, list_day_files, partition_path, write_partition
+from parquet_dataset import load_state as load_source_state, save_state as save_source_state
+from parquet_store import ARCHIVE_ROOT, DEFAULT_PARQUET_FOLDER, trade_dates
+from stock_query import query, query_day_files
+
+# 피처 데이터셋 폴더: features/year=YYYY/month=MM/part-0.parquet (Ticker, Date 정렬, 월 파티션)
+DEFAULT_FEATURE_FOLDER = os.path.join(ARCHIVE_ROOT, "features")
+
+# 종목별 월 마지막 행(마지막 달은 마지막 계산 행)의 피처 값/재귀 계산 상태 (다음 증분 계산의 시작값)
+# 과거 일별 파일이 새로 생기거나 바뀌면 그 날 이전의 마지막 상태에서 다시 계산
+# 어떤 일별 파일(크기, 수정 시각)을 반영했는지는 parquet_dataset 과 같은 상태 파일(_compaction_state.json)에 기록
+STATE_FILE_NAME = "_feature_state.parquet"
+
+# 지표 기간 (거래일 수)
+SMA_WINDOWS = [5, 20, 60]
+EMA_WINDOWS = [12, 26]
+VOLATILITY_WINDOW = 20
+RSI_WINDOW = 14
+ATR_WINDOW = 14
+TRADING_DAYS_PER_YEAR = 252
+
+# 증분 계산 시 이동 평균/변동성 계산을 위해 시작 상태 날짜 이전에서 다시 읽는 기간(달력 일수)
+# 가장 긴 창(60거래일) + 전일 종가 1행을 연휴가 긴 달(설/추석)에도 덮을 수 있는 크기
+LOOKBACK_DAYS = 120
+
+RAW_COLUMNS = ["Open", "High", "Low", "Close"]
+
+# 피처 컬럼 (Date, Ticker 뒤 순서)
+FEATURE_COLUMNS = (["return_1d", "log_return_1d"]
+                   + [f"sma_{window}" for window in SMA_WINDOWS]
+                   + [f"ema_{window}" for window in EMA_WINDOWS]
+                   + [f"volatility_{VOLATILITY_WINDOW}", f"rsi_{RSI_WINDOW}", f"atr_{ATR_WINDOW}"])
+
+# 재귀(지수 평활) 지표의 이어서 계산할 상태 값 (피처 컬럼이 아닌 것만)
+RSI_STATE_COLUMNS = ["rsi_avg_gain", "rsi_avg_loss"]
+STATE_COLUMNS = ["Ticker", "Date", "rows"] + FEATURE_COLUMNS + RSI_STATE_COLUMNS
+
+FEATURE_SCHEMA = pa.schema(
+    [pa.field("Date", pa.timestamp("ns", tz="UTC"), nullable=False),
+     pa.field("Ticker", pa.dictionary(pa.int32(), pa.string()), nullable=False)]
+    + [pa.field(column, pa.float64()) for column in FEATURE_COLUMNS]
+)
+
+
+def load_state(folder=DEFAULT_FEATURE_FOLDER):
+    """ 종목별 월 마지막 상태 (Ticker, Date, 누적 행 수, 피처 값, RSI 평균 상승/하락폭) 데이터프레임, 없으면 빈 데이터프레임 """
+    state_file = os.path.join(folder, STATE_FILE_NAME)
+    if not os.path.exists(state_file):
+        return pd.DataFrame({"Ticker": pd.Series(dtype=str), "Date": pd.Series(dtype="datetime64[ns, UTC]"),
+                             **{column: pd.Series(dtype=float) for column in STATE_COLUMNS[2:]}})
+    return pq.read_table(state_file).to_pandas().astype({"Ticker": str})
+
+
+def save_state(state, folder=DEFAULT_FEATURE_FOLDER):
+    """ 상태 파일을 임시 파일에 쓴 뒤 교체 """
+    os.makedirs(folder, exist_ok=True)
+    state_file = os.path.join(folder, STATE_FILE_NAME)
+    pq.write_table(pa.Table.from_pandas(state.reset_index(drop=True), preserve_index=False), state_file + ".tmp")
+    os.replace(state_file + ".tmp", state_file)
+
+
+def month_keys(dates):
+    """ UTC Date 시리즈 → 연월 (YYYYMM, 월별 상태 구분용) """
+    return dates.dt.year * 100 + dates.dt.month
+
+
+def state_trade_dates(state):
+    """ 상태 행의 거래소 현지 거래일 (datetime.date 시리즈) """
+    if state.empty:
+        return pd.Series(dtype=object, index=state.index)
+    table = pa.table({"Date": pa.array(state["Date"], type=FEATURE_SCHEMA.field("Date").type),
+                      "Ticker": pa.array(state["Ticker"].astype(str))})
+    return pd.Series(trade_dates(table).to_pylist(), index=state.index, dtype=object)
+
+
+def restart_days(changed_files):
+    """ 새로 생기거나 바뀐 일별 파일에 있는 종목별 가장 이른 거래일 (종목 → 거래일, 그 날부터 다시 계산) """
+    table = query_day_files(changed_files, None, ["Date", "Ticker"])
+    days = pd.DataFrame({"Ticker": table.column("Ticker").combine_chunks().dictionary_decode().to_pandas().astype(str),
+                         "day": trade_dates(table).to_pylist()})
+    return days.groupby("Ticker")["day"].min()
+
+
+def seed_state(state, days):
+    """ 다시 계산할 종목별 시작 상태: days(종목 → 거래일) 이전의 마지막 상태 행 (없는 종목은 처음부터 계산) """
+    state = state[state["Ticker"].isin(days.index)]
+    before = state_trade_dates(state) < state["Ticker"].map(days)
+    return state[before.astype(bool)].sort_values(["Ticker", "Date"]).groupby("Ticker").tail(1).reset_index(drop=True)
+
+
+def read_raw(tickers=None, from_date=None, root=DEFAULT_PARQUET_FOLDER):
+    """ Parquet 보관 데이터에서 OHLC를 (Ticker, Date) 순 데이터프레임으로 읽음 """
+    table = query(tickers, from_date=from_date, columns=RAW_COLUMNS, root=root)
+    data = table.to_pandas()
+    data["Ticker"] = data["Ticker"].astype(str)
+    return data
+
+
+def read_restart_raw(tickers, seeds, root=DEFAULT_PARQUET_FOLDER):
+    """
+    다시 계산할 종목의 OHLC (종목별 읽기 시작일이 같은 종목끼리 묶어 읽음)
+
+    시작 상태가 있는 종목은 그 날짜 LOOKBACK_DAYS 전부터, 없는 종목은 전체 기간을 읽는다.
+    새 데이터가 없는 종목(상장 폐지 등)은 읽지 않는다.
+    """
+    seed_days = dict(zip(seeds["Ticker"], state_trade_dates(seeds)))
+    groups = {}
+    for ticker in tickers:
+        seed_day = seed_days.get(ticker)
+        groups.setdefault(seed_day - timedelta(days=LOOKBACK_DAYS) if seed_day else None, []).append(ticker)
+
+    frames = [read_raw(group, from_date, root) for from_date, group in groups.items()]
+    return pd.concat(frames, ignore_index=True).sort_values(["Ticker", "Date"], kind="stable", ignore_index=True)
+
+
+def seeded_ewm(values, tickers, alpha, seeds):
+    """
+    종목별 지수 평활 (adjust=False, y_t = (1 - alpha) * y_{t-1} + alpha * x_t)
+
+    seeds({종목: 직전 평활값})에 값이 있는 종목은 그 값에서 이어서 계산하고, 없는 종목은 첫 값부터 시작한다.
+    (종목별로 시작값 행을 앞에 붙여 한 번의 groupby ewm 으로 계산)
+    """
+    seeds = seeds.dropna()
+    seed_frame = pd.DataFrame({"Ticker": seeds.index, "value": seeds.values, "order": -1})
+    frame = pd.DataFrame({"Ticker": tickers.values, "value": values.values, "order": np.arange(len(values))})
+    frame = pd.concat([seed_frame, frame], ignore_index=True).sort_values(["Ticker", "order"], kind="stable")
+
+    smoothed = frame.groupby("Ticker", sort=False)["value"].ewm(alpha=alpha, adjust=False).mean()
+    frame["smoothed"] = smoothed.reset_index(level=0, drop=True)
+    frame = frame[frame["order"] >= 0].sort_values("order")
+    return pd.Series(frame["smoothed"].values, index=values.index)
+
+
+def compute_features(data, state):
+    """
+    OHLC 데이터프레임(Ticker, Date 정렬)으로 피처 계산
+
+    state(종목별 시작 상태 한 행)에 있는 종목은 state의 Date 이후 행만 결과로 내보내고(그 이전 행은 이동 창/전일 종가
+    계산에만 사용), EMA/RSI/ATR 같은 재귀 지표는 state 값에서 이어서 계산한다.
+
+    :return: (피처 데이터프레임, 계산한 행의 종목별 월 마지막 상태 데이터프레임)
+    """
+    data = data.reset_index(drop=True)
+    state = state.set_index("Ticker")
+    grouped = data.groupby("Ticker", sort=False)
+
+    # 이동 창 지표: 다시 읽은 이전 구간을 포함해 한 번에 계산
+    previous_close = grouped["Close"].shift(1)
+    features = pd.DataFrame({"Date": data["Date"], "Ticker": data["Ticker"]})
+    features["return_1d"] = data["Close"] / previous_close - 1
+    features["log_return_1d"] = np.log(data["Close"] / previous_close)
+    for window in SMA_WINDOWS:
+        features[f"sma_{window}"] = grouped["Close"].rolling(window).mean().reset_index(level=0, drop=True)
+    features[f"volatility_{VOLATILITY_WINDOW}"] = (
+        features.groupby("Ticker", sort=False)["log_return_1d"].rolling(VOLATILITY_WINDOW).std()
+        .reset_index(level=0, drop=True) * np.sqrt(TRADING_DAYS_PER_YEAR))
+
+    # True Range (첫 행은 전일 종가가 없으므로 고가 - 저가)
+    true_range = pd.concat([data["High"] - data["Low"],
+                            (data["High"] - previous_close).abs(),
+                            (data["Low"] - previous_close).abs()], axis=1).max(axis=1)
+    change = data["Close"] - previous_close
+
+    # 결과로 내보낼 행: 상태가 없는 종목은 전체, 있는 종목은 마지막 계산일 이후
+    last_dates = state["Date"].reindex(data["Ticker"]).set_axis(data.index)
+    new = last_dates.isna() | (data["Date"] > last_dates)
+    tickers = data.loc[new, "Ticker"]
+
+    # 종목별 누적 행 번호 (이전 계산 행 수에 이어서) - 재귀 지표는 창 크기만큼 쌓이기 전에는 비움
+    rows = state["rows"].reindex(tickers).set_axis(tickers.index).fillna(0) + tickers.groupby(tickers).cumcount() + 1
+
+    smoothed = {}
+    for window in EMA_WINDOWS:
+        smoothed[f"ema_{window}"] = seeded_ewm(data.loc[new, "Close"], tickers, 2 / (window + 1),
+                                               state[f"ema_{window}"])
+        features.loc[new, f"ema_{window}"] = smoothed[f"ema_{window}"].where(rows >= window)
+
+    smoothed["rsi_avg_gain"] = seeded_ewm(change[new].clip(lower=0), tickers, 1 / RSI_WINDOW, state["rsi_avg_gain"])
+    smoothed["rsi_avg_loss"] = seeded_ewm((-change[new]).clip(lower=0), tickers, 1 / RSI_WINDOW,
+                                          state["rsi_avg_loss"])
+    rsi = 100 - 100 / (1 + smoothed["rsi_avg_gain"] / smoothed["rsi_avg_loss"])
+    features.loc[new, f"rsi_{RSI_WINDOW}"] = rsi.where(smoothed["rsi_avg_loss"] != 0, 100.0).where(rows > RSI_WINDOW)
+
+    smoothed[f"atr_{ATR_WINDOW}"] = seeded_ewm(true_range[new], tickers, 1 / ATR_WINDOW, state[f"atr_{ATR_WINDOW}"])
+    features.loc[new, f"atr_{ATR_WINDOW}"] = smoothed[f"atr_{ATR_WINDOW}"].where(rows >= ATR_WINDOW)
+
+    # 새 상태: 종목별 월 마지막 행 (재귀 지표는 창이 차기 전 값부터 이어서 계산해야 하므로 비우기 전 값을 저장)
+    latest = features[new].copy()
+    latest["rows"] = rows
+    for column, values in smoothed.items():
+        latest[column] = values
+    latest = latest.groupby(["Ticker", month_keys(latest["Date"])], sort=False).tail(1)
+    return features[new].reset_index(drop=True), latest[STATE_COLUMNS].reset_index(drop=True)
+
+
+def to_feature_table(features):
+    """ 피처 데이터프레임을 FEATURE_SCHEMA Arrow 테이블로 변환 """
+    columns = [pa.array(features["Date"], type=FEATURE_SCHEMA.field("Date").type),
+               pa.array(features["Ticker"].astype(str)).dictionary_encode()]
+    columns += [pa.array(features[column], type=pa.float64(), from_pandas=True) for column in FEATURE_COLUMNS]
+    return pa.table(columns, schema=FEATURE_SCHEMA)
+
+
+def write_features(table, restart, folder=DEFAULT_FEATURE_FOLDER):
+    """
+    피처 행을 월 파티션에 반영
+
+    다시 계산한 종목(restart: 종목 → 시작 상태 Date, 시작 상태가 없으면 NaT)은 그 Date 이후의 기존 행을 지우고 새 행으로 교체한다.
+    (다시 계산한 종목의 새 행은 시작 상태 이후 모든 달에 걸쳐 있으므로 새 행이 있는 달만 다시 쓰면 됨)
+
+    :return: {파티션 파일 경로: 행 수}
+    """
+    days = trade_dates(table)
+    months = pc.add(pc.multiply(pc.year(days), 100), pc.month(days))
+
+    written = {}
+    for month in sorted(pc.unique(months).to_pylist()):
+        part = table.filter(pc.equal(months, month))
+        partition_file = partition_path(folder, "month", (month // 100, month % 100))
+        if os.path.exists(partition_file):
+            existing = pq.read_table(partition_file).cast(FEATURE_SCHEMA)
+            existing_tickers = existing.column("Ticker").combine_chunks().dictionary_decode().to_pandas()
+            keep = ~existing_tickers.isin(restart.index) | (existing.column("Date").to_pandas() <= existing_tickers.map(restart))
+            existing = existing.filter(pa.array(keep.to_numpy()))
+            part = pa.concat_tables([existing, part]).unify_dictionaries().combine_chunks()
+        written[partition_file] = write_partition(part, partition_file)
+    return written
+
+
+def build_features(root=DEFAULT_PARQUET_FOLDER, folder=DEFAULT_FEATURE_FOLDER, full=False):
+    """
+    Parquet 보관 데이터로 피처 데이터셋 생성/갱신 (증분)
+
+    상태 파일에 기록된 (크기, 수정 시각)과 다른 일별 파일(새 거래일, 과거 날짜 보충/재수집)에 있는 종목만, 그 파일의 가장 이른
+    거래일 이전의 마지막 상태(월 마지막 행)에서 다시 계산한다. 이동 창 지표를 위해 시작 상태 날짜 이전 LOOKBACK_DAYS 만
+    종목별로 다시 읽고, EMA/RSI/ATR은 시작 상태 값에서 이어서 계산하므로 전체 기간을 다시 읽지 않는다.
+    처음 보는 종목(시작 상태가 없는 종목)은 전체 기간을 계산한다.
+
+    :param full: True 이면 상태를 무시하고 전체 다시 계산
+    :return: 추가/갱신한 피처 행 수
+    """
+    start_time = datetime.now()
+    day_files = list_day_files(root)
+    sources = {} if full else load_source_state(folder).get("sources", {})
+    signatures = {file_path: file_signature(file_path) for file_path in day_files}
+    changed_files = [file_path for file_path in day_files if sources.get(file_path) != signatures[file_path]]
+
+    if not changed_files:
+        print(f"[INFO] {folder} 최신 상태 (일별 파일 {len(day_files)}개 반영됨)")
+        return 0
+
+    state = load_state(folder)
+    if full:
+        state = state.iloc[0:0]
+
+    try:
+        days = restart_days(changed_files)
+        seeds = seed_state(state, days)
+        features = pd.DataFrame()
+        if len(days):
+            data = read_restart_raw(list(days.index), seeds, root)
+            features, checkpoints = compute_features(data, seeds)
+
+        if not features.empty:
+            # 다시 계산한 종목은 시작 상태까지의 상태만 남기고 새로 계산한 상태로 교체
+            restart = seeds.set_index("Ticker")["Date"].reindex(days.index)
+            kept = state[~state["Ticker"].isin(days.index) | (state["Date"] <= state["Ticker"].map(restart))]
+            new_state = pd.concat([kept, checkpoints], ignore_index=True) if len(kept) else checkpoints
+            new_state = new_state.sort_values(["Ticker", "Date"], kind="stable")
+            new_state = new_state.groupby(["Ticker", month_keys(new_state["Date"])], sort=False).tail(1)
+
+            written = write_features(to_feature_table(features), restart, folder)
+            save_state(new_state[STATE_COLUMNS], folder)
+        sources.update({file_path: signatures[file_path] for file_path in changed_files})
+        save_source_state(folder, {"root": root, "sources": sources})
+    except Exception as e:
+        print(f"[ERROR] 피처 계산 실패: {e}")
+        log_to_db("피처 계산", "ERROR", "ALL", f"{folder} 피처 계산 실패: {e}", start_time=start_time,
+                  end_time=datetime.now(), result="실패")
+        raise
+
+    if features.empty:
+        print(f"[INFO] {folder} 최신 상태 (일별 파일 {len(changed_files)}개 반영, 새 피처 없음)")
+        return 0
+
+    summary = f"{folder}: 피처 {len(features)}행 ({features['Ticker'].nunique()}개 종목), 파티션 {len(written)}개 작성"
+    print(f"[INFO] {summary}")
+    log_to_db("피처 계산", "INFO", "ALL", summary, features["Date"].min().date(), features["Date"].max().date(),
+              start_time, datetime.now(), "성공")
+    return len(features)
+
+
+def read_features(tickers=None, from_date=None, to_date=None, columns=None, folder=DEFAULT_FEATURE_FOLDER):
+    """
+    피처 조회 (월 파티션 경로와 Ticker/Date row group 통계로 필요한 부분만 읽음)
+
+    :param columns: 읽을 피처 컬럼 (None 이면 전체), Date와 Ticker는 항상 포함
+    :return: (Ticker, Date) 순 Arrow 테이블
+    """
+    read_columns = ["Date", "Ticker"] + (columns or FEATURE_COLUMNS)
+    dataset = ds.dataset(folder, format="parquet", partitioning="hive", exclude_invalid_files=True,
+                         ignore_prefixes=[".", "_"])
+
+    conditions = []
+    if tickers:
+        conditions.append(ds.field("Ticker").isin(list(tickers)))
+    if from_date:
+        conditions.append(ds.field("year") * 100 + ds.field("month") >= from_date.year * 100 + from_date.month)
+    if to_date:
+        conditions.append(ds.field("year") * 100 + ds.field("month") <= to_date.year * 100 + to_date.month)
+
+    condition = None
+    for expression in conditions:
+        condition = expression if condition is None else condition & expression
+    table = dataset.to_table(columns=read_columns, filter=condition)
+
+    if from_date or to_date:
+        days = trade_dates(table)
+        keep = pa.array([True] * table.num_rows)
+        if from_date:
+            keep = pc.and_(keep, pc.greater_equal(days, pa.scalar(from_date, type=pa.date32())))
+        if to_date:
+            keep = pc.and_(keep, pc.less_equal(days, pa.scalar(to_date, type=pa.date32())))
+        table = table.filter(keep)
+
+    sort_keys = pa.table({"Ticker": table.column("Ticker").combine_chunks().dictionary_decode(),
+                          "Date": table.column("Date")})
+    return table.take(pc.sort_indices(sort_keys, sort_keys=[("Ticker", "ascending"), ("Date", "ascending")]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="수익률/기술적 지표 피처 데이터셋 생성 프로그램")
+    parser.add_argument("--root", type=str, default=DEFAULT_PARQUET_FOLDER, help="일별 Parquet 루트 폴더")
+    parser.add_argument("--folder", type=str, default=DEFAULT_FEATURE_FOLDER, help="피처 데이터셋 폴더")
+    parser.add_argument("--full", action="store_true", help="이전 계산 상태를 무시하고 전체 다시 계산")
+    args = parser.parse_args()
+
+    build_features(root=args.root, folder=args.folder, full=args.full)
+
+
+"""
+# 새로 생기거나 바뀐 일별 파일(과거 날짜 보충 포함)의 종목만 다시 계산해서 features/year=YYYY/month=MM/ 에 반영
+python feature_store.py
+# 전체 다시 계산
+python feature_store.py --full
+# 조회 (python): feature_store.read_features(["AAPL"], date(2024, 1, 1), date(2024, 12, 31), ["rsi_14", "sma_20"])
+"""
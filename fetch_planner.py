@@ -0,0 +1,82 @@
+import os                                   # Parquet 파일 경로 확인
+from datetime import timedelta
+import pyarrow.compute as pc                # Ticker 컬럼 고유값 계산
+import pyarrow.parquet as pq                # Parquet footer/메타데이터만 읽기
+from db_config import get_connection
+from archive_manifest import tickers_by_day
+from market_calendar import open_tickers
+from parquet_store import DEFAULT_PARQUET_FOLDER, TICKERS_METADATA_KEY, parquet_day_path
+
+
+def read_parquet_tickers(parquet_file):
+    """
+    Parquet 파일에 들어 있는 종목 목록 반환
+
+    footer 메타데이터에 종목 목록이 기록되어 있으면 그것만 읽고, 없으면(이전 형식 파일) Ticker 컬럼 하나만 읽는다.
+    """
+    parquet = pq.ParquetFile(parquet_file)
+    metadata = parquet.metadata.metadata or {}
+
+    if TICKERS_METADATA_KEY in metadata:
+        return set(metadata[TICKERS_METADATA_KEY].decode("utf-8").split(","))
+
+    column = "Ticker" if "Ticker" in parquet.schema_arrow.names else "ticker"
+    return set(pc.unique(parquet.read(columns=[column]).column(0)).to_pylist())
+
+
+def existing_from_parquet(from_date, to_date, root=DEFAULT_PARQUET_FOLDER):
+    """
+    기간 내 날짜별 Parquet 파일에 이미 저장된 종목 목록 {날짜: set(종목)}
+
+    manifest에 기록된 날짜는 한 번의 조회로 가져오고, manifest에 없는 날짜만 Parquet footer를 읽는다.
+    """
+    existing = tickers_by_day(from_date, to_date)
+    current_date = from_date
+    while current_date <= to_date:
+        parquet_file = parquet_day_path(current_date, root)
+        if current_date not in existing and os.path.exists(parquet_file):
+            try:
+                existing[current_date] = read_parquet_tickers(parquet_file)
+            except Exception as e:
+                print(f"[WARN] Parquet 메타데이터 읽기 실패, 다시 수집: {parquet_file} ({e})")
+        current_date += timedelta(days=1)
+    return existing
+
+
+def existing_from_db(from_date, to_date):
+    """ stock_data 테이블에 이미 저장된 (날짜, 종목)을 한 번의 쿼리(기본키 인덱스 범위 조회)로 가져옴 """
+    existing = {}
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT date, ticker FROM stock_data WHERE date BETWEEN %s AND %s;", (from_date, to_date))
+        for day, ticker in cur.fetchall():
+            existing.setdefault(day, set()).add(ticker)
+        cur.close()
+    return existing
+
+
+def plan_fetch(tickers, from_date, to_date, source="parquet", root=DEFAULT_PARQUET_FOLDER):
+    """
+    요청한 (날짜 x 종목) 중 아직 저장되지 않은 칸만 골라 수집 계획을 만듦
+
+    :param tickers: 종목 코드 리스트
+    :param from_date: 시작 날짜 (date)
+    :param to_date: 종료 날짜 (date, 포함)
+    :param source: 기존 데이터 확인 위치 ('parquet' 또는 'db')
+    :param root: Parquet 루트 폴더
+    :return: {날짜: [수집할 종목, ...]} (해당 날짜 거래소가 열린 종목 중 빠진 것만, tickers 순서 유지)
+    """
+    if source == "db":
+        existing = existing_from_db(from_date, to_date)
+    else:
+        existing = existing_from_parquet(from_date, to_date, root)
+
+    plan = {}
+    current_date = from_date
+    while current_date <= to_date:
+        done = existing.get(current_date, set())
+        missing = [ticker for ticker in open_tickers(tickers, current_date) if ticker not in done]
+        if missing:
+            plan[current_date] = missing
+        current_date += timedelta(days=1)
+    return plan
@@ -1,137 +1,159 @@
 import yfinance as yf                       # Yahoo Finance에서 주식 데이터를 가져오는 라이브러리
 import pandas as pd                         # 데이터프레임을 다루기 위한 라이브러리
-import psycopg2                             # PostgreSQL과 연결하여 데이터베이스 작업을 수행하는 라이브러리
 import argparse                             # 커맨드라인에서 인자를 받을 수 있도록 도와주는 라이브러리
 import os                                   # 파일 및 디렉터리 조작을 위한 기본 라이브러리
+import random                               # 재시도 대기 시간에 지터(jitter)를 주기 위한 라이브러리
+import threading                            # 요청 속도 제한기(토큰 버킷) 동기화용
+import time                                 # 요청 속도 제한/재시도 대기용
+from concurrent.futures import ThreadPoolExecutor  # 종목 병렬 수집용 스레드 풀
 from datetime import datetime, timedelta    # 날짜 및 시간 관련 작업을 위한 라이브러리
-import pandas_market_calendars as mcal      # 주식 시장의 휴장일을 확인할 수 있는 라이브러리
-
-# PostgreSQL 연결 정보
-DB_CONFIG = {
-    "dbname": "hwechang",   # 사용할 PostgreSQL 데이터베이스 이름
-    "user": "hwechang",     # 데이터베이스 접속 사용자명
-    "password": "hwechang", # 데이터베이스 비밀번호
-    "host": "10.0.1.160",   # 데이터베이스 서버의 IP 주소 또는 호스트네임
-    "port": "5432"          # PostgreSQL 포트
-}
-
-
-# 기본 종목 리스트
-DEFAULT_TICKERS = [
-    "AAPL", "MSFT", "AMZN", "GOOGL", "TSLA", "CB", "JPM", "JNJ", "V", "WMT",
-    "PG", "NVDA", "HD", "UNH", "DIS", "PYPL", "BAC", "VZ", "NFLX", "KO",
-    "PEP", "INTC", "CSCO", "MRK", "XOM", "T", "PFE", "ABBV", "CRM", "MCD",
-    "WFC", "ACN", "DHR", "TXN", "LLY", "ORCL", "NKE", "LIN", "MDT", "AMD",
-    "COST", "HON", "UPS", "TMO", "C", "LMT", "GS", "NOW", "ADP", "SBUX",
-    "AMGN", "CAT", "ISRG", "MS", "DE", "CVS", "BMY", "LOW", "ABT", "CI",
-    "EQIX", "SCHW", "BKNG", "CME", "CHTR", "PLD", "SQ", "SPGI", "MMC", "EL",
-    "BLK", "ADI", "REGN", "CB", "BSX", "ZTS", "ECL", "AXP", "HCA", "KMB",
-    "SNPS", "PGR", "APD", "CDNS", "AON", "MCO", "MELI", "KLAC", "IDXX", "ROP",
-    "TRV", "CRWD", "GPN", "VRTX", "FDX", "AZO", "BIIB", "ORLY", "WBA", "DXCM",
-    "005930.KS", "000660.KS", "035420.KS", "207940.KS", "005380.KS",
-    "051910.KS", "035720.KS", "068270.KS", "028260.KS", "006400.KS",
-    "000270.KS", "012330.KS", "055550.KS", "105560.KS", "323410.KS",
-    "086790.KS", "033780.KS", "009150.KS", "034220.KS", "011170.KS",
-    "018260.KS", "032640.KS", "024110.KS", "011200.KS", "000810.KS",
-    "138930.KS", "088980.KS", "010140.KS", "005490.KS", "008770.KS",
-    "002790.KS", "003490.KS", "002380.KS", "003670.KS", "021240.KS",
-    "298020.KS", "000100.KS", "097950.KS", "010620.KS", "271560.KS",
-    "000120.KS", "010130.KS", "004020.KS", "023530.KS", "069960.KS",
-    "011780.KS", "004370.KS", "005300.KS", "011090.KS", "000880.KS",
-    "263800.KQ", "108320.KQ", "041510.KQ", "035900.KQ", "122990.KQ",
-    "089970.KQ", "290660.KQ", "232140.KQ", "226330.KQ", "039030.KQ",
-    "200470.KQ", "095700.KQ", "078600.KQ", "064290.KQ", "054920.KQ",
-    "025900.KQ", "085670.KQ", "290520.KQ", "143240.KQ", "214320.KQ",
-    "059100.KQ", "052790.KQ", "121800.KQ", "080220.KQ", "251970.KQ",
-    "035760.KQ", "263750.KQ", "293490.KQ", "278280.KQ", "068760.KQ",
-    "298540.KQ", "047810.KQ", "100130.KQ", "030200.KQ", "196170.KQ",
-    "138040.KQ", "131370.KQ", "025980.KQ", "096530.KQ", "278650.KQ",
-    "054180.KQ", "067160.KQ", "032190.KQ", "121600.KQ", "073490.KQ",
-    "214260.KQ", "278990.KQ", "046210.KQ", "178320.KQ", "192080.KQ"
-]
-
-def create_log_tables_if_not_exists():
-    """ PostgreSQL에 테이블 및 인덱스가 없을 경우 생성 """
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)    # DB 연결
-        cur = conn.cursor()                     # 커서 생성
-        
-        # 로그 테이블 생성 쿼리
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS stock_data_log (
-                log_id SERIAL PRIMARY KEY,
-                step VARCHAR(50) NOT NULL,
-                log_type VARCHAR(50) NOT NULL,
-                ticker VARCHAR(20),
-                message TEXT,
-                from_date DATE,
-                to_date DATE,
-                start_time TIMESTAMP DEFAULT NOW(),
-                end_time TIMESTAMP,
-                result VARCHAR(20),
-                created_at TIMESTAMP DEFAULT NOW()
-            );
-        """)
-
-        # 인덱스 추가 (성능 최적화를 위해)
-        cur.execute("""
-            CREATE INDEX IF NOT EXISTS idx_stock_data_log_step ON stock_data_log(step);
-            CREATE INDEX IF NOT EXISTS idx_stock_data_log_log_type ON stock_data_log(log_type);
-            CREATE INDEX IF NOT EXISTS idx_stock_data_log_ticker ON stock_data_log(ticker);
-        """)
-        
-        conn.commit()   # 변경 사항 저장
-        cur.close()     # 커서 닫기
-        conn.close()    # DB 연결 종료
-    except Exception as e:
-        print(f"[테이블 생성 오류] {e}")
-
-
-def log_to_db(step, log_type, ticker, message, from_date, to_date, start_time=None, end_time=None, result=None):
-    """ PostgreSQL에 로그 저장 """
-    log_msg = f"[{step}] {log_type} | {ticker or '전체'} | {message} | {from_date} ~ {to_date}"
-    print(log_msg)
-    
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO stock_data_log (step, log_type, ticker, message, from_date, to_date, start_time, end_time, result, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
-            """,
-            (step, log_type, ticker, message, from_date, to_date, start_time, end_time, result)
-        )
-        conn.commit()
-        cur.close()
-        conn.close()
-    except Exception as e:
-        print(f"[ERROR] 로그 입력 실패: {e}")  # ← 에러 메시지 출력 추가
-        # DB 저장 실패 시 log_backup.txt에 백업
-        with open("log_backup.txt", "a") as log_file:
-            log_file.write(f"{log_msg} | [로그 저장 실패] {e}\n")
-
-
-def is_market_closed(date):
-    """주어진 날짜가 미국 증시 휴장일인지 확인 (공식 휴장일 + 주말)"""
-    nyse = mcal.get_calendar("NYSE")        # 뉴욕 증권거래소(NYSE) 캘린더 가져오기
-    holidays = nyse.holidays().holidays     # 휴장일 목록
-
-    # 주말 여부 확인 (토요일: 5, 일요일: 6)
-    is_weekend = date.weekday() in [5, 6]
-
-    # 휴장일 또는 주말이면 True 반환
-    return date in holidays or is_weekend
-
-
-def save_csv(data, from_date):
-    """ CSV 파일을 저장할 폴더를 생성하고 데이터를 저장하는 함수 """
+from market_calendar import open_tickers, closed_exchanges  # 거래소별(NYSE/KRX/KOSDAQ) 휴장일 확인 (캐시 사용)
+from fetch_planner import plan_fetch        # 증분 수집: 이미 저장된 (날짜, 종목)을 제외한 수집 계획
+from parquet_store import BATCH_CHUNK_ROWS, DEFAULT_CSV_FOLDER, StockBatchBuilder, fetch_date, parquet_day_path, \
+    write_parquet_stream                    # 수집 버퍼(미리 잡아 둔 배열) → Parquet 직접 저장
+from history_cache import FETCHED_AT_ATTR, load_history, store_history  # Yahoo 응답 로컬 캐시 (재실행 시 네트워크 요청 없음)
+from archive_manifest import record_csv, record_parquet  # 생성된 파일 기록 (변환/적재 단계에서 사용)
+from intraday_store import INTRADAY_INTERVALS, INTRADAY_MAX_DAYS, DEFAULT_INTRADAY_MAX_DAYS, save_intraday, \
+    load_intraday_to_db                     # 분/시간 봉 저장 (intraday/ 보관 + stock_intraday 테이블)
+from db_logger import log_to_db, create_log_tables_if_not_exists  # 공용 DB 로그 저장 (커넥션 풀 + 비동기 일괄 저장)
+from metrics import count, export_metrics, span  # 단계/종목별 소요 시간, 행 수, 재시도 등 지표
+from ticker_registry import DEFAULT_GROUP, GROUP_PREFIX, register, select_tickers  # 종목 목록 (all / exchange:KRX / group:이름 선택)
+
+# 기본 종목 리스트 (종목 목록 tickers.csv 의 default 그룹, 중복 없음)
+DEFAULT_TICKERS = select_tickers([GROUP_PREFIX + DEFAULT_GROUP])
+
+# 일괄(batch) 모드에서 한 번의 yf.download 요청에 포함할 종목 수
+BATCH_SIZE = 100
+
+# 병렬 수집 기본값: 동시 작업 스레드 수 / 초당 최대 요청 수 (0 이하이면 제한 없음)
+DEFAULT_WORKERS = 1
+DEFAULT_MAX_RPS = 0
+
+# 요청 실패 시 재시도 횟수 및 지수 백오프 기본 대기 시간(초)
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 1.0
+
+# 저장 형식: csv (기존 방식, csv_to_parquet.py 로 변환) / parquet (Parquet 직접 저장) / both
+OUTPUT_FORMATS = ["csv", "parquet", "both"]
+DEFAULT_OUTPUT = "csv"
+
+# `stock.history().reset_index()` 결과의 컬럼 순서 (일괄 모드 결과도 이 순서에 맞춤)
+HISTORY_COLUMNS = ["Date", "Open", "High", "Low", "Close", "Volume", "Dividends", "Stock Splits"]
+
+# 봉 간격: 1d 는 기존 일별 수집, 그 외(INTRADAY_INTERVALS)는 분/시간 봉 수집
+DEFAULT_INTERVAL = "1d"
+INTRADAY_COLUMNS = ["Datetime", "Open", "High", "Low", "Close", "Volume", "Ticker"]
+
+
+class TokenBucket:
+    """
+    토큰 버킷 방식의 요청 속도 제한기 (여러 스레드에서 공유)
+
+    초당 `rate`개의 토큰이 채워지고 최대 `capacity`개까지 쌓인다. 요청 전 `acquire()`로 토큰 1개를 가져가며,
+    토큰이 없으면 채워질 때까지 대기한다. rate가 0 이하이면 제한하지 않는다.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+def fetch_ticker_history(ticker, check_date, rate_limiter=None, max_retries=MAX_RETRIES):
+    """
+    한 종목의 하루치 데이터를 가져옴 (속도 제한 + 지터를 준 지수 백오프 재시도)
+
+    예외가 max_retries 번 반복되면 마지막 예외를 그대로 발생시킨다. 데이터가 없는 경우(빈 결과)는 재시도하지 않는다.
+    같은 요청의 응답이 캐시(cache/history)에 있으면 요청하지 않고 캐시에서 읽는다.
+    """
+    start, end = check_date, check_date + timedelta(days=1)
+    cached = load_history(ticker, start, end)
+    if cached is not None:
+        count("history_cache_hits_total", stage="fetch")
+        return cached
+    count("history_cache_misses_total", stage="fetch")
+
+    for attempt in range(max_retries + 1):
+        if rate_limiter:
+            rate_limiter.acquire()
+
+        try:
+            stock = yf.Ticker(ticker)
+            stock_data = stock.history(start=str(start), end=str(end))
+            store_history(ticker, start, end, stock_data)
+            return stock_data
+        except Exception as e:
+            if attempt >= max_retries:
+                raise
+
+            # Full jitter: 0 ~ base * 2^attempt 사이에서 무작위 대기
+            count("fetch_retries_total", stage="fetch", ticker=ticker)
+            delay = random.uniform(0, RETRY_BASE_DELAY * (2 ** attempt))
+            print(f"[재시도] {ticker} {check_date} ({attempt + 1}/{max_retries}) {delay:.2f}초 후 재시도: {e}")
+            time.sleep(delay)
+
+
+def fetch_ticker(ticker, check_date, rate_limiter=None):
+    """
+    한 종목의 하루치 데이터(yfinance history 결과, Date 인덱스)를 가져와 반환하고 결과를 로그로 남김 (실패/빈 결과면 None)
+
+    로그의 start_time / end_time 은 이 종목 요청의 시작/종료 시각이며, 소요 시간은 종목별 지표로도 기록한다.
+    """
+    with span("fetch", ticker) as fetch_span:
+        try:
+            stock_data = fetch_ticker_history(ticker, check_date, rate_limiter)
+        except Exception as e:
+            count("stage_errors_total", stage="fetch")
+            log_to_db("추출", "ERROR", ticker, f"오류: {e}", check_date, check_date, start_time=fetch_span.start_time,
+                      end_time=datetime.now(), result="실패")
+            return None
+
+    if stock_data.empty:
+        count("fetch_empty_total", stage="fetch")
+        log_to_db("추출", "ERROR", ticker, f"데이터 없음", check_date, check_date,
+                  start_time=fetch_span.start_time, end_time=fetch_span.end_time, result="실패")
+        return None
+
+    count("rows_fetched_total", len(stock_data), stage="fetch")
+
+    log_to_db("추출", "INFO", ticker, f"데이터 가져오기 완료", check_date, check_date,
+              start_time=fetch_span.start_time, end_time=fetch_span.end_time, result="성공")
+    return stock_data
+
+
+def save_csv(data, from_date, merge_existing=False, fetched=None):
+    """
+    CSV 파일을 저장할 폴더를 생성하고 데이터를 저장하는 함수
+
+    merge_existing이 True이면 같은 날짜의 CSV가 이미 있을 때 새 데이터에 없는 종목의 기존 행을 유지한다. (증분 수집용)
+    fetched: 종목별 수집일 {종목: 'YYYY-MM-DD'} (없으면 오늘) - manifest 에 기록했다가 Parquet 변환 때 footer 로 옮김
+    """
     try:
         # `from_date`를 문자열로 변환 후 `-`를 기준으로 연도(year), 월(month), 일(day) 분리
         year, month, _ = str(from_date).split("-")
 
         # 저장할 폴더 경로 생성 (예: `csv/2025/01/`)
-        folder_path = os.path.join("csv", year, month)
+        folder_path = os.path.join(DEFAULT_CSV_FOLDER, year, month)
 
         # `os.makedirs()`를 사용하여 폴더 생성 (`exist_ok=True`로 이미 존재하면 무시)
         os.makedirs(folder_path, exist_ok=True)
@@ -144,14 +166,21 @@ def save_csv(data, from_date):
 
         # `Capital Gains` 컬럼이 있으면 제거 (대소문자 정확히 맞춰야 함)
         data = data.drop(columns=["Capital Gains"], errors="ignore")
+        new_tickers = sorted(set(data["Ticker"].astype(str)))
+
+        # 증분 수집: 기존 파일의 다른 종목 데이터와 합침
+        if merge_existing and os.path.exists(file_path):
+            existing = pd.read_csv(file_path)
+            existing = existing[~existing["Ticker"].isin(data["Ticker"])]
+            data = pd.concat([existing, data], ignore_index=True)
 
         # 데이터프레임을 CSV 파일로 저장 (index=False로 인덱스는 저장하지 않음)
         data.to_csv(file_path, index=False)
 
-        # CSV 파일 경로를 로그 파일(`csv_files.log`)에 저장 (Parquet 변환을 위해)
-        log_file_path = "/home/hwechang_jeong/stock/exe/csv_files.log"
-        with open(log_file_path, "a") as log_file:
-            log_file.write(file_path + "\n")  # 파일 경로를 한 줄씩 추가 기록
+        # CSV 파일 경로와 종목별 수집일을 manifest에 변환 대기로 기록 (Parquet 변환을 위해)
+        if fetched is None:
+            fetched = dict.fromkeys(new_tickers, fetch_date())
+        record_csv(file_path, fetched=fetched, merge_existing=merge_existing)
 
         return file_path  # 저장된 파일 경로 반환
     except Exception as e:
@@ -159,66 +188,142 @@ def save_csv(data, from_date):
         return None  # 실패 시 None 반환
 
 
-def fetch_stock_data(tickers, from_date, to_date):
-    """ 주식 데이터를 가져오고 CSV 및 DB에 저장 """
+def log_closed_exchanges(tickers, day_tickers, check_date, extract_start_time):
+    """ 휴장 로그 기록: 모든 거래소가 휴장이면 전체 휴장, 일부만 휴장이면 거래소별로 기록 """
+    if not day_tickers:
+        log_to_db("휴장", "INFO", "ALL", f"{check_date} 휴장일(주말포함)", check_date, check_date,
+                  start_time=extract_start_time, end_time=datetime.now(), result="휴장")
+        return
+
+    for exchange in closed_exchanges(tickers, check_date):
+        log_to_db("휴장", "INFO", "ALL", f"{check_date} {exchange} 휴장일", check_date, check_date,
+                  start_time=extract_start_time, end_time=datetime.now(), result="휴장")
+
+
+def apply_plan(day_tickers, plan, check_date, extract_start_time):
+    """ 증분 수집: 수집 계획(plan)에 없는, 즉 이미 저장된 종목을 빼고 반환 (plan이 None이면 그대로 반환) """
+    if plan is None or not day_tickers:
+        return day_tickers
+
+    missing = set(plan.get(check_date, []))
+    remaining = [ticker for ticker in day_tickers if ticker in missing]
+
+    skipped = len(day_tickers) - len(remaining)
+    if skipped:
+        log_to_db("건너뜀", "INFO", "ALL", f"{check_date} 이미 저장된 {skipped}개 종목 건너뜀", check_date, check_date,
+                  start_time=extract_start_time, end_time=datetime.now(), result="건너뜀")
+    return remaining
+
+
+def save_day_data(builder, check_date, extract_start_time, merge_existing=False, output=DEFAULT_OUTPUT):
+    """
+    하루치 수집 데이터(StockBatchBuilder)를 저장하고 결과를 로그로 남김 (저장 성공 여부 반환)
+
+    output이 parquet/both이면 CSV를 거치지 않고 버퍼의 Arrow 테이블 조각을 그대로 parquet/YYYY/MM/ 에 저장한다.
+    """
+    if not builder.num_rows:
+        log_to_db("추출", "ERROR", "ALL", "수집된 데이터 없음", check_date, check_date, start_time=extract_start_time,
+                  end_time=datetime.now(), result="실패")
+        return False
+
+    saved = True
+
+    if output in ("csv", "both"):
+        with span("save_csv") as csv_span:
+            file_path = save_csv(builder.to_frame(), check_date, merge_existing=merge_existing,
+                                 fetched=builder.fetched_dates)
+
+        if file_path:
+            count("bytes_written_total", os.path.getsize(file_path), stage="save_csv")
+            log_to_db("CSV 저장", "INFO", "ALL", f"파일 저장 완료: {file_path}", check_date, check_date,
+                      start_time=csv_span.start_time, end_time=csv_span.end_time, result="성공")
+        else:
+            count("stage_errors_total", stage="save_csv")
+            log_to_db("CSV 저장", "ERROR", "ALL", "CSV 저장 실패", check_date, check_date, start_time=csv_span.start_time,
+                      end_time=csv_span.end_time, result="실패")
+            saved = False
+
+    if output in ("parquet", "both"):
+        try:
+            with span("save_parquet") as parquet_span:
+                parquet_file = parquet_day_path(check_date)
+                write_parquet_stream(builder.tables(), parquet_file, merge_existing=True, fetched=builder.fetched_dates)
+                record_parquet(parquet_file)
+            count("bytes_written_total", os.path.getsize(parquet_file), stage="save_parquet")
+            log_to_db("Parquet 저장", "INFO", "ALL", f"파일 저장 완료: {parquet_file}", check_date, check_date,
+                      start_time=parquet_span.start_time, end_time=parquet_span.end_time, result="성공")
+        except Exception as e:
+            print(f"[ERROR] Parquet 저장 실패: {e}")
+            log_to_db("Parquet 저장", "ERROR", "ALL", f"Parquet 저장 실패: {e}", check_date, check_date,
+                      start_time=parquet_span.start_time, end_time=datetime.now(), result="실패")
+            saved = False
+
+    return saved
+
+
+def fetch_day(day_tickers, check_date, executor=None, rate_limiter=None):
+    """
+    하루치 종목들을 요청(executor가 있으면 스레드 풀로 동시에)해 StockBatchBuilder에 담아 반환 (실패/빈 종목 제외)
+
+    종목별 결과는 받는 즉시 버퍼 배열에 옮겨 담고 버리므로 데이터프레임 리스트를 모아 두지 않는다.
+    """
+    if executor:
+        # map은 입력(tickers) 순서대로 결과를 돌려주므로 결과 순서가 항상 같음
+        results = executor.map(lambda t: fetch_ticker(t, check_date, rate_limiter), day_tickers)
+    else:
+        results = (fetch_ticker(t, check_date, rate_limiter) for t in day_tickers)
+
+    builder = StockBatchBuilder(chunk_rows=min(BATCH_CHUNK_ROWS, len(day_tickers)))  # 하루치는 보통 종목당 1행
+    for ticker, stock_data in zip(day_tickers, results):
+        if stock_data is not None:
+            builder.append(stock_data, ticker, fetched_at=stock_data.attrs.get(FETCHED_AT_ATTR))
+    return builder
+
+
+def fetch_stock_data(tickers, from_date, to_date, workers=DEFAULT_WORKERS, max_rps=DEFAULT_MAX_RPS, plan=None,
+                     output=DEFAULT_OUTPUT):
+    """
+    주식 데이터를 가져오고 CSV 및 DB에 저장
+
+    workers가 2 이상이면 하루치 종목들을 스레드 풀로 동시에 요청한다. 모든 스레드가 하나의 토큰 버킷(max_rps)을
+    공유하며, 결과는 항상 tickers 순서대로 모은다.
+    plan({날짜: [종목]}, fetch_planner.plan_fetch 결과)이 주어지면 계획에 있는 (날짜, 종목)만 수집한다.
+    """
     start_time = datetime.now()  # 데이터 수집 시작 시간 기록
     log_to_db("시작", "INFO", "ALL", "데이터 수집 프로세스 시작", from_date, to_date, start_time=start_time, end_time=start_time,
               result="진행 중")
 
     current_date = datetime.strptime(from_date, "%Y-%m-%d")
+    register(tickers)  # 수집 스레드를 시작하기 전에 새 종목의 ticker_id 를 정함
 
     data_found = False  # 🔥 최소 1개라도 데이터를 저장했는지 확인하는 플래그
 
+    rate_limiter = TokenBucket(max_rps)
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+
     while current_date <= datetime.strptime(to_date, "%Y-%m-%d"):
         check_date = current_date.date()
         extract_start_time = datetime.now()  # 데이터 수집 시작 시간
         print(f"[날짜 확인] {check_date} 데이터 수집 시작")
 
-        if is_market_closed(check_date):
-            log_to_db("휴장", "INFO", "ALL", f"{check_date} 휴장일(주말포함)", check_date, check_date,
-                      start_time=extract_start_time, end_time=datetime.now(), result="휴장")
-        else:
-            all_data = []  # 수집된 데이터를 저장할 리스트
-
-            for ticker in tickers:
-                try:
-                    stock = yf.Ticker(ticker)
-                    stock_data = stock.history(start=str(check_date), end=str(check_date + timedelta(days=1)))
-
-                    if stock_data.empty:
-                        log_to_db("추출", "ERROR", ticker, f"데이터 없음", check_date, check_date,
-                                  start_time=extract_start_time, end_time=datetime.now(), result="실패")
-                        continue
-
-                    stock_data = stock_data.reset_index()
-                    stock_data["Ticker"] = ticker
-                    all_data.append(stock_data)
-
-                    log_to_db("추출", "INFO", ticker, f"데이터 가져오기 완료", check_date, check_date,
-                              start_time=extract_start_time, end_time=datetime.now(), result="성공")
-
-                except Exception as e:
-                    log_to_db("추출", "ERROR", ticker, f"오류: {e}", check_date, check_date, start_time=extract_start_time,
-                              end_time=datetime.now(), result="실패")
-
-            if all_data:
-                csv_start_time = datetime.now()
-                combined_data = pd.concat(all_data, ignore_index=True)
-                file_path = save_csv(combined_data, check_date)
-
-                if file_path:
-                    log_to_db("CSV 저장", "INFO", "ALL", f"파일 저장 완료: {file_path}", check_date, check_date,
-                              start_time=csv_start_time, end_time=datetime.now(), result="성공")
-                    data_found = True  # ✅ 최소 1개라도 데이터 저장이 되었음
-                else:
-                    log_to_db("CSV 저장", "ERROR", "ALL", "CSV 저장 실패", check_date, check_date, start_time=csv_start_time,
-                              end_time=datetime.now(), result="실패")
-            else:
-                log_to_db("추출", "ERROR", "ALL", "수집된 데이터 없음", check_date, check_date, start_time=extract_start_time,
-                          end_time=datetime.now(), result="실패")
+        day_tickers = open_tickers(tickers, check_date)  # 해당 날짜에 거래소가 열린 종목만 수집
+        log_closed_exchanges(tickers, day_tickers, check_date, extract_start_time)
+
+        if plan is not None and day_tickers:
+            day_tickers = apply_plan(day_tickers, plan, check_date, extract_start_time)
+            data_found = data_found or not day_tickers  # 이미 모두 저장된 날짜
+
+        if day_tickers:
+            builder = fetch_day(day_tickers, check_date, executor, rate_limiter)  # 수집된 데이터를 담은 버퍼
+
+            if save_day_data(builder, check_date, extract_start_time, merge_existing=plan is not None, output=output):
+                data_found = True  # ✅ 최소 1개라도 데이터 저장이 되었음
 
         current_date += timedelta(days=1)
 
+    if executor:
+        executor.shutdown()
+
     end_time = datetime.now()
 
     # ✅ 전체 과정에서 단 한 개라도 데이터가 저장되었는지 확인
@@ -230,12 +335,215 @@ def fetch_stock_data(tickers, from_date, to_date):
                   end_time=end_time, result="실패")
 
 
+def stack_download(raw, tickers, index_name):
+    """ yf.download 결과 (시각) x (종목, 항목) 를 (시각, 종목) 한 행씩 펼친 데이터프레임으로 변환 """
+    # 종목이 하나뿐이면 단일 레벨 컬럼으로 올 수 있으므로 (종목, 항목) 2단 컬럼으로 맞춤
+    if not isinstance(raw.columns, pd.MultiIndex):
+        raw.columns = pd.MultiIndex.from_product([tickers, raw.columns])
+
+    # (시각) x (종목, 항목) → (시각, 종목) x (항목)
+    data = raw.stack(level=0, future_stack=True)
+    data.index.names = [index_name, "Ticker"]
+    data = data.reset_index()
+
+    # 해당 시각에 거래가 없던 종목은 가격이 모두 NaN 으로 채워지므로 제거
+    return data.dropna(subset=["Open", "High", "Low", "Close"], how="all")
+
+
+def download_batch(tickers, from_date, to_date):
+    """
+    여러 종목의 기간 데이터를 한 번의 요청(yf.download)으로 가져와 (날짜, 종목) 한 행씩 펼친 데이터프레임으로 반환
+
+    :param tickers: 종목 코드 리스트
+    :param from_date: 시작 날짜 (date)
+    :param to_date: 종료 날짜 (date, 포함)
+    :return: `stock.history().reset_index()` + `Ticker` 와 같은 컬럼 구성의 데이터프레임
+    """
+    raw = yf.download(tickers, start=str(from_date), end=str(to_date + timedelta(days=1)), group_by="ticker",
+                      actions=True, auto_adjust=True, ignore_tz=True, threads=True, progress=False)
+
+    if raw is None or raw.empty:
+        return pd.DataFrame(columns=HISTORY_COLUMNS + ["Ticker"])
+
+    data = stack_download(raw, tickers, "Date")
+    data = data.reindex(columns=HISTORY_COLUMNS + ["Ticker"])
+    data[["Dividends", "Stock Splits"]] = data[["Dividends", "Stock Splits"]].fillna(0.0)
+    return data
+
+
+def download_intraday(tickers, from_date, to_date, interval):
+    """
+    여러 종목의 분/시간 봉을 한 번의 요청(yf.download)으로 가져와 (시각, 종목) 한 행씩 펼친 데이터프레임으로 반환
+
+    시각은 거래소 시간대가 붙은 채로 받는다. (저장 시 UTC로 변환)
+
+    :return: Datetime, Open, High, Low, Close, Volume, Ticker 컬럼의 데이터프레임
+    """
+    raw = yf.download(tickers, start=str(from_date), end=str(to_date + timedelta(days=1)), interval=interval,
+                      group_by="ticker", auto_adjust=True, ignore_tz=False, prepost=False, threads=True,
+                      progress=False)
+
+    if raw is None or raw.empty:
+        return pd.DataFrame(columns=INTRADAY_COLUMNS)
+
+    return stack_download(raw, tickers, "Datetime").reindex(columns=INTRADAY_COLUMNS)
+
+
+def fetch_stock_data_batch(tickers, from_date, to_date, batch_size=BATCH_SIZE, plan=None, output=DEFAULT_OUTPUT):
+    """
+    일괄(batch) 모드: 전체 기간 x 전체 종목을 몇 번의 대량 요청으로 받은 뒤 날짜별 CSV로 나누어 저장
+
+    저장 경로/파일명(`csv/YYYY/MM/stock_data_YYYY-MM-DD.csv`)과 로그 형식은 기존 모드와 동일하다.
+    plan이 주어지면 계획에 있는 종목만, 계획의 첫 날짜 ~ 마지막 날짜 구간만 요청한다.
+    """
+    start_time = datetime.now()
+    log_to_db("시작", "INFO", "ALL", "데이터 수집 프로세스 시작 (일괄 모드)", from_date, to_date, start_time=start_time,
+              end_time=start_time, result="진행 중")
+
+    start_date = datetime.strptime(from_date, "%Y-%m-%d").date()
+    end_date = datetime.strptime(to_date, "%Y-%m-%d").date()
+
+    register(tickers)  # 저장하기 전에 새 종목의 ticker_id 를 정함
+
+    # 증분 수집이면 빠진 칸이 있는 종목/구간만 요청
+    request_tickers, request_from, request_to = tickers, start_date, end_date
+    if plan is not None:
+        planned = set(ticker for day_tickers in plan.values() for ticker in day_tickers)
+        request_tickers = [ticker for ticker in tickers if ticker in planned]
+        if plan:
+            request_from, request_to = min(plan), max(plan)
+
+    # (1) 날짜별 수집 대상 종목을 먼저 정함 (요청 결과를 받는 즉시 날짜별 버퍼에 나눠 담기 위해)
+    data_found = False
+    day_plans = {}  # 날짜 → (수집 대상 종목, 처리 시작 시각)
+    current_date = start_date
+    while current_date <= end_date:
+        extract_start_time = datetime.now()
+        day_tickers = open_tickers(tickers, current_date)
+        log_closed_exchanges(tickers, day_tickers, current_date, extract_start_time)
+
+        if plan is not None and day_tickers:
+            day_tickers = apply_plan(day_tickers, plan, current_date, extract_start_time)
+            data_found = data_found or not day_tickers
+
+        if day_tickers:
+            day_plans[current_date] = (day_tickers, extract_start_time)
+        current_date += timedelta(days=1)
+
+    # (2) batch_size 개씩 묶어서 전체 기간을 한 번에 요청하고, 결과는 바로 날짜별 StockBatchBuilder 에 옮겨 담음
+    #     (요청 결과 데이터프레임을 모아 두었다가 합치지 않으므로 최대 메모리는 날짜별 버퍼 + 요청 한 번 분량)
+    order = {ticker: i for i, ticker in enumerate(tickers)}  # 기존 모드와 같은 종목 순서 유지
+    builders = {}
+    for i in range(0, len(request_tickers), batch_size):
+        chunk = request_tickers[i:i + batch_size]
+        try:
+            with span("batch_fetch") as batch_span:
+                batch_data = download_batch(chunk, request_from, request_to)
+            count("rows_fetched_total", len(batch_data), stage="batch_fetch")
+            log_to_db("일괄 추출", "INFO", "ALL", f"{len(chunk)}개 종목 일괄 요청 완료", start_date, end_date,
+                      start_time=batch_span.start_time, end_time=batch_span.end_time, result="성공")
+        except Exception as e:
+            log_to_db("일괄 추출", "ERROR", "ALL", f"{len(chunk)}개 종목 일괄 요청 오류: {e}", start_date, end_date,
+                      start_time=batch_span.start_time, end_time=datetime.now(), result="실패")
+            continue
+
+        day_keys = pd.to_datetime(batch_data["Date"]).dt.date
+        for day, day_data in batch_data.groupby(day_keys, sort=False):
+            if day not in day_plans:
+                continue
+            day_tickers = day_plans[day][0]
+            day_data = day_data[day_data["Ticker"].isin(day_tickers)]
+            if day_data.empty:
+                continue
+            if day not in builders:
+                builders[day] = StockBatchBuilder(chunk_rows=min(BATCH_CHUNK_ROWS, len(day_tickers)))  # 종목당 1행
+            builders[day].append(day_data.sort_values("Ticker", key=lambda col: col.map(order), kind="stable"))
+        del batch_data, day_keys
+
+    # (3) 날짜별 저장 (저장한 날짜의 버퍼는 바로 버림)
+    for current_date, (day_tickers, extract_start_time) in day_plans.items():
+        print(f"[날짜 확인] {current_date} 데이터 저장 시작")
+        builder = builders.pop(current_date, None) or StockBatchBuilder(chunk_rows=1)
+        found_tickers = set(builder.ticker_codes)
+
+        for ticker in day_tickers:
+            if ticker not in found_tickers:
+                log_to_db("추출", "ERROR", ticker, f"데이터 없음", current_date, current_date,
+                          start_time=extract_start_time, end_time=datetime.now(), result="실패")
+                continue
+
+            log_to_db("추출", "INFO", ticker, f"데이터 가져오기 완료", current_date, current_date,
+                      start_time=extract_start_time, end_time=datetime.now(), result="성공")
+
+        if save_day_data(builder, current_date, extract_start_time, merge_existing=plan is not None, output=output):
+            data_found = True
+
+    end_time = datetime.now()
+    if data_found:
+        log_to_db("완료", "INFO", "ALL", "데이터 수집 프로세스 완료", from_date, to_date, start_time=start_time, end_time=end_time,
+                  result="성공")
+    else:
+        log_to_db("완료", "ERROR", "ALL", "모든 날짜에 대해 데이터 없음", from_date, to_date, start_time=start_time,
+                  end_time=end_time, result="실패")
+
+
+def fetch_intraday(tickers, from_date, to_date, interval, batch_size=BATCH_SIZE, load_db=False):
+    """
+    분/시간 봉 수집: batch_size 개 종목씩, yfinance 요청 한도(INTRADAY_MAX_DAYS) 크기의 기간으로 나누어 대량 요청하고
+    intraday/<간격>/YYYY/MM/DD/<종목>.parquet 로 (거래일, 종목)별 저장
+
+    load_db가 True이면 저장한 파일을 stock_intraday 테이블에 COPY/upsert 한다.
+    """
+    start_time = datetime.now()
+    log_to_db("시작", "INFO", "ALL", f"{interval} 분봉 수집 프로세스 시작", from_date, to_date, start_time=start_time,
+              end_time=start_time, result="진행 중")
+
+    start_date = datetime.strptime(from_date, "%Y-%m-%d").date()
+    end_date = datetime.strptime(to_date, "%Y-%m-%d").date()
+    window_days = INTRADAY_MAX_DAYS.get(interval, DEFAULT_INTRADAY_MAX_DAYS)
+
+    files = []
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(window_start + timedelta(days=window_days - 1), end_date)
+        print(f"[기간 확인] {window_start} ~ {window_end} {interval} 분봉 수집 시작")
+
+        for i in range(0, len(tickers), batch_size):
+            chunk = tickers[i:i + batch_size]
+            try:
+                with span("intraday_fetch") as batch_span:
+                    data = download_intraday(chunk, window_start, window_end, interval)
+                    saved = save_intraday(data, interval)
+                files.extend(saved)
+                count("rows_fetched_total", len(data), stage="intraday_fetch")
+                log_to_db("분봉 추출", "INFO", "ALL",
+                          f"{len(chunk)}개 종목 {interval} 분봉 {len(data)}행, 파일 {len(saved)}개 저장", window_start,
+                          window_end, start_time=batch_span.start_time, end_time=batch_span.end_time, result="성공")
+            except Exception as e:
+                print(f"[ERROR] {interval} 분봉 수집 실패: {e}")
+                log_to_db("분봉 추출", "ERROR", "ALL", f"{len(chunk)}개 종목 {interval} 분봉 요청 오류: {e}", window_start,
+                          window_end, start_time=batch_span.start_time, end_time=datetime.now(), result="실패")
+
+        window_start = window_end + timedelta(days=1)
+
+    if files and load_db:
+        load_intraday_to_db(sorted(set(files)), interval)
+
+    end_time = datetime.now()
+    if files:
+        log_to_db("완료", "INFO", "ALL", f"{interval} 분봉 수집 프로세스 완료 (파일 {len(set(files))}개)", from_date, to_date,
+                  start_time=start_time, end_time=end_time, result="성공")
+    else:
+        log_to_db("완료", "ERROR", "ALL", f"{interval} 분봉 데이터 없음", from_date, to_date, start_time=start_time,
+                  end_time=end_time, result="실패")
+
 
 def main():
     """ 실행 코드: 커맨드라인 인자 처리 및 데이터 수집 실행 """
     parser = argparse.ArgumentParser(description="주식 데이터를 가져와 저장하는 프로그램")
 
-    parser.add_argument("--tickers", nargs="+", default=DEFAULT_TICKERS, help="조회할 종목 코드 리스트 (예: AAPL MSFT TSLA)")
+    parser.add_argument("--tickers", nargs="+", default=DEFAULT_TICKERS,
+                        help="조회할 종목 코드 리스트 (예: AAPL MSFT TSLA, all, exchange:KRX, group:us_top20)")
     # parser.add_argument("--from_date", type=str, default=(datetime.today() - timedelta(days=1)).strftime("%Y-%m-%d"),
     #                     help="시작 날짜 (예: 2024-01-01)")
     # parser.add_argument("--to_date", type=str, default=(datetime.today() - timedelta(days=1)).strftime("%Y-%m-%d"),
@@ -245,10 +553,46 @@ def main():
                         help="시작 날짜 (예: 2024-01-01)")
     parser.add_argument("--to_date", type=str, default='2025-01-22',
                         help="종료 날짜 (예: 2024-01-05)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="종목 동시 요청 스레드 수 (1이면 순차 실행)")
+    parser.add_argument("--max-rps", dest="max_rps", type=float, default=DEFAULT_MAX_RPS,
+                        help="초당 최대 요청 수 (0 이하이면 제한 없음)")
+    parser.add_argument("--batch", action="store_true",
+                        help="전체 기간/전체 종목을 몇 번의 대량 요청으로 받아 날짜별 CSV로 나누어 저장 (백필용)")
+    parser.add_argument("--batch_size", type=int, default=BATCH_SIZE, help="일괄 모드에서 한 번에 요청할 종목 수")
+    parser.add_argument("--incremental", choices=["parquet", "db"],
+                        help="이미 저장된 (날짜, 종목)은 건너뛰고 빠진 것만 수집 (확인 위치: parquet 또는 db)")
+    parser.add_argument("--output", choices=OUTPUT_FORMATS, default=DEFAULT_OUTPUT,
+                        help="저장 형식 (csv: 기존 CSV, parquet: Parquet 직접 저장, both: 둘 다)")
+    parser.add_argument("--interval", choices=[DEFAULT_INTERVAL] + INTRADAY_INTERVALS, default=DEFAULT_INTERVAL,
+                        help="봉 간격 (1d: 일별, 그 외: 분/시간 봉을 intraday/ 와 stock_intraday 테이블에 따로 저장)")
+    parser.add_argument("--load_db", action="store_true", help="분봉 수집 후 stock_intraday 테이블에 바로 적재")
     args = parser.parse_args()
+    args.tickers = select_tickers(args.tickers)
 
     create_log_tables_if_not_exists()  # 로그 테이블 생성
-    fetch_stock_data(args.tickers, args.from_date, args.to_date)
+    run_started_at = datetime.now()
+
+    if args.interval != DEFAULT_INTERVAL:
+        fetch_intraday(args.tickers, args.from_date, args.to_date, args.interval, batch_size=args.batch_size,
+                       load_db=args.load_db)
+        export_metrics("fetch_stock_data", run_started_at)
+        return
+
+    plan = None
+    if args.incremental:
+        plan = plan_fetch(args.tickers, datetime.strptime(args.from_date, "%Y-%m-%d").date(),
+                          datetime.strptime(args.to_date, "%Y-%m-%d").date(), source=args.incremental)
+        print(f"[수집 계획] {len(plan)}일, {sum(len(day_tickers) for day_tickers in plan.values())}건 수집 예정")
+
+    if args.batch:
+        fetch_stock_data_batch(args.tickers, args.from_date, args.to_date, batch_size=args.batch_size, plan=plan,
+                               output=args.output)
+    else:
+        fetch_stock_data(args.tickers, args.from_date, args.to_date, workers=args.workers, max_rps=args.max_rps,
+                         plan=plan, output=args.output)
+
+    # 단계/종목별 소요 시간, 행 수, 재시도 횟수 → metrics/fetch_stock_data.prom, .json, stock_data_metrics 테이블
+    export_metrics("fetch_stock_data", run_started_at)
 
 
 if __name__ == "__main__":
@@ -258,5 +602,18 @@ if __name__ == "__main__":
 
 """
 python3 stock_fetch.py --tickers AAPL MSFT TSLA --from_date 2024-02-01 --to_date 2024-02-07
+# 일괄 모드 (한 달 백필)
+python3 fetch_stock_data.py --from_date 2024-01-01 --to_date 2024-01-31 --batch
+# 병렬 모드 (8 스레드, 초당 최대 10건)
+python3 fetch_stock_data.py --workers 8 --max-rps 10
+# 종목 목록(tickers.csv)에서 거래소 / 그룹으로 선택 (여러 개 조합 가능, 중복은 한 번만 수집)
+python3 fetch_stock_data.py --tickers exchange:KRX exchange:KOSDAQ
+python3 fetch_stock_data.py --tickers group:us_top20 005930.KS
+# 증분 모드 (parquet/ 에 이미 있는 날짜·종목은 건너뜀, DB 기준은 --incremental db)
+python3 fetch_stock_data.py --from_date 2025-01-01 --to_date 2025-01-31 --incremental parquet
+# CSV 없이 Parquet로 바로 저장 (CSV도 남기려면 --output both)
+python3 fetch_stock_data.py --output parquet
+# 5분봉 수집 (intraday/5m/YYYY/MM/DD/<종목>.parquet 저장 후 stock_intraday 테이블에 적재)
+python3 fetch_stock_data.py --interval 5m --from_date 2025-01-14 --to_date 2025-01-22 --load_db
 
 """
\ No newline at end of file
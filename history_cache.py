@@ -0,0 +1,182 @@
+import argparse
+import hashlib                              # 요청(종목, 간격, 기간) → 캐시 파일 이름
+import os
+import shutil
+import threading                            # 여러 스레드(병렬 수집)에서 같은 캐시 사용
+from datetime import datetime, timezone
+import pyarrow as pa
+import pyarrow.ipc as ipc                   # Arrow IPC 파일 (압축, memory map 으로 바로 읽기)
+
+# 응답 캐시 폴더 (STOCK_HISTORY_CACHE_DIR 환경 변수로 변경, 빈 값이면 캐시 사용 안 함)
+# cache/history/<키 앞 2자리>/<키>.arrow
+HISTORY_CACHE_DIR = os.environ.get("STOCK_HISTORY_CACHE_DIR", os.path.join("cache", "history"))
+
+# 캐시 전체 최대 크기 (넘으면 가장 오래 사용하지 않은 파일부터 삭제해 EVICT_RATIO 까지 줄임)
+HISTORY_CACHE_MAX_BYTES = int(os.environ.get("STOCK_HISTORY_CACHE_MB", "1024")) * 1024 * 1024
+EVICT_RATIO = 0.9
+
+# 받을 때 아직 끝나지 않은 날(오늘)이 포함되어 있던 응답의 유효 시간 (초) - 기간이 모두 끝난 뒤 받은 응답은 만료되지 않음
+OPEN_DAY_TTL_SECONDS = 15 * 60
+
+IPC_COMPRESSION = "zstd"
+FETCHED_AT_KEY = b"fetched_at"
+
+# 캐시에서 읽은 데이터프레임의 attrs 에 응답을 받은 시각(UTC timestamp)을 담는 키 (Parquet 에 수집일로 기록)
+FETCHED_AT_ATTR = "fetched_at"
+
+cache_lock = threading.Lock()
+cache_bytes = None                  # 캐시 폴더 전체 크기 (처음 저장할 때 한 번 폴더를 훑어 계산한 뒤 저장/삭제마다 갱신)
+
+
+def cache_key(ticker, start, end, interval="1d"):
+    """ 요청 내용으로 만든 캐시 키 (같은 종목/간격/기간 요청은 항상 같은 파일) """
+    return hashlib.sha256(f"{ticker}|{interval}|{start}|{end}".encode("utf-8")).hexdigest()
+
+
+def cache_file_path(key):
+    return os.path.join(HISTORY_CACHE_DIR, key[:2], f"{key}.arrow")
+
+
+def is_closed_range(end, at=None):
+    """ at(UTC timestamp, 없으면 지금) 시점에 요청 기간(end 미포함)이 모두 끝났는지 (UTC 날짜가 바뀌면 모든 거래소 장 마감) """
+    now = datetime.fromtimestamp(at, timezone.utc) if at is not None else datetime.now(timezone.utc)
+    return end <= now.date()
+
+
+def cache_files():
+    """ 캐시 파일 목록: [(마지막 사용 시각, 크기, 경로)] """
+    files = []
+    for folder, _, names in os.walk(HISTORY_CACHE_DIR):
+        for name in names:
+            if name.endswith(".arrow"):
+                file_path = os.path.join(folder, name)
+                stat = os.stat(file_path)
+                files.append((stat.st_mtime, stat.st_size, file_path))
+    return files
+
+
+def remove_file(file_path):
+    global cache_bytes
+    try:
+        size = os.path.getsize(file_path)
+        os.remove(file_path)
+    except OSError:
+        return
+    if cache_bytes is not None:
+        cache_bytes -= size
+
+
+def evict(max_bytes=None):
+    """ 캐시 크기가 max_bytes 를 넘으면 마지막 사용 시각(mtime)이 오래된 파일부터 삭제 (삭제한 파일 수 반환) """
+    global cache_bytes
+    max_bytes = HISTORY_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    files = sorted(cache_files())
+    cache_bytes = sum(size for _, size, _ in files)
+    if cache_bytes <= max_bytes:
+        return 0
+
+    removed = 0
+    for _, _, file_path in files:
+        if cache_bytes <= max_bytes * EVICT_RATIO:
+            break
+        remove_file(file_path)
+        removed += 1
+    return removed
+
+
+def load_history(ticker, start, end, interval="1d"):
+    """
+    캐시에 저장된 응답을 데이터프레임으로 반환 (없거나 만료되었으면 None)
+
+    읽은 파일은 mtime 을 갱신해 최근 사용으로 표시한다. (크기 초과 시 삭제 순서 기준)
+    응답을 받은 시각은 data.attrs[FETCHED_AT_ATTR] 로 돌려준다. (가격에 반영된 배당/분할의 기준 시각)
+    기간이 끝나기 전(장중)에 받은 응답은 지금은 기간이 끝났더라도 마지막 봉이 빠졌을 수 있으므로 OPEN_DAY_TTL_SECONDS 가
+    지나면 버리고 다시 요청한다. 기간이 끝난 뒤 받은 응답만 계속 사용한다.
+    """
+    if not HISTORY_CACHE_DIR:
+        return None
+
+    file_path = cache_file_path(cache_key(ticker, start, end, interval))
+    if not os.path.exists(file_path):
+        return None
+
+    try:
+        with pa.memory_map(file_path) as source:
+            table = ipc.open_file(source).read_all()
+        fetched_at = float((table.schema.metadata or {}).get(FETCHED_AT_KEY, b"0"))
+        if not is_closed_range(end, fetched_at):
+            if datetime.now(timezone.utc).timestamp() - fetched_at > OPEN_DAY_TTL_SECONDS:
+                with cache_lock:
+                    remove_file(file_path)
+                return None
+        os.utime(file_path)
+        data = table.to_pandas()
+        data.attrs[FETCHED_AT_ATTR] = fetched_at
+        return data
+    except Exception as e:
+        print(f"[ERROR] 응답 캐시 읽기 실패, 삭제 후 다시 요청: {file_path}: {e}")
+        with cache_lock:
+            remove_file(file_path)
+        return None
+
+
+def store_history(ticker, start, end, data, interval="1d"):
+    """
+    응답 데이터프레임(인덱스 포함)을 Arrow IPC 파일로 저장하고 캐시 크기가 넘으면 정리
+
+    빈 응답은 일시적인 오류일 수 있으므로 저장하지 않는다. 저장 실패는 수집에 영향을 주지 않도록 출력만 한다.
+    """
+    global cache_bytes
+    if not HISTORY_CACHE_DIR or data is None or data.empty:
+        return
+
+    file_path = cache_file_path(cache_key(ticker, start, end, interval))
+    try:
+        table = pa.Table.from_pandas(data, preserve_index=True)
+        metadata = dict(table.schema.metadata or {})
+        metadata[FETCHED_AT_KEY] = str(datetime.now(timezone.utc).timestamp()).encode("utf-8")
+        table = table.replace_schema_metadata(metadata)
+
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        temp_file = f"{file_path}.{threading.get_ident()}.tmp"
+        with ipc.new_file(temp_file, table.schema, options=ipc.IpcWriteOptions(compression=IPC_COMPRESSION)) as writer:
+            writer.write_table(table)
+        os.replace(temp_file, file_path)
+    except Exception as e:
+        print(f"[ERROR] 응답 캐시 저장 실패: {ticker} {start} ~ {end}: {e}")
+        return
+
+    with cache_lock:
+        if cache_bytes is None:
+            evict()
+        else:
+            cache_bytes += os.path.getsize(file_path)
+            if cache_bytes > HISTORY_CACHE_MAX_BYTES:
+                evict()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Yahoo 응답 캐시(cache/history) 상태 확인 및 정리 프로그램")
+    parser.add_argument("--max_mb", type=int, help="이 크기(MB)를 넘으면 오래 사용하지 않은 파일부터 삭제")
+    parser.add_argument("--clear", action="store_true", help="캐시 전체 삭제")
+    args = parser.parse_args()
+
+    if args.clear:
+        shutil.rmtree(HISTORY_CACHE_DIR, ignore_errors=True)
+        print(f"[INFO] 응답 캐시 삭제: {HISTORY_CACHE_DIR}")
+    elif args.max_mb is not None:
+        print(f"[INFO] 응답 캐시 {evict(args.max_mb * 1024 * 1024)}개 파일 삭제")
+
+    files = cache_files() if os.path.isdir(HISTORY_CACHE_DIR) else []
+    print(f"[INFO] 응답 캐시 {HISTORY_CACHE_DIR}: 파일 {len(files)}개, {sum(size for _, size, _ in files) / 1024 / 1024:.1f}MB "
+          f"(최대 {HISTORY_CACHE_MAX_BYTES / 1024 / 1024:.0f}MB)")
+
+
+"""
+# 캐시 상태 확인 / 500MB 로 줄이기 / 전체 삭제
+python history_cache.py
+python history_cache.py --max_mb 500
+python history_cache.py --clear
+# 캐시 없이 수집 (항상 Yahoo 에 요청)
+STOCK_HISTORY_CACHE_DIR= python fetch_stock_data.py
+"""
@@ -0,0 +1,205 @@
+import argparse
+import glob                                 # 날짜별 분봉 파일 목록
+import os
+from datetime import datetime, timedelta
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from db_config import get_connection
+from db_logger import log_to_db
+from metrics import count, export_metrics, span
+from parquet_store import ARCHIVE_ROOT, PARQUET_COMPRESSION, to_utc_timestamps, trade_dates
+from schema_manager import INTRADAY_TABLE, create_intraday_table, ensure_partitions_for_table
+from stock_loader import MERGE_MODES, DEFAULT_MERGE_MODE, COPY_BATCH_ROWS, copy_table, create_staging_table, \
+    ensure_unique_key, merge_staging_to_target
+
+# 분/시간 봉 간격 (yfinance interval 값)
+INTRADAY_INTERVALS = ["1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h"]
+
+# yfinance 한 번의 요청으로 받을 수 있는 최대 기간(일) - 1분봉은 7일, 나머지 분봉은 60일
+INTRADAY_MAX_DAYS = {"1m": 7}
+DEFAULT_INTRADAY_MAX_DAYS = 60
+
+# 분봉 보관 폴더: intraday/<간격>/YYYY/MM/DD/<종목>.parquet (하루 x 종목 단위 파일)
+DEFAULT_INTRADAY_FOLDER = os.path.join(ARCHIVE_ROOT, "intraday")
+
+INTRADAY_STAGING_TABLE = "stock_intraday_staging"
+
+# 적재용 테이블에 이 행 수 이상 쌓이면 upsert 후 커밋 (한 트랜잭션 크기 제한)
+INTRADAY_MERGE_ROWS = 1_000_000
+
+# 분봉 Parquet 스키마 (컬럼 이름은 yfinance 분봉 결과와 동일, Datetime은 UTC)
+INTRADAY_SCHEMA = pa.schema([
+    pa.field("Datetime", pa.timestamp("ns", tz="UTC"), nullable=False),
+    pa.field("Open", pa.float64()),
+    pa.field("High", pa.float64()),
+    pa.field("Low", pa.float64()),
+    pa.field("Close", pa.float64()),
+    pa.field("Volume", pa.int64()),
+    pa.field("Ticker", pa.dictionary(pa.int32(), pa.string()), nullable=False),
+])
+INTRADAY_PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+INTRADAY_DB_COLUMNS = ["ts", "ticker", "interval", "open", "high", "low", "close", "volume"]
+INTRADAY_KEY_COLUMNS = ["ts", "ticker", "interval"]
+
+
+def intraday_file_path(interval, day, ticker, root=DEFAULT_INTRADAY_FOLDER):
+    """ 분봉 파일 경로 (예: intraday/5m/2025/01/14/AAPL.parquet) """
+    return os.path.join(root, interval, f"{day:%Y}", f"{day:%m}", f"{day:%d}", f"{ticker}.parquet")
+
+
+def to_intraday_table(data):
+    """ 분봉 데이터프레임(Datetime, OHLCV, Ticker)을 INTRADAY_SCHEMA Arrow 테이블로 변환 """
+    data = data.reset_index(drop=True)
+    tickers = data["Ticker"].astype(str)
+
+    columns = {"Datetime": pa.array(to_utc_timestamps(data["Datetime"], tickers),
+                                    type=INTRADAY_SCHEMA.field("Datetime").type)}
+    for name in INTRADAY_PRICE_COLUMNS:
+        columns[name] = pa.array(pd.to_numeric(data[name], errors="coerce"), type=INTRADAY_SCHEMA.field(name).type,
+                                 from_pandas=True)
+    columns["Ticker"] = pa.array(tickers).dictionary_encode()
+    return pa.table([columns[field.name] for field in INTRADAY_SCHEMA], schema=INTRADAY_SCHEMA)
+
+
+def save_intraday(data, interval, root=DEFAULT_INTRADAY_FOLDER):
+    """
+    분봉 데이터를 (거래소 현지 거래일, 종목)별 파일로 나누어 저장 (같은 날짜/종목 파일은 새 데이터로 교체)
+
+    :return: 저장한 파일 경로 리스트
+    """
+    if data is None or data.empty:
+        return []
+
+    table = to_intraday_table(data)
+    keys = pd.DataFrame({
+        "day": trade_dates(table, column="Datetime").to_pandas(),
+        "ticker": table.column("Ticker").to_pandas().astype(str),
+    })
+
+    files = []
+    for (day, ticker), index in keys.groupby(["day", "ticker"]).indices.items():
+        part = table.take(pa.array(index))
+        part = part.take(pc.sort_indices(part, sort_keys=[("Datetime", "ascending")]))
+        file_path = intraday_file_path(interval, day, ticker, root)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        pq.write_table(part, file_path + ".tmp", compression=PARQUET_COMPRESSION)
+        os.replace(file_path + ".tmp", file_path)
+        files.append(file_path)
+    return files
+
+
+def list_intraday_files(interval, from_date, to_date, root=DEFAULT_INTRADAY_FOLDER):
+    """ 기간 내 분봉 파일 목록 (날짜 폴더 단위로 찾음, 날짜순) """
+    files = []
+    current_date = from_date
+    while current_date <= to_date:
+        files.extend(sorted(glob.glob(os.path.join(root, interval, f"{current_date:%Y}", f"{current_date:%m}",
+                                                   f"{current_date:%d}", "*.parquet"))))
+        current_date += timedelta(days=1)
+    return files
+
+
+def to_intraday_db_table(table, interval):
+    """ INTRADAY_SCHEMA 테이블을 stock_intraday 컬럼 이름/순서의 테이블로 변환 """
+    return pa.table([
+        table.column("Datetime"),
+        table.column("Ticker").combine_chunks().dictionary_decode(),
+        pa.array([interval] * table.num_rows, type=pa.string()),
+        table.column("Open"),
+        table.column("High"),
+        table.column("Low"),
+        table.column("Close"),
+        table.column("Volume"),
+    ], names=INTRADAY_DB_COLUMNS)
+
+
+def merge_intraday_staging(conn, mode):
+    """ 적재용 테이블 → stock_intraday upsert 후 커밋하고 적재용 테이블을 비움 """
+    ensure_partitions_for_table(conn, INTRADAY_STAGING_TABLE, table=INTRADAY_TABLE)
+    counts = merge_staging_to_target(conn, staging_table=INTRADAY_STAGING_TABLE, target_table=INTRADAY_TABLE,
+                                     mode=mode, db_columns=INTRADAY_DB_COLUMNS, key_columns=INTRADAY_KEY_COLUMNS)
+    cur = conn.cursor()
+    cur.execute(f"TRUNCATE {INTRADAY_STAGING_TABLE};")
+    cur.close()
+    conn.commit()
+    return counts
+
+
+def load_intraday_to_db(files, interval, mode=DEFAULT_MERGE_MODE, batch_rows=COPY_BATCH_ROWS,
+                        merge_rows=INTRADAY_MERGE_ROWS):
+    """
+    분봉 파일들을 COPY로 적재용 테이블에 올리고 INTRADAY_MERGE_ROWS 행마다 stock_intraday에 upsert
+
+    파일은 batch_rows 행씩 읽어 보내므로 실행당 수백만 행이어도 메모리/트랜잭션 크기가 일정하다.
+
+    :return: {"copied", "inserted", "updated", "skipped"} 행 수
+    """
+    totals = {"copied": 0, "inserted": 0, "updated": 0, "skipped": 0}
+    if not files:
+        print("[INFO] 적재할 분봉 파일 없음")
+        return totals
+
+    load_span = None
+    try:
+        with span("intraday_load") as load_span, get_connection() as conn:
+            create_intraday_table(conn)
+            ensure_unique_key(conn, INTRADAY_TABLE, INTRADAY_KEY_COLUMNS)
+            create_staging_table(conn, INTRADAY_STAGING_TABLE, like_table=INTRADAY_TABLE)
+
+            staged = 0
+            cur = conn.cursor()
+            for file_path in files:
+                for batch in pq.ParquetFile(file_path).iter_batches(batch_size=batch_rows):
+                    table = pa.Table.from_batches([batch])
+                    copy_table(cur, to_intraday_db_table(table, interval), INTRADAY_STAGING_TABLE)
+                    staged += table.num_rows
+                    totals["copied"] += table.num_rows
+
+                if staged >= merge_rows:
+                    for key, value in merge_intraday_staging(conn, mode).items():
+                        totals[key] += value
+                    staged = 0
+            cur.close()
+
+            if staged:
+                for key, value in merge_intraday_staging(conn, mode).items():
+                    totals[key] += value
+
+        summary = (f"{interval} 분봉 파일 {len(files)}개: COPY {totals['copied']}행, 추가 {totals['inserted']}행, "
+                   f"수정 {totals['updated']}행, 건너뜀 {totals['skipped']}행")
+        print(f"[INFO] {summary}")
+        for result in ("inserted", "updated", "skipped"):
+            count("rows_loaded_total", totals[result], stage="intraday_load", result=result)
+        log_to_db("분봉 적재", "INFO", "ALL", summary, start_time=load_span.start_time, end_time=load_span.end_time,
+                  result="성공")
+    except Exception as e:
+        print(f"[Error] 분봉 적재 실패: {e}")
+        log_to_db("분봉 적재", "ERROR", "ALL", f"{interval} 분봉 적재 실패: {e}",
+                  start_time=load_span.start_time if load_span else datetime.now(), end_time=datetime.now(),
+                  result="실패")
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="분/시간 봉 Parquet 파일을 DB(stock_intraday)에 저장하는 프로그램")
+    parser.add_argument("--interval", choices=INTRADAY_INTERVALS, required=True, help="봉 간격")
+    parser.add_argument("--from_date", type=str, required=True, help="시작 날짜 (예: 2025-01-14)")
+    parser.add_argument("--to_date", type=str, required=True, help="종료 날짜 (예: 2025-01-22)")
+    parser.add_argument("--on_conflict", choices=MERGE_MODES, default=DEFAULT_MERGE_MODE,
+                        help="이미 있는 (ts, ticker, interval) 처리 방식 (nothing: 건너뜀, update: 덮어쓰기)")
+    args = parser.parse_args()
+    run_started_at = datetime.now()
+
+    intraday_files = list_intraday_files(args.interval, datetime.strptime(args.from_date, "%Y-%m-%d").date(),
+                                         datetime.strptime(args.to_date, "%Y-%m-%d").date())
+    load_intraday_to_db(intraday_files, args.interval, mode=args.on_conflict)
+    export_metrics("intraday_store", run_started_at)
+
+
+"""
+# 5분봉 파일을 stock_intraday 테이블에 적재
+python intraday_store.py --interval 5m --from_date 2025-01-14 --to_date 2025-01-22
+"""
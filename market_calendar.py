@@ -0,0 +1,117 @@
+import json                                 # 거래일 캐시 파일 저장 형식
+import os                                   # 캐시 폴더/파일 조작
+import threading                            # 병렬 수집 시 캐시 동기화용
+from datetime import date, datetime, timedelta
+import pandas_market_calendars as mcal      # 거래소별 거래일 계산
+
+# 거래소별 캘린더 이름(pandas_market_calendars) 및 현지 시간대
+EXCHANGES = {
+    "NYSE": {"calendar": "NYSE", "timezone": "America/New_York"},
+    "KRX": {"calendar": "XKRX", "timezone": "Asia/Seoul"},
+    "KOSDAQ": {"calendar": "XKRX", "timezone": "Asia/Seoul"},
+}
+
+# 종목 코드 접미사 → 거래소 (접미사가 없으면 미국 종목으로 보고 NYSE 캘린더 사용)
+TICKER_SUFFIX_EXCHANGE = {
+    ".KS": "KRX",
+    ".KQ": "KOSDAQ",
+}
+DEFAULT_EXCHANGE = "NYSE"
+
+# 거래일 캐시 폴더 (거래소/연도별 JSON 파일)
+CALENDAR_CACHE_DIR = os.path.join("cache", "calendar")
+
+# 올해 이후 캘린더는 임시 휴장일이 추가될 수 있으므로 캐시를 이 기간(일)마다 다시 생성
+CURRENT_YEAR_CACHE_DAYS = 7
+
+trading_day_cache = {}              # (거래소, 연도) → 거래일 set
+cache_lock = threading.Lock()
+
+
+def exchange_for_ticker(ticker):
+    """ 종목 코드로 거래소 판별 (예: 005930.KS → KRX, AAPL → NYSE) """
+    for suffix, exchange in TICKER_SUFFIX_EXCHANGE.items():
+        if ticker.endswith(suffix):
+            return exchange
+    return DEFAULT_EXCHANGE
+
+
+def group_tickers_by_exchange(tickers):
+    """ 종목 리스트를 거래소별로 나눔 (각 거래소 안에서는 입력 순서 유지) """
+    groups = {}
+    for ticker in tickers:
+        groups.setdefault(exchange_for_ticker(ticker), []).append(ticker)
+    return groups
+
+
+def cache_file_path(exchange, year):
+    return os.path.join(CALENDAR_CACHE_DIR, f"{exchange}_{year}.json")
+
+
+def is_cache_fresh(file_path, year):
+    """ 지난 연도 캐시는 항상 유효, 올해 이후 캐시는 CURRENT_YEAR_CACHE_DAYS 동안만 유효 """
+    if not os.path.exists(file_path):
+        return False
+    if year < date.today().year:
+        return True
+    modified_at = datetime.fromtimestamp(os.path.getmtime(file_path))
+    return datetime.now() - modified_at < timedelta(days=CURRENT_YEAR_CACHE_DAYS)
+
+
+def build_trading_days(exchange, year):
+    """ 한 해의 거래일 전체를 캘린더에서 한 번에(벡터 연산) 계산 """
+    calendar = mcal.get_calendar(EXCHANGES[exchange]["calendar"])
+    valid_days = calendar.valid_days(start_date=f"{year}-01-01", end_date=f"{year}-12-31")
+    return set(valid_days.date)
+
+
+def load_trading_days(exchange, year):
+    """
+    (거래소, 연도)의 거래일 set 반환
+
+    메모리 → 디스크 캐시(cache/calendar/{거래소}_{연도}.json) → 캘린더 계산 순서로 찾고, 계산한 결과는 디스크에 저장한다.
+    """
+    key = (exchange, year)
+    with cache_lock:
+        if key in trading_day_cache:
+            return trading_day_cache[key]
+
+        file_path = cache_file_path(exchange, year)
+        if is_cache_fresh(file_path, year):
+            with open(file_path, "r") as f:
+                trading_days = {date.fromisoformat(day) for day in json.load(f)}
+        else:
+            trading_days = build_trading_days(exchange, year)
+            try:
+                os.makedirs(CALENDAR_CACHE_DIR, exist_ok=True)
+                with open(file_path, "w") as f:
+                    json.dump(sorted(day.isoformat() for day in trading_days), f)
+            except Exception as e:
+                print(f"[캘린더 캐시 저장 실패] {exchange} {year}: {e}")
+
+        trading_day_cache[key] = trading_days
+        return trading_days
+
+
+def get_trading_days(exchange, from_date, to_date):
+    """ from_date ~ to_date(포함) 사이의 거래일을 정렬된 리스트로 반환 """
+    trading_days = []
+    for year in range(from_date.year, to_date.year + 1):
+        trading_days.extend(day for day in load_trading_days(exchange, year) if from_date <= day <= to_date)
+    return sorted(trading_days)
+
+
+def is_market_closed(check_date, exchange=DEFAULT_EXCHANGE):
+    """ 주어진 날짜가 해당 거래소의 휴장일(공식 휴장일 + 주말)인지 확인 """
+    return check_date not in load_trading_days(exchange, check_date.year)
+
+
+def closed_exchanges(tickers, check_date):
+    """ 종목 리스트의 거래소 중 해당 날짜에 휴장인 거래소 목록 """
+    return [exchange for exchange in group_tickers_by_exchange(tickers) if is_market_closed(check_date, exchange)]
+
+
+def open_tickers(tickers, check_date):
+    """ 해당 날짜에 거래소가 열려 있는 종목만 입력 순서대로 반환 """
+    closed = set(closed_exchanges(tickers, check_date))
+    return [ticker for ticker in tickers if exchange_for_ticker(ticker) not in closed]
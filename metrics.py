@@ -0,0 +1,253 @@
+import json                                 # 지표 파일 (JSON)
+import os
+import threading                            # 여러 스레드(병렬 수집)에서 같은 지표 갱신
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from psycopg2.extras import execute_values  # 요약 행을 한 번의 INSERT로 저장
+from db_config import get_connection
+
+# 지표 파일 폴더 (STOCK_METRICS_DIR 환경 변수로 변경 가능, Prometheus node_exporter textfile 수집 폴더로 지정 가능)
+METRICS_FOLDER = os.environ.get("STOCK_METRICS_DIR", "metrics")
+METRIC_PREFIX = "stock_pipeline_"
+
+# 소요 시간 히스토그램 구간 (초)
+LATENCY_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0]
+
+# 화면 요약에 보여줄 느린 종목 수
+SUMMARY_TOP = 10
+
+# 지표 이름 → 설명 (Prometheus HELP)
+METRIC_HELP = {
+    "stage_seconds": "단계별 소요 시간 (초)",
+    "ticker_seconds": "단계/종목별 소요 시간 (초)",
+    "stage_errors_total": "단계별 실패 횟수",
+    "rows_fetched_total": "수집한 행 수",
+    "rows_loaded_total": "DB에 적재한 행 수 (result: inserted/updated/skipped)",
+    "rows_converted_total": "Parquet로 변환한 행 수",
+    "rows_copied_total": "COPY로 임시 테이블에 올린 행 수",
+    "rows_quarantined_total": "적재 전 검증에서 격리한 행 수 (check: 검사 이름)",
+    "bytes_written_total": "저장한 파일 크기 (바이트)",
+    "fetch_retries_total": "수집 재시도 횟수",
+    "fetch_empty_total": "데이터가 없던 종목 수",
+    "history_cache_hits_total": "응답 캐시에서 읽은 요청 수",
+    "history_cache_misses_total": "응답 캐시에 없어 Yahoo 에 보낸 요청 수",
+}
+
+counters = {}                       # (이름, 라벨) → 값
+histograms = {}                     # (이름, 라벨) → {"buckets", "count", "sum", "min", "max"}
+metrics_lock = threading.Lock()
+
+
+def label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def count(name, value=1, **labels):
+    """ 카운터 증가 (예: count("rows_fetched_total", 100, stage="fetch")) """
+    key = (name, label_key(labels))
+    with metrics_lock:
+        counters[key] = counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    """ 히스토그램에 값 하나 기록 (소요 시간 등) """
+    key = (name, label_key(labels))
+    with metrics_lock:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = {"buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0, "min": value, "max": value}
+            histograms[key] = histogram
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["count"] += 1
+        histogram["sum"] += value
+        histogram["min"] = min(histogram["min"], value)
+        histogram["max"] = max(histogram["max"], value)
+
+
+class Span:
+    """ 단계 하나의 실행 구간 (시작/종료 시각, 소요 시간) - log_to_db 의 start_time / end_time 에 그대로 사용 """
+
+    def __init__(self, stage, ticker=None):
+        self.stage = stage
+        self.ticker = ticker
+        self.start_time = datetime.now()
+        self.end_time = None
+        self.started = time.perf_counter()
+        self.seconds = None
+
+    def finish(self, failed=False):
+        self.end_time = datetime.now()
+        self.seconds = time.perf_counter() - self.started
+        observe("stage_seconds", self.seconds, stage=self.stage)
+        if self.ticker and self.ticker != "ALL":
+            observe("ticker_seconds", self.seconds, stage=self.stage, ticker=self.ticker)
+        if failed:
+            count("stage_errors_total", stage=self.stage)
+
+
+@contextmanager
+def span(stage, ticker=None):
+    """
+    with 블록의 실행 시간을 단계(및 종목)별 히스토그램에 기록
+
+    with span("추출", ticker) as s:
+        ...
+        log_to_db(..., start_time=s.start_time, end_time=datetime.now())
+
+    예외가 나면 stage_errors_total 을 늘리고 예외는 그대로 전달한다.
+    """
+    current = Span(stage, ticker)
+    try:
+        yield current
+    except Exception:
+        current.finish(failed=True)
+        raise
+    current.finish()
+
+
+def percentile(histogram, ratio):
+    """ 히스토그램 구간으로 추정한 백분위 값 (해당 구간의 상한, 마지막 구간을 넘으면 최댓값) """
+    target = histogram["count"] * ratio
+    for bound, cumulative in zip(LATENCY_BUCKETS, histogram["buckets"]):
+        if cumulative >= target:
+            return min(bound, histogram["max"])
+    return histogram["max"]
+
+
+def format_labels(labels, extra=None):
+    items = list(labels) + (extra or [])
+    if not items:
+        return ""
+    escaped = [(key, value.replace("\\", "\\\\").replace('"', '\\"')) for key, value in items]
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def prometheus_text():
+    """ Prometheus textfile(exposition) 형식 문자열 """
+    lines = []
+    with metrics_lock:
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# HELP {METRIC_PREFIX}{name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} counter")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{METRIC_PREFIX}{name}{format_labels(labels)} {value}")
+
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# HELP {METRIC_PREFIX}{name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} histogram")
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, cumulative in zip(LATENCY_BUCKETS, histogram["buckets"]):
+                    lines.append(f"{METRIC_PREFIX}{name}_bucket{format_labels(labels, [('le', str(bound))])} {cumulative}")
+                lines.append(f"{METRIC_PREFIX}{name}_bucket{format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+                lines.append(f"{METRIC_PREFIX}{name}_sum{format_labels(labels)} {histogram['sum']}")
+                lines.append(f"{METRIC_PREFIX}{name}_count{format_labels(labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def other_labels(labels):
+    """ stage / ticker 외의 라벨 문자열 (예: "result=inserted", 없으면 None) """
+    return ",".join(f"{key}={value}" for key, value in labels if key not in ("stage", "ticker")) or None
+
+
+def summary_rows():
+    """ 요약 행 리스트: (지표, 단계, 종목, 기타 라벨, 횟수, 합계, 최소, 최대, p95) """
+    rows = []
+    with metrics_lock:
+        for (name, labels), value in sorted(counters.items()):
+            keys = dict(labels)
+            rows.append((name, keys.get("stage"), keys.get("ticker"), other_labels(labels), value, value, None, None,
+                         None))
+        for (name, labels), histogram in sorted(histograms.items()):
+            keys = dict(labels)
+            rows.append((name, keys.get("stage"), keys.get("ticker"), other_labels(labels), histogram["count"],
+                         histogram["sum"], histogram["min"], histogram["max"], percentile(histogram, 0.95)))
+    return rows
+
+
+def write_file(file_path, text):
+    """ 임시 파일에 쓴 뒤 교체 (수집기가 쓰다 만 파일을 읽지 않도록) """
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    with open(file_path + ".tmp", "w") as f:
+        f.write(text)
+    os.replace(file_path + ".tmp", file_path)
+
+
+def save_summary_to_db(program, run_started_at):
+    """ stock_data_metrics 테이블에 이번 실행의 요약 저장 (실패해도 지표 파일은 남으므로 오류만 출력) """
+    rows = [(program, run_started_at) + row for row in summary_rows()]
+    if not rows:
+        return
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS stock_data_metrics (
+                    metric_id SERIAL PRIMARY KEY,
+                    program VARCHAR(50) NOT NULL,
+                    run_started_at TIMESTAMP NOT NULL,
+                    metric VARCHAR(50) NOT NULL,
+                    stage VARCHAR(50),
+                    ticker VARCHAR(20),
+                    labels VARCHAR(100),
+                    count BIGINT,
+                    total DOUBLE PRECISION,
+                    min_value DOUBLE PRECISION,
+                    max_value DOUBLE PRECISION,
+                    p95 DOUBLE PRECISION,
+                    created_at TIMESTAMP DEFAULT NOW()
+                );
+                CREATE INDEX IF NOT EXISTS idx_stock_data_metrics_run ON stock_data_metrics(program, run_started_at);
+            """)
+            execute_values(cur, """
+                INSERT INTO stock_data_metrics (program, run_started_at, metric, stage, ticker, labels, count, total,
+                                                min_value, max_value, p95)
+                VALUES %s
+            """, rows)
+            conn.commit()
+            cur.close()
+    except Exception as e:
+        print(f"[ERROR] 지표 요약 저장 실패: {e}")
+
+
+def print_summary(top=SUMMARY_TOP):
+    """ 단계별 소요 시간과 가장 느린 종목을 화면에 출력 """
+    rows = summary_rows()
+    stages = [row for row in rows if row[0] == "stage_seconds"]
+    tickers = sorted((row for row in rows if row[0] == "ticker_seconds"), key=lambda row: row[7], reverse=True)
+
+    if stages:
+        print(f"[지표] {'단계':<16} {'횟수':>7} {'합계(초)':>10} {'평균(초)':>9} {'p95(초)':>9} {'최대(초)':>9}")
+        for _, stage, _, _, calls, total, _, maximum, p95 in stages:
+            print(f"[지표] {stage:<16} {calls:>7} {total:>10.3f} {total / calls:>9.3f} {p95:>9.3f} {maximum:>9.3f}")
+    if tickers:
+        print(f"[지표] 느린 종목 (최대 소요 시간 기준 상위 {top}개)")
+        for _, stage, ticker, _, calls, total, _, maximum, p95 in tickers[:top]:
+            print(f"[지표]   {stage:<14} {ticker:<12} 최대 {maximum:.3f}초, 평균 {total / calls:.3f}초 ({calls}회)")
+    for name, stage, ticker, labels, value, _, _, _, _ in rows:
+        if name.endswith("_total"):
+            detail = ", ".join(f"{key}={text}" for key, text in (("stage", stage), ("ticker", ticker)) if text)
+            print(f"[지표] {name} ({', '.join(filter(None, [detail, labels]))}): {value}")
+
+
+def export_metrics(program, run_started_at=None):
+    """
+    프로그램 종료 시 호출: 지표를 metrics/<program>.prom (Prometheus textfile), metrics/<program>.json 에 저장하고
+    stock_data_metrics 테이블에 요약 저장, 화면에 요약 출력
+    """
+    run_started_at = run_started_at or datetime.now()
+    write_file(os.path.join(METRICS_FOLDER, f"{program}.prom"), prometheus_text())
+    write_file(os.path.join(METRICS_FOLDER, f"{program}.json"), json.dumps({
+        "program": program,
+        "run_started_at": run_started_at.isoformat(timespec="seconds"),
+        "exported_at": datetime.now().isoformat(timespec="seconds"),
+        "metrics": [dict(zip(["metric", "stage", "ticker", "labels", "count", "total", "min", "max", "p95"], row))
+                    for row in summary_rows()],
+    }, indent=1, ensure_ascii=False))
+    save_summary_to_db(program, run_started_at)
+    print_summary()
@@ -0,0 +1,199 @@
+import argparse
+import glob                                 # 일별 Parquet 파일 목록
+import json                                 # 압축 상태 파일 저장 형식
+import os
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from db_logger import log_to_db
+from parquet_store import ARCHIVE_ROOT, DEFAULT_PARQUET_FOLDER, normalize_table, trade_dates, with_ticker_metadata
+
+# 파티션 방식별 데이터셋 폴더
+#   - month:  dataset/month/year=2025/month=01/part-0.parquet  (기간 조회용)
+#   - ticker: dataset/ticker/ticker=AAPL/part-0.parquet        (종목별 전체 기간 조회용)
+PARTITION_LAYOUTS = ["month", "ticker"]
+DEFAULT_LAYOUT = "month"
+DATASET_FOLDERS = {
+    "month": os.path.join(ARCHIVE_ROOT, "dataset", "month"),
+    "ticker": os.path.join(ARCHIVE_ROOT, "dataset", "ticker"),
+}
+DATASET_FILE_NAME = "part-0.parquet"
+
+# 어떤 일별 파일(크기, 수정 시각)을 이미 반영했는지 기록하는 상태 파일 (데이터셋 폴더 안)
+STATE_FILE_NAME = "_compaction_state.json"
+
+# (Ticker, Date) 정렬 후 row group 하나에 담을 최대 행 수
+# 한 달치(종목 수 x 약 21일)는 보통 row group 하나, 종목이 많아지면 종목 구간별 row group으로 나뉘어 통계로 건너뛸 수 있음
+ROW_GROUP_ROWS = 64 * 1024
+DATASET_COMPRESSION = "zstd"
+DATASET_COMPRESSION_LEVEL = 3
+
+SORT_KEYS = [("Ticker", "ascending"), ("Date", "ascending")]
+
+
+def list_day_files(root=DEFAULT_PARQUET_FOLDER):
+    """ parquet/YYYY/MM/stock_data_YYYY-MM-DD.parquet 일별 파일 목록 (경로 순 정렬) """
+    return sorted(glob.glob(os.path.join(root, "*", "*", "stock_data_*.parquet")))
+
+
+def file_signature(file_path):
+    """ 파일 변경 여부 판단용 (크기, 수정 시각) """
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def day_of_file(file_path):
+    """ 일별 파일명에서 날짜 추출 (stock_data_2025-01-14.parquet → date(2025, 1, 14)) """
+    date_part = os.path.basename(file_path).replace("stock_data_", "").replace(".parquet", "")
+    return datetime.strptime(date_part, "%Y-%m-%d").date()
+
+
+def partition_path(dataset, layout, key):
+    """ 파티션 파일 경로 (layout 이 month 이면 key는 (연, 월), ticker 이면 종목 코드) """
+    if layout == "month":
+        year, month = key
+        return os.path.join(dataset, f"year={year}", f"month={month:02d}", DATASET_FILE_NAME)
+    return os.path.join(dataset, f"ticker={key}", DATASET_FILE_NAME)
+
+
+def load_state(dataset):
+    state_file = os.path.join(dataset, STATE_FILE_NAME)
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file, "r") as f:
+        return json.load(f)
+
+
+def save_state(dataset, state):
+    """ 상태 파일을 임시 파일에 쓴 뒤 교체 (중간에 실패해도 이전 상태 유지) """
+    os.makedirs(dataset, exist_ok=True)
+    state_file = os.path.join(dataset, STATE_FILE_NAME)
+    with open(state_file + ".tmp", "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(state_file + ".tmp", state_file)
+
+
+def read_day_files(day_files):
+    """ 일별 파일들을 STOCK_SCHEMA 테이블 하나로 읽음 (이전 형식 파일도 변환) """
+    tables = [normalize_table(pq.read_table(file_path)) for file_path in day_files]
+    return pa.concat_tables(tables).unify_dictionaries().combine_chunks()
+
+
+def write_partition(table, partition_file):
+    """ (Ticker, Date) 순으로 정렬해 ZSTD, 고정 크기 row group, 컬럼 통계와 함께 저장 (임시 파일에 쓴 뒤 교체) """
+    # dictionary 컬럼은 직접 정렬할 수 없으므로 디코딩한 종목 코드로 정렬 순서를 구함
+    keys = pa.table({"Ticker": table.column("Ticker").combine_chunks().dictionary_decode(), "Date": table.column("Date")})
+    table = table.take(pc.sort_indices(keys, sort_keys=SORT_KEYS))
+    os.makedirs(os.path.dirname(partition_file), exist_ok=True)
+    temp_file = partition_file + ".tmp"
+    pq.write_table(with_ticker_metadata(table), temp_file, row_group_size=ROW_GROUP_ROWS,
+                   compression=DATASET_COMPRESSION, compression_level=DATASET_COMPRESSION_LEVEL,
+                   write_statistics=True)
+    os.replace(temp_file, partition_file)
+    return table.num_rows
+
+
+def compact_by_month(day_files, changed_files, dataset):
+    """ 바뀐 일별 파일이 속한 월 파티션만 그 달의 일별 파일 전체로 다시 작성 """
+    months = {}
+    for file_path in day_files:
+        day = day_of_file(file_path)
+        months.setdefault((day.year, day.month), []).append(file_path)
+
+    written = {}
+    for key in sorted({(day_of_file(file_path).year, day_of_file(file_path).month) for file_path in changed_files}):
+        partition_file = partition_path(dataset, "month", key)
+        written[partition_file] = write_partition(read_day_files(months[key]), partition_file)
+    return written
+
+
+def compact_by_ticker(changed_files, dataset):
+    """
+    바뀐 일별 파일에 들어 있는 종목의 파티션만 갱신
+
+    기존 종목 파일에서 바뀐 날짜의 행을 빼고 새로 읽은 행을 붙이므로 같은 날짜를 여러 번 반영해도 중복되지 않는다.
+    """
+    new_rows = read_day_files(changed_files)
+    changed_days = pa.array(sorted({day_of_file(file_path) for file_path in changed_files}), type=pa.date32())
+    tickers = new_rows.column("Ticker").combine_chunks().dictionary_decode()
+
+    written = {}
+    for ticker in sorted(pc.unique(tickers).to_pylist()):
+        table = new_rows.filter(pc.equal(tickers, ticker))
+        partition_file = partition_path(dataset, "ticker", ticker)
+        if os.path.exists(partition_file):
+            existing = normalize_table(pq.read_table(partition_file))
+            existing = existing.filter(pc.invert(pc.is_in(trade_dates(existing), value_set=changed_days)))
+            if existing.num_rows:
+                table = pa.concat_tables([existing, table]).unify_dictionaries().combine_chunks()
+        written[partition_file] = write_partition(table, partition_file)
+    return written
+
+
+def compact_dataset(root=DEFAULT_PARQUET_FOLDER, layout=DEFAULT_LAYOUT, dataset=None, full=False):
+    """
+    일별 Parquet 파일을 Hive 파티션 데이터셋으로 압축 (증분, 반복 실행해도 결과 동일)
+
+    상태 파일에 기록된 (크기, 수정 시각)과 다른 일별 파일만 반영하고, 그 파일이 속한 파티션만 다시 쓴다.
+
+    :param root: 일별 Parquet 루트 폴더
+    :param layout: 파티션 방식 ('month' 또는 'ticker')
+    :param dataset: 데이터셋 폴더 (없으면 DATASET_FOLDERS[layout])
+    :param full: True 이면 상태를 무시하고 전체 다시 작성
+    :return: {파티션 파일 경로: 행 수} (다시 쓴 파티션만)
+    """
+    start_time = datetime.now()
+    dataset = dataset or DATASET_FOLDERS[layout]
+
+    day_files = list_day_files(root)
+    state = {} if full else load_state(dataset)
+    sources = state.get("sources", {})
+    signatures = {file_path: file_signature(file_path) for file_path in day_files}
+    changed_files = [file_path for file_path in day_files if sources.get(file_path) != signatures[file_path]]
+
+    if not changed_files:
+        print(f"[INFO] {dataset} 최신 상태 (일별 파일 {len(day_files)}개 반영됨)")
+        return {}
+
+    try:
+        if layout == "month":
+            written = compact_by_month(day_files, changed_files, dataset)
+        else:
+            written = compact_by_ticker(changed_files, dataset)
+        sources.update({file_path: signatures[file_path] for file_path in changed_files})
+        save_state(dataset, {"layout": layout, "root": root, "sources": sources})
+    except Exception as e:
+        print(f"[ERROR] 데이터셋 압축 실패: {e}")
+        log_to_db("Parquet 압축", "ERROR", "ALL", f"{dataset} 압축 실패: {e}", start_time=start_time,
+                  end_time=datetime.now(), result="실패")
+        raise
+
+    changed_days = [day_of_file(file_path) for file_path in changed_files]
+    summary = f"{dataset}: 일별 파일 {len(changed_files)}개 반영, 파티션 {len(written)}개 작성 ({sum(written.values())}행)"
+    print(f"[INFO] {summary}")
+    log_to_db("Parquet 압축", "INFO", "ALL", summary, min(changed_days), max(changed_days), start_time, datetime.now(),
+              "성공")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="일별 Parquet 파일을 파티션 데이터셋으로 압축하는 프로그램")
+    parser.add_argument("--root", type=str, default=DEFAULT_PARQUET_FOLDER, help="일별 Parquet 루트 폴더")
+    parser.add_argument("--layout", choices=PARTITION_LAYOUTS, default=DEFAULT_LAYOUT,
+                        help="파티션 방식 (month: year=/month=, ticker: ticker=)")
+    parser.add_argument("--dataset", type=str, help="데이터셋 폴더 (기본: dataset/<layout>)")
+    parser.add_argument("--full", action="store_true", help="이전 압축 상태를 무시하고 전체 다시 작성")
+    args = parser.parse_args()
+
+    compact_dataset(root=args.root, layout=args.layout, dataset=args.dataset, full=args.full)
+
+
+"""
+# 새로 생긴/바뀐 일별 파일만 월 파티션(dataset/month/year=YYYY/month=MM/)에 반영
+python parquet_dataset.py
+# 종목별 파티션(dataset/ticker/ticker=AAPL/)으로 압축
+python parquet_dataset.py --layout ticker
+# 전체 다시 작성
+python parquet_dataset.py --full
+"""
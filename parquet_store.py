@@ -0,0 +1,427 @@
+import json                                 # footer 메타데이터의 종목별 수집일
+import os                                   # 파일 및 폴더 조작
+from datetime import datetime
+import numpy as np                          # 수집 버퍼 (미리 잡아 둔 배열)
+import pandas as pd                         # 날짜 변환
+import pyarrow as pa                        # 명시적 스키마의 Arrow 테이블
+import pyarrow.compute as pc
+import pyarrow.parquet as pq                # Parquet 파일 읽기/쓰기
+from market_calendar import EXCHANGES, exchange_for_ticker
+from ticker_registry import register, ticker_ids  # 종목 코드 → 고정 정수 키 (tickers.csv, 등록은 작업을 시작하는 쪽에서)
+
+# 일별 파일 보관 루트 (csv/, parquet/, manifest.sqlite, quarantine/, adjustments/, features/, dataset/, intraday/ 의 기준 폴더)
+# 실행한 위치(cwd)와 관계없이 같은 보관 폴더를 쓰도록 프로그램 폴더 기준, STOCK_ARCHIVE_ROOT 환경 변수로 변경
+ARCHIVE_ROOT = os.path.abspath(os.environ.get("STOCK_ARCHIVE_ROOT", os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_PARQUET_FOLDER = os.path.join(ARCHIVE_ROOT, "parquet")  # 기본 Parquet 저장 폴더
+DEFAULT_CSV_FOLDER = os.path.join(ARCHIVE_ROOT, "csv")          # 수집 CSV 저장 폴더
+PARQUET_COMPRESSION = "snappy"
+
+# CSV를 스트리밍 변환할 때 한 번에 읽는 행 수 (= Parquet row group 하나의 최대 행 수)
+CSV_CHUNK_ROWS = 100_000
+
+# 수집 버퍼(StockBatchBuilder)가 한 번에 잡아 두는 최대 행 수 (= Arrow 테이블 조각 하나의 최대 행 수)
+BATCH_CHUNK_ROWS = 50_000
+
+# Parquet footer(key-value 메타데이터)에 종목 목록을 기록할 때 쓰는 키
+TICKERS_METADATA_KEY = b"tickers"
+
+# Parquet footer(key-value 메타데이터)에 종목별 수집일({종목: 'YYYY-MM-DD'} JSON)을 기록할 때 쓰는 키
+# yfinance 가격은 수집일까지의 배당/분할이 이미 반영되어 있으므로 수정 주가(adjusted_prices)는 그 이후 행위만 곱한다.
+# 파일을 다시 쓰더라도(다른 종목 병합, CSV 재변환, 복사) 유지한 행의 수집일은 그대로 옮겨 적는다.
+FETCHED_METADATA_KEY = b"fetched"
+
+PRICE_COLUMNS = ["Open", "High", "Low", "Close"]
+ACTION_COLUMNS = ["Dividends", "Stock Splits"]
+
+# 일별 주가 Parquet 스키마 (컬럼 이름은 yfinance history 결과/기존 CSV 헤더와 동일)
+#   - Date: UTC 기준 tz-aware 타임스탬프 (int64 epoch ns, 미국/한국 종목이 한 파일에 섞여도 하나의 타입으로 저장)
+#   - Trade Date: 거래소 현지 거래일 (date32) - 저장할 때 한 번만 계산해 두고 적재/조회/중복 검사는 이 값을 정수로 비교
+#   - Ticker: 반복되는 문자열이므로 dictionary 인코딩
+#   - Ticker ID: 종목 목록(tickers.csv)의 정수 키 (종목명/거래소/통화 등은 행마다 두지 않고 목록에서 조인)
+STOCK_SCHEMA = pa.schema([
+    pa.field("Date", pa.timestamp("ns", tz="UTC"), nullable=False),
+    pa.field("Trade Date", pa.date32(), nullable=False),
+    pa.field("Open", pa.float64()),
+    pa.field("High", pa.float64()),
+    pa.field("Low", pa.float64()),
+    pa.field("Close", pa.float64()),
+    pa.field("Volume", pa.int64()),
+    pa.field("Dividends", pa.float64()),
+    pa.field("Stock Splits", pa.float64()),
+    pa.field("Ticker", pa.dictionary(pa.int32(), pa.string()), nullable=False),
+    pa.field("Ticker ID", pa.int32(), nullable=False),
+])
+
+
+# 헤더 정규화용: 소문자 + 공백/밑줄/하이픈 제거 → STOCK_SCHEMA 컬럼 이름 (예: stock_splits, STOCK SPLITS → Stock Splits)
+CANONICAL_COLUMNS = {field.name.lower().replace(" ", ""): field.name for field in STOCK_SCHEMA}
+
+
+def fetch_date(fetched_at=None):
+    """ 수집 시각(UTC timestamp, 없으면 지금) → 수집일 문자열 (YYYY-MM-DD) """
+    return (datetime.fromtimestamp(fetched_at) if fetched_at is not None else datetime.now()).date().isoformat()
+
+
+def read_fetched_dates(metadata):
+    """ footer/스키마 메타데이터의 종목별 수집일 {종목: 'YYYY-MM-DD'} (기록이 없는 이전 파일은 빈 dict) """
+    value = (metadata or {}).get(FETCHED_METADATA_KEY)
+    return json.loads(value) if value else {}
+
+
+def with_fetched_dates(table, fetched):
+    """ 스키마 메타데이터에 종목별 수집일 기록 (fetched 가 비어 있으면 키 삭제) """
+    metadata = dict(table.schema.metadata or {})
+    metadata.pop(FETCHED_METADATA_KEY, None)
+    if fetched:
+        metadata[FETCHED_METADATA_KEY] = json.dumps(fetched, sort_keys=True).encode("utf-8")
+    return table.replace_schema_metadata(metadata)
+
+
+def parquet_day_path(check_date, root=DEFAULT_PARQUET_FOLDER):
+    """ 날짜별 Parquet 파일 경로 (예: parquet/2025/01/stock_data_2025-01-14.parquet) """
+    return os.path.join(root, f"{check_date:%Y}", f"{check_date:%m}", f"stock_data_{check_date}.parquet")
+
+
+def to_utc_timestamps(dates, tickers):
+    """
+    Date 컬럼을 UTC 타임스탬프로 변환
+
+    - 문자열 (예: '2025-02-03 00:00:00-05:00'): 오프셋을 그대로 반영
+    - tz-aware: UTC로 변환
+    - tz 없음 (일괄 모드 결과): 종목의 거래소 현지 시각으로 보고 UTC로 변환 (거래소별로 한 번씩 벡터 연산)
+    """
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        if dates.dt.tz is not None:
+            return dates.dt.tz_convert("UTC")
+
+        result = pd.Series(pd.NaT, index=dates.index, dtype="datetime64[ns, UTC]")
+        exchanges = tickers.map(exchange_for_ticker)
+        for exchange, index in dates.groupby(exchanges).groups.items():
+            local = dates.loc[index].dt.tz_localize(EXCHANGES[exchange]["timezone"])
+            result.loc[index] = local.dt.tz_convert("UTC")
+        return result
+
+    return pd.to_datetime(dates, utc=True)
+
+
+def canonical_column(name):
+    """ 컬럼 이름을 STOCK_SCHEMA 이름으로 변환 (스키마에 없는 컬럼은 그대로) """
+    key = str(name).strip().lower()
+    for separator in (" ", "_", "-"):
+        key = key.replace(separator, "")
+    return CANONICAL_COLUMNS.get(key, name)
+
+
+def normalize_headers(data):
+    """ 데이터프레임 헤더를 STOCK_SCHEMA 이름으로 정규화 (date/ticker/stock_splits 등 DB식 이름도 허용) """
+    return data.rename(columns={name: canonical_column(name) for name in data.columns})
+
+
+def iter_csv_tables(csv_file, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    CSV 파일을 chunk_rows 행씩 읽어 헤더를 정규화하고 STOCK_SCHEMA Arrow 테이블로 반환 (generator)
+
+    파일 크기와 관계없이 메모리에는 chunk 하나만 올라간다.
+    """
+    for chunk in pd.read_csv(csv_file, chunksize=chunk_rows):
+        yield to_arrow_table(normalize_headers(chunk))
+
+
+def register_csv_tickers(csv_files):
+    """ CSV 파일들의 Ticker 컬럼만 읽어 목록에 없는 종목을 등록 (병렬 변환 작업 프로세스를 시작하기 전에 부모에서 호출) """
+    tickers = set()
+    for csv_file in csv_files:
+        if not os.path.exists(csv_file):
+            continue
+        data = pd.read_csv(csv_file, usecols=lambda name: canonical_column(name) == "Ticker", dtype=str)
+        if len(data.columns):
+            tickers.update(data.iloc[:, 0].dropna().str.strip())
+    return register(sorted(tickers))
+
+
+def to_arrow_table(data):
+    """
+    데이터프레임(수집 결과 또는 CSV/이전 Parquet에서 읽은 데이터)을 STOCK_SCHEMA 타입의 Arrow 테이블로 변환
+
+    스키마에 없는 컬럼(예: Capital Gains, 예전 CSV의 Korean Name)은 버리고, 없는 선택 컬럼은 null로 채운다.
+    종목 코드 앞뒤의 공백/\r 은 여기서 한 번 제거하고 Ticker ID 는 종목 목록에서 찾는다.
+    """
+    data = data.reset_index(drop=True)
+    tickers = data["Ticker"].astype(str).str.strip()
+    categories = pd.Categorical(tickers)
+    exchanges = np.array([exchange_for_ticker(ticker) for ticker in categories.categories], dtype=object)
+
+    utc_dates = pd.DatetimeIndex(to_utc_timestamps(data["Date"], tickers)).as_unit("ns")
+    columns = {
+        "Date": pa.array(utc_dates, type=STOCK_SCHEMA.field("Date").type),
+        "Trade Date": pa.array(local_trade_days(utc_dates, exchanges[categories.codes]), type=pa.date32()),
+    }
+    for name in PRICE_COLUMNS + ["Volume"] + ACTION_COLUMNS:
+        values = pd.to_numeric(data[name], errors="coerce") if name in data else pd.Series([None] * len(data))
+        columns[name] = pa.array(values, type=STOCK_SCHEMA.field(name).type, from_pandas=True)
+    columns["Ticker"] = pa.array(tickers).dictionary_encode()
+    columns["Ticker ID"] = pa.array(ticker_ids(list(categories.categories))[categories.codes])
+
+    return pa.table([columns[field.name] for field in STOCK_SCHEMA], schema=STOCK_SCHEMA)
+
+
+class StockBatchBuilder:
+    """
+    수집 결과를 미리 잡아 둔 배열(가격: float64, Volume: int64, Ticker: 정수 코드, Date: UTC epoch ns, Trade Date: 일 수)에
+    바로 옮겨 담는 버퍼
+
+    chunk_rows 행이 차면 배열을 그대로(복사 없이) STOCK_SCHEMA Arrow 테이블 조각으로 만들고 새 배열을 잡는다.
+    종목별 데이터프레임을 모아 두었다가 pd.concat 하는 방식과 달리 데이터프레임은 옮겨 담은 뒤 바로 버려지고,
+    마지막 합치기 복사도 없어서 종목 수/기간이 늘어도 최대 메모리 사용량이 거의 일정하다.
+    """
+
+    def __init__(self, chunk_rows=BATCH_CHUNK_ROWS):
+        self.chunk_rows = max(1, chunk_rows)
+        self.ticker_codes = {}              # 종목 → 코드 (Ticker dictionary 의 순서)
+        self.fetched_dates = {}             # 종목 → 수집일 (footer 메타데이터로 저장)
+        self.chunks = []                    # 다 찬 조각 (STOCK_SCHEMA Arrow 테이블)
+        self.num_rows = 0
+        self.allocate()
+
+    def allocate(self):
+        self.dates = np.empty(self.chunk_rows, dtype="datetime64[ns]")
+        self.days = np.empty(self.chunk_rows, dtype="datetime64[D]")
+        self.prices = {name: np.empty(self.chunk_rows, dtype=np.float64) for name in PRICE_COLUMNS + ACTION_COLUMNS}
+        self.volumes = np.empty(self.chunk_rows, dtype=np.int64)
+        self.volume_nulls = np.empty(self.chunk_rows, dtype=bool)
+        self.codes = np.empty(self.chunk_rows, dtype=np.int32)
+        self.size = 0
+
+    def ticker_code(self, ticker):
+        return self.ticker_codes.setdefault(ticker, len(self.ticker_codes))
+
+    def append(self, data, ticker=None, fetched_at=None):
+        """
+        데이터프레임 하나를 버퍼에 추가
+
+        ticker를 주면 yfinance history 결과(Date 인덱스) 한 종목분, 없으면 Date / Ticker 컬럼이 있는 여러 종목 데이터(일괄 모드)
+        fetched_at: 응답을 받은 시각 (UTC timestamp, 응답 캐시에서 읽은 경우 캐시에 저장된 시각, 없으면 지금)
+        """
+        rows = len(data)
+        if not rows:
+            return
+
+        if ticker is not None:
+            dates = data.index.to_series(index=pd.RangeIndex(rows))
+            tickers = pd.Series([ticker] * rows)
+            codes = np.full(rows, self.ticker_code(ticker), dtype=np.int32)
+            exchanges = np.full(rows, exchange_for_ticker(ticker), dtype=object)
+            self.fetched_dates[ticker] = fetch_date(fetched_at)
+        else:
+            dates = data["Date"].reset_index(drop=True)
+            tickers = data["Ticker"].astype(str).str.strip().reset_index(drop=True)
+            categories = pd.Categorical(tickers)
+            mapping = np.array([self.ticker_code(name) for name in categories.categories], dtype=np.int32)
+            codes = mapping[categories.codes]
+            exchanges = np.array([exchange_for_ticker(name) for name in categories.categories], dtype=object)
+            exchanges = exchanges[categories.codes]
+            self.fetched_dates.update(dict.fromkeys(categories.categories, fetch_date(fetched_at)))
+
+        utc_index = pd.DatetimeIndex(to_utc_timestamps(dates, tickers)).as_unit("ns")
+        utc_dates = utc_index.tz_localize(None).to_numpy()
+        trade_days = local_trade_days(utc_index, exchanges)
+        prices = {name: pd.to_numeric(data[name], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+                  if name in data else np.full(rows, np.nan) for name in PRICE_COLUMNS + ACTION_COLUMNS}
+        volumes = pd.to_numeric(data["Volume"], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+        offset = 0
+        while offset < rows:
+            take = min(rows - offset, self.chunk_rows - self.size)
+            source, target = slice(offset, offset + take), slice(self.size, self.size + take)
+            self.dates[target] = utc_dates[source]
+            self.days[target] = trade_days[source]
+            for name, values in prices.items():
+                self.prices[name][target] = values[source]
+            self.volume_nulls[target] = np.isnan(volumes[source])
+            self.volumes[target] = np.nan_to_num(volumes[source]).astype(np.int64)
+            self.codes[target] = codes[source]
+            self.size += take
+            self.num_rows += take
+            offset += take
+            if self.size == self.chunk_rows:
+                self.flush()
+
+    def flush(self):
+        """ 채워진 배열을 Arrow 테이블 조각으로 만들고 새 배열을 잡음 (배열 메모리는 조각이 그대로 사용) """
+        if not self.size:
+            return
+        size = self.size
+        names = list(self.ticker_codes)
+        columns = {
+            "Date": pa.array(self.dates[:size], type=STOCK_SCHEMA.field("Date").type),
+            "Trade Date": pa.array(self.days[:size], type=pa.date32()),
+            "Volume": pa.array(self.volumes[:size], mask=self.volume_nulls[:size]),
+            "Ticker": pa.DictionaryArray.from_arrays(pa.array(self.codes[:size]), pa.array(names, type=pa.string())),
+            "Ticker ID": pa.array(ticker_ids(names)[self.codes[:size]]),
+        }
+        for name, values in self.prices.items():
+            columns[name] = pa.array(values[:size], from_pandas=True)  # NaN → null (to_arrow_table 과 동일)
+        self.chunks.append(pa.table([columns[field.name] for field in STOCK_SCHEMA], schema=STOCK_SCHEMA))
+        self.allocate()
+
+    def tables(self):
+        """ 남은 행까지 조각으로 만든 뒤 조각 리스트 반환 (write_parquet_stream 입력) """
+        self.flush()
+        return self.chunks
+
+    def to_table(self):
+        """ 조각들을 하나의 (여러 chunk로 된) 테이블로 반환 - 데이터 복사 없음, 종목별 수집일은 스키마 메타데이터로 """
+        chunks = self.tables()
+        if not chunks:
+            return STOCK_SCHEMA.empty_table()
+        return with_fetched_dates(pa.concat_tables(chunks).unify_dictionaries(), self.fetched_dates)
+
+    def to_frame(self):
+        """ 기존 CSV 형식의 데이터프레임 (Date는 거래소 현지 시각 문자열, 예: '2025-02-03 00:00:00-05:00') """
+        table = self.to_table()
+        data = table.drop_columns(["Trade Date", "Ticker ID"]).to_pandas()
+        data["Ticker"] = data["Ticker"].astype(str)
+        data["Date"] = local_date_strings(table)
+        return data
+
+
+def local_date_strings(table, column="Date"):
+    """ UTC로 저장된 Date를 각 종목 거래소 현지 시각 문자열로 변환 (거래소별로 한 번씩 벡터 연산) """
+    dates = table.column(column).to_pandas()
+    exchanges = table.column("Ticker").to_pandas().map(exchange_for_ticker).astype(str)
+
+    result = pd.Series("", index=dates.index, dtype=object)
+    for exchange, index in dates.groupby(exchanges).groups.items():
+        result.loc[index] = dates.loc[index].dt.tz_convert(EXCHANGES[exchange]["timezone"]).astype(str)
+    return result
+
+
+def normalize_table(table):
+    """ 이전 형식(Date 문자열, 일반 문자열 Ticker 등)의 Parquet 테이블을 STOCK_SCHEMA로 맞춤 """
+    if table.schema.equals(STOCK_SCHEMA, check_metadata=False):
+        return table
+    return to_arrow_table(table.to_pandas())
+
+
+def with_ticker_metadata(table):
+    """ footer 메타데이터에 종목 목록을 기록 (증분 수집 계획 시 데이터를 읽지 않고 종목 확인) """
+    tickers = sorted(pc.unique(table.column("Ticker").combine_chunks().dictionary_decode()).to_pylist())
+    metadata = dict(table.schema.metadata or {})
+    metadata[TICKERS_METADATA_KEY] = ",".join(tickers).encode("utf-8")
+    return table.replace_schema_metadata(metadata)
+
+
+def write_parquet_table(table, parquet_file, merge_existing=True):
+    """
+    Arrow 테이블을 Parquet 파일로 저장
+
+    merge_existing이 True이고 파일이 이미 있으면 새 테이블에 없는 종목(Ticker ID 비교)의 기존 행을 유지한다.
+    새 행의 종목별 수집일은 테이블 스키마 메타데이터(StockBatchBuilder.to_table)에서, 유지한 행의 수집일은 기존 footer 에서 가져온다.
+    임시 파일에 쓴 뒤 교체하므로 중간에 실패해도 기존 파일이 깨지지 않는다.
+    """
+    fetched = read_fetched_dates(table.schema.metadata)
+    if merge_existing and os.path.exists(parquet_file):
+        existing_fetched = read_fetched_dates(pq.read_metadata(parquet_file).metadata)
+        existing = normalize_table(pq.read_table(parquet_file))
+        new_ids = pc.unique(table.column("Ticker ID").combine_chunks())
+        keep = pc.invert(pc.is_in(existing.column("Ticker ID"), value_set=new_ids))
+        existing = existing.filter(keep)
+        if existing.num_rows:
+            kept = pc.unique(existing.column("Ticker").combine_chunks().dictionary_decode()).to_pylist()
+            fetched = {**{ticker: existing_fetched[ticker] for ticker in kept if ticker in existing_fetched}, **fetched}
+            table = pa.concat_tables([existing, table]).unify_dictionaries().combine_chunks()
+
+    os.makedirs(os.path.dirname(parquet_file) or ".", exist_ok=True)
+    temp_file = parquet_file + ".tmp"
+    pq.write_table(with_ticker_metadata(with_fetched_dates(table, fetched)), temp_file, compression=PARQUET_COMPRESSION)
+    os.replace(temp_file, parquet_file)
+    return parquet_file
+
+
+def write_parquet_stream(tables, parquet_file, merge_existing=True, fetched=None):
+    """
+    STOCK_SCHEMA Arrow 테이블 묶음(generator)을 ParquetWriter로 row group 하나씩 저장 (전체를 메모리에 모으지 않음)
+
+    merge_existing이 True이고 파일이 이미 있으면 새 데이터에 없는 종목의 기존 행을 배치 단위로 이어 붙인다.
+    종목 목록과 종목별 수집일(새 행은 fetched {종목: 'YYYY-MM-DD'}, 유지한 행은 기존 footer 값)은 다 쓴 뒤 footer
+    메타데이터에 기록하고, 임시 파일에 쓴 뒤 교체한다.
+
+    :return: 저장한 행 수
+    """
+    os.makedirs(os.path.dirname(parquet_file) or ".", exist_ok=True)
+    temp_file = parquet_file + ".tmp"
+    tickers = set()
+    ids = set()
+    rows = 0
+    fetched = dict(fetched or {})
+
+    try:
+        with pq.ParquetWriter(temp_file, STOCK_SCHEMA, compression=PARQUET_COMPRESSION) as writer:
+            for table in tables:
+                if table.num_rows:
+                    writer.write_table(table, row_group_size=table.num_rows)
+                    tickers.update(pc.unique(table.column("Ticker").combine_chunks().dictionary_decode()).to_pylist())
+                    ids.update(pc.unique(table.column("Ticker ID").combine_chunks()).to_pylist())
+                    rows += table.num_rows
+
+            fetched = {ticker: day for ticker, day in fetched.items() if ticker in tickers}
+            if merge_existing and os.path.exists(parquet_file):
+                new_ids = pa.array(sorted(ids), type=pa.int32())
+                existing_file = pq.ParquetFile(parquet_file)
+                existing_fetched = read_fetched_dates(existing_file.metadata.metadata)
+                for batch in existing_file.iter_batches(batch_size=CSV_CHUNK_ROWS):
+                    existing = normalize_table(pa.Table.from_batches([batch]))
+                    existing = existing.filter(pc.invert(pc.is_in(existing.column("Ticker ID"), value_set=new_ids)))
+                    if existing.num_rows:
+                        writer.write_table(existing, row_group_size=existing.num_rows)
+                        kept = pc.unique(existing.column("Ticker").combine_chunks().dictionary_decode()).to_pylist()
+                        tickers.update(kept)
+                        fetched.update({ticker: existing_fetched[ticker] for ticker in kept if ticker in existing_fetched})
+                        rows += existing.num_rows
+
+            metadata = {TICKERS_METADATA_KEY: ",".join(sorted(tickers)).encode("utf-8")}
+            if fetched:
+                metadata[FETCHED_METADATA_KEY] = json.dumps(fetched, sort_keys=True).encode("utf-8")
+            writer.add_key_value_metadata(metadata)
+        os.replace(temp_file, parquet_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+    return rows
+
+
+def save_parquet(data, check_date, root=DEFAULT_PARQUET_FOLDER, merge_existing=True):
+    """ 하루치 수집 데이터프레임을 CSV를 거치지 않고 바로 parquet/YYYY/MM/stock_data_YYYY-MM-DD.parquet 로 저장 (수집일은 오늘) """
+    table = to_arrow_table(data)
+    tickers = pc.unique(table.column("Ticker").combine_chunks().dictionary_decode()).to_pylist()
+    table = with_fetched_dates(table, dict.fromkeys(tickers, fetch_date()))
+    return write_parquet_table(table, parquet_day_path(check_date, root), merge_existing=merge_existing)
+
+
+def local_trade_days(utc_dates, exchanges):
+    """
+    UTC 시각(tz-aware DatetimeIndex)을 각 행 거래소의 현지 거래일(datetime64[D] 배열)로 변환 (거래소별로 한 번씩 벡터 연산)
+
+    한국 종목(00:00+09:00 → 전날 15:00 UTC)도 거래소 시간대로 되돌린 뒤 날짜만 취하므로 올바른 거래일이 된다.
+    """
+    days = np.empty(len(utc_dates), dtype="datetime64[D]")
+    for exchange in np.unique(exchanges):
+        mask = exchanges == exchange
+        local = utc_dates[mask].tz_convert(EXCHANGES[exchange]["timezone"]).tz_localize(None)
+        days[mask] = local.to_numpy().astype("datetime64[D]")
+    return days
+
+
+def trade_dates(table, column="Date"):
+    """
+    각 행의 거래소 현지 거래일(date32) 반환
+
+    저장할 때 계산해 둔 Trade Date 컬럼이 있으면 그대로 쓰고, 없거나 비어 있으면(이전 형식 파일이 섞인 데이터셋,
+    분봉은 column="Datetime") 계산한다.
+    """
+    if column == "Date" and "Trade Date" in table.column_names and not table.column("Trade Date").null_count:
+        return table.column("Trade Date").combine_chunks()
+    dates = pd.DatetimeIndex(table.column(column).to_pandas())
+    exchanges = table.column("Ticker").to_pandas().map(exchange_for_ticker).astype(str).to_numpy(dtype=object)
+    return pa.array(local_trade_days(dates, exchanges), type=pa.date32())
@@ -1,124 +1,76 @@
 import os
 import psycopg2
 import argparse
-import subprocess
 from datetime import datetime
-
-# PostgreSQL 연결 정보
-DB_CONFIG = {
-    "dbname": "hwechang",
-    "user": "hwechang",
-    "password": "hwechang",
-    "host": "10.0.1.160",
-    "port": "5432"
-}
-
-LOG_FILE_PATH = "/home/hwechang_jeong/stock/exe/parquet_files.log"
-PGFUTTER_PATH = "/usr/local/bin/pgfutter"  # pgfutter 실행 파일 경로
-
-
-def log_to_db(step, log_type, message, start_time, end_time=None, result=None):
-    """DB 로그 저장"""
-    conn = None
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-        query = """
-        INSERT INTO stock_data_log (step, log_type, message, start_time, end_time, result, created_at)
-        VALUES (%s, %s, %s, %s, %s, %s, NOW());
-        """
-        cur.execute(query, (step, log_type, message, start_time, end_time, result))
-        conn.commit()
-        cur.close()
-    except Exception as e:
-        print(f"[DB 로그 오류] {e}")
-    finally:
-        if conn:
-            conn.close()
-
+from db_config import DB_CONFIG
+from db_logger import log_to_db
+from archive_manifest import STATUS_DONE, STATUS_FAILED, day_of_path, mark_status, pending_loads
+from metrics import count, export_metrics, span
+from schema_manager import create_stock_data_table, ensure_partitions_for_table
+from stock_loader import copy_file_to_staging, create_staging_table, merge_staging_to_target, MERGE_MODES, \
+    DEFAULT_MERGE_MODE
+from ticker_registry import sync_ticker_table
 
 def create_main_table(conn):
-    """기본 테이블(stock_data) 생성"""
+    """기본 테이블(stock_data) 생성 (date 기준 월 단위 파티션, schema_manager 사용)"""
     try:
-        cur = conn.cursor()
-        query = """
-        CREATE TABLE IF NOT EXISTS stock_data (
-            date DATE NOT NULL,
-            ticker VARCHAR(10) NOT NULL,
-            open NUMERIC,
-            high NUMERIC,
-            low NUMERIC,
-            close NUMERIC,
-            volume BIGINT,
-            dividends NUMERIC,
-            stock_splits NUMERIC,
-            PRIMARY KEY (date, ticker)
-        ) PARTITION BY RANGE (date);
-        """
-        cur.execute(query)
-        conn.commit()
-        cur.close()
+        create_stock_data_table(conn)
         print("[INFO] 기본 테이블(stock_data) 확인 완료")
     except Exception as e:
+        conn.rollback()
         print(f"[Error] 기본 테이블 생성 실패: {e}")
 
 
 def create_temp_table(conn):
-    """임시 테이블(stock_data_temp) 생성"""
+    """임시 테이블(stock_data_temp) 생성 (바이너리 COPY 용 타입이 적재용 테이블과 같도록 매번 새로 만듦)"""
     try:
         cur = conn.cursor()
-        query = """
-        CREATE TABLE IF NOT EXISTS stock_data_temp (
-            date DATE NOT NULL,
-            ticker VARCHAR(10) NOT NULL,
-            open NUMERIC,
-            high NUMERIC,
-            low NUMERIC,
-            close NUMERIC,
-            volume BIGINT,
-            dividends NUMERIC,
-            stock_splits NUMERIC
-        );
-        """
-        cur.execute(query)
-        conn.commit()
+        cur.execute("DROP TABLE IF EXISTS stock_data_temp;")
         cur.close()
+        create_staging_table(conn, "stock_data_temp", temporary=False)
+        conn.commit()
         print("[INFO] 임시 테이블(stock_data_temp) 확인 완료")
     except Exception as e:
         print(f"[Error] 임시 테이블 생성 실패: {e}")
 
 
-def load_data_with_pgfutter(parquet_file):
-    """pgfutter를 이용해 Parquet 데이터를 임시 테이블에 저장"""
+def load_data_with_copy(conn, parquet_file):
+    """COPY를 이용해 Parquet 데이터를 배치 단위로 임시 테이블(stock_data_temp)에 저장"""
     start_time = datetime.now()
+    file_date = day_of_path(parquet_file)
 
     if not os.path.exists(parquet_file):
         print(f"[ERROR] 파일 없음: {parquet_file}")
-        log_to_db("pgfutter 실행", "ERROR", f"파일 없음: {parquet_file}", start_time, result="실패")
-        return
+        log_to_db("COPY 적재", "ERROR", "ALL", f"파일 없음: {parquet_file}", file_date, file_date, start_time=start_time,
+                  end_time=datetime.now(), result="실패")
+        return False
 
-    cmd = [
-        PGFUTTER_PATH, "csv",
-        "--dbname", DB_CONFIG["dbname"],
-        "--host", DB_CONFIG["host"],
-        "--port", DB_CONFIG["port"],
-        "--user", DB_CONFIG["user"],
-        "--pw", DB_CONFIG["password"],
-        "--schema", "public",
-        "--table", "stock_data_temp",
-        parquet_file
-    ]
     try:
-        subprocess.run(cmd, check=True)
-        print(f"[INFO] pgfutter로 {parquet_file} 임시 테이블에 적재 완료")
-        log_to_db("pgfutter 실행", "INFO", f"{parquet_file} 적재 완료", start_time, result="성공")
-    except subprocess.CalledProcessError as e:
-        print(f"[Error] pgfutter 실행 실패: {e}")
-        log_to_db("pgfutter 실행", "ERROR", str(e), start_time, result="실패")
+        with span("copy") as copy_span:
+            cur = conn.cursor()
+            cur.execute("TRUNCATE stock_data_temp;")
+            cur.close()
+            rows = copy_file_to_staging(conn, parquet_file, staging_table="stock_data_temp")
+            conn.commit()
+        count("rows_copied_total", rows, stage="copy")
+        print(f"[INFO] COPY로 {parquet_file} 임시 테이블에 적재 완료 ({rows}행)")
+        log_to_db("COPY 적재", "INFO", "ALL", f"{parquet_file} 적재 완료 ({rows}행)", file_date, file_date,
+                  start_time=copy_span.start_time, end_time=copy_span.end_time, result="성공")
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"[Error] COPY 적재 실패: {e}")
+        log_to_db("COPY 적재", "ERROR", "ALL", str(e), file_date, file_date, start_time=start_time,
+                  end_time=datetime.now(), result="실패")
+        return False
 
 
-def move_data_to_main_table(conn):
-    """임시 테이블 데이터를 실제 테이블(stock_data)로 이동"""
+def move_data_to_main_table(conn, mode=DEFAULT_MERGE_MODE, file_date=None):
+    """
+    임시 테이블 데이터를 실제 테이블(stock_data)로 upsert (mode: nothing / update), 성공 여부 반환
+
+    file_date: 로그의 from_date / to_date 로 남길 적재 파일의 날짜
+    """
     start_time = datetime.now()
     try:
         cur = conn.cursor()
@@ -132,21 +84,27 @@ def move_data_to_main_table(conn):
                 print(row)
         else:
             print("[DEBUG] stock_data_temp에 데이터 없음")
-
-        # ✅ 데이터를 이동하는 INSERT 실행
-        query = """
-        INSERT INTO stock_data (date, ticker, open, high, low, close, volume, dividends, stock_splits)
-        SELECT date, ticker, open, high, low, close, volume, dividends, stock_splits FROM stock_data_temp
-        ON CONFLICT (date, ticker) DO NOTHING;
-        """
-        cur.execute(query)
-        conn.commit()
         cur.close()
-        print("[INFO] 임시 테이블 데이터가 stock_data로 이동 완료")
-        log_to_db("데이터 이동", "INFO", "데이터 이동 완료", start_time, result="성공")
+
+        # ✅ 적재할 날짜 범위의 파티션을 먼저 만든 뒤 ON CONFLICT (date, ticker) 로 upsert
+        with span("merge") as merge_span:
+            ensure_partitions_for_table(conn, "stock_data_temp")
+            sync_ticker_table()
+            counts = merge_staging_to_target(conn, staging_table="stock_data_temp", target_table="stock_data", mode=mode)
+            conn.commit()
+        for result in ("inserted", "updated", "skipped"):
+            count("rows_loaded_total", counts[result], stage="merge", result=result)
+        summary = f"추가 {counts['inserted']}행, 수정 {counts['updated']}행, 건너뜀 {counts['skipped']}행"
+        print(f"[INFO] 임시 테이블 데이터가 stock_data로 이동 완료 ({summary})")
+        log_to_db("데이터 이동", "INFO", "ALL", f"데이터 이동 완료 ({summary})", file_date, file_date,
+                  start_time=merge_span.start_time, end_time=merge_span.end_time, result="성공")
+        return True
     except Exception as e:
+        conn.rollback()
         print(f"[Error] 데이터 이동 실패: {e}")
-        log_to_db("데이터 이동", "ERROR", str(e), start_time, result="실패")
+        log_to_db("데이터 이동", "ERROR", "ALL", str(e), file_date, file_date, start_time=start_time,
+                  end_time=datetime.now(), result="실패")
+        return False
 
 
 def drop_temp_table(conn):
@@ -161,40 +119,50 @@ def drop_temp_table(conn):
         print(f"[Error] 임시 테이블 삭제 실패: {e}")
 
 
-def process_parquet(parquet_file):
+def process_parquet(parquet_file, mode=DEFAULT_MERGE_MODE):
     """Parquet 데이터를 처리하는 전체 과정"""
     start_time = datetime.now()
+    file_date = day_of_path(parquet_file)
     conn = psycopg2.connect(**DB_CONFIG)
 
     create_main_table(conn)
     create_temp_table(conn)
-    load_data_with_pgfutter(parquet_file)
-    move_data_to_main_table(conn)
+    if load_data_with_copy(conn, parquet_file) and move_data_to_main_table(conn, mode=mode, file_date=file_date):
+        mark_status(parquet_file, "load", STATUS_DONE)
+    else:
+        mark_status(parquet_file, "load", STATUS_FAILED, error="DB 적재 실패 (stock_data_log 참고)")
     # drop_temp_table(conn)
 
     conn.close()
     end_time = datetime.now()
     print(f"[INFO] 전체 작업 완료 (소요 시간: {end_time - start_time})")
-    log_to_db("전체 프로세스", "INFO", "작업 완료", start_time, end_time, "성공")
+    log_to_db("전체 프로세스", "INFO", "ALL", f"작업 완료: {parquet_file}", file_date, file_date, start_time=start_time,
+              end_time=end_time, result="성공")
 
 
-def process_log_file(log_file_path):
-    """로그 파일을 읽고 Parquet 파일 목록을 처리"""
-    if not os.path.exists(log_file_path):
-        print(f"[ERROR] 로그 파일 없음: {log_file_path}")
+def process_pending(mode=DEFAULT_MERGE_MODE):
+    """manifest에서 DB 적재가 끝나지 않은 Parquet 파일을 날짜순으로 처리 (중단된 실행은 남은 파일부터 이어서)"""
+    parquet_files = pending_loads()
+    if not parquet_files:
+        print("[INFO] 적재할 Parquet 파일 없음")
         return
 
-    with open(log_file_path, "r") as log_file:
-        parquet_files = [line.strip().split(" - ")[-1] for line in log_file.readlines()]
-
     for parquet_file in parquet_files:
         print(f"[INFO] 처리 중: {parquet_file}")
-        process_parquet(parquet_file)
+        process_parquet(parquet_file, mode=mode)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Parquet 파일을 DB에 저장하는 프로그램")
-    parser.add_argument("--log_file", type=str, default=LOG_FILE_PATH, help="Parquet 파일 목록이 저장된 로그 파일 경로")
+    parser.add_argument("--parquet_file", type=str, help="적재할 단일 Parquet 파일 (없으면 manifest의 적재 대기 파일 전체)")
+    parser.add_argument("--on_conflict", choices=MERGE_MODES, default=DEFAULT_MERGE_MODE,
+                        help="이미 있는 (date, ticker) 처리 방식 (nothing: 건너뜀, update: 수정 주가 덮어쓰기)")
     args = parser.parse_args()
+    run_started_at = datetime.now()
+
+    if args.parquet_file:
+        process_parquet(args.parquet_file, mode=args.on_conflict)
+    else:
+        process_pending(mode=args.on_conflict)
 
-    process_log_file(args.log_file)
+    export_metrics("parquet_to_db", run_started_at)
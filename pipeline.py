@@ -0,0 +1,320 @@
+import argparse
+import os
+import queue                                # 단계 사이 작업 큐 (앞 단계가 다음 날짜를 받는 동안 뒤 단계가 저장/적재)
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pyarrow.parquet as pq
+from db_config import get_connection
+from db_logger import log_to_db, create_log_tables_if_not_exists
+from metrics import count, export_metrics, span
+from archive_manifest import STATUS_DONE, STATUS_FAILED, day_of_path, mark_status, pending_conversions, pending_loads, \
+    record_parquet
+from csv_to_parquet import convert_csv_file, record_conversion
+from fetch_stock_data import DEFAULT_TICKERS, DEFAULT_WORKERS, DEFAULT_MAX_RPS, TokenBucket, apply_plan, fetch_day, \
+    log_closed_exchanges
+from fetch_planner import plan_fetch
+from market_calendar import open_tickers
+from parquet_store import parquet_day_path, register_csv_tickers, write_parquet_table
+from schema_manager import create_stock_data_table, ensure_partitions_for_table
+from stock_loader import MERGE_MODES, DEFAULT_MERGE_MODE, STAGING_TABLE, copy_tables_to_staging, \
+    create_staging_table, ensure_unique_key, iter_file_batches, iter_table_batches, merge_staging_to_target
+from ticker_registry import register, select_tickers, sync_ticker_table
+from adjusted_prices import update_factors
+from feature_store import build_features
+
+# 실행 단계 (순서대로): 수집 → Parquet 저장 → DB 적재 → 수정 계수 갱신 → 피처 계산
+STAGES = ["fetch", "persist", "load", "adjust", "features"]
+
+# 단계 사이 큐에 쌓아 둘 최대 일수 (뒤 단계가 느리면 앞 단계가 기다리므로 메모리 사용량이 이 범위로 제한됨)
+QUEUE_DAYS = 4
+
+DONE = None  # 큐 종료 표시
+
+
+def iter_queue(day_queue):
+    """ 큐에서 DONE이 나올 때까지 하루치 작업을 꺼내서 반환 (generator) """
+    while True:
+        item = day_queue.get()
+        if item is DONE:
+            return
+        yield item
+
+
+def start_stage(name, work, in_queue, out_queue, errors):
+    """
+    단계 하나를 스레드로 실행
+
+    끝나면(실패해도) 다음 단계 큐에 DONE을 넣고, 실패하면 앞 단계가 막히지 않도록 남은 입력을 비운다.
+    work가 실패한 날짜 리스트를 반환하면(날짜별 실패는 건너뛰고 계속 진행) 끝난 뒤 단계 실패로 기록한다.
+    """
+    def runner():
+        try:
+            failed_days = work()
+            if failed_days:
+                errors.append(name)
+                days = ", ".join(str(day) for day in failed_days[:10]) + (" ..." if len(failed_days) > 10 else "")
+                print(f"[ERROR] {name} 단계: {len(failed_days)}일 실패 ({days})")
+                log_to_db("파이프라인", "ERROR", "ALL", f"{name} 단계: {len(failed_days)}일 실패 ({days})",
+                          min(failed_days), max(failed_days), start_time=datetime.now(),
+                          end_time=datetime.now(), result="일부 실패")
+        except Exception as e:
+            errors.append(name)
+            print(f"[ERROR] {name} 단계 실패: {e}")
+            log_to_db("파이프라인", "ERROR", "ALL", f"{name} 단계 실패: {e}", start_time=datetime.now(),
+                      end_time=datetime.now(), result="실패")
+            if in_queue is not None:
+                for _ in iter_queue(in_queue):
+                    pass
+        finally:
+            if out_queue is not None:
+                out_queue.put(DONE)
+
+    thread = threading.Thread(target=runner, name=f"pipeline-{name}", daemon=True)
+    thread.start()
+    return thread
+
+
+def fetch_stage(tickers, from_date, to_date, out_queue, workers=DEFAULT_WORKERS, max_rps=DEFAULT_MAX_RPS, plan=None):
+    """ (1) 수집: 날짜별로 열린 종목을 요청해 하루치 Arrow 테이블을 다음 단계 큐에 넣음 (CSV 파일을 거치지 않음) """
+    rate_limiter = TokenBucket(max_rps)
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    try:
+        check_date = from_date
+        while check_date <= to_date:
+            extract_start_time = datetime.now()
+            print(f"[날짜 확인] {check_date} 데이터 수집 시작")
+
+            day_tickers = open_tickers(tickers, check_date)
+            log_closed_exchanges(tickers, day_tickers, check_date, extract_start_time)
+            if plan is not None:
+                day_tickers = apply_plan(day_tickers, plan, check_date, extract_start_time)
+
+            if day_tickers:
+                builder = fetch_day(day_tickers, check_date, executor, rate_limiter)
+                if builder.num_rows:
+                    out_queue.put({"day": check_date, "parquet_file": None, "table": builder.to_table()})
+                else:
+                    log_to_db("추출", "ERROR", "ALL", "수집된 데이터 없음", check_date, check_date,
+                              start_time=extract_start_time, end_time=datetime.now(), result="실패")
+
+            check_date += timedelta(days=1)
+    finally:
+        if executor:
+            executor.shutdown()
+
+
+def persist_stage(in_queue, out_queue):
+    """
+    (2) 저장: 하루치 테이블을 parquet/YYYY/MM/ 에 저장하고 manifest에 기록한 뒤 같은 테이블을 적재 단계로 넘김
+
+    같은 날짜 파일의 다른 종목 행과 합쳐졌다면 적재 단계는 파일 전체를 읽는다. (이전 실행에서 적재되지 않은 행 포함)
+    저장에 실패한 날짜 리스트를 반환한다.
+    """
+    failed_days = []
+    for item in iter_queue(in_queue):
+        day, table = item["day"], item["table"]
+        try:
+            with span("persist") as persist_span:
+                parquet_file = write_parquet_table(table, parquet_day_path(day), merge_existing=True)
+                record_parquet(parquet_file)
+            merged = pq.ParquetFile(parquet_file).metadata.num_rows != table.num_rows
+            count("bytes_written_total", os.path.getsize(parquet_file), stage="persist")
+            log_to_db("Parquet 저장", "INFO", "ALL", f"파일 저장 완료: {parquet_file}", day, day,
+                      start_time=persist_span.start_time, end_time=persist_span.end_time, result="성공")
+        except Exception as e:
+            print(f"[ERROR] Parquet 저장 실패: {e}")
+            log_to_db("Parquet 저장", "ERROR", "ALL", f"Parquet 저장 실패: {e}", day, day,
+                      start_time=persist_span.start_time, end_time=datetime.now(), result="실패")
+            failed_days.append(day)
+            continue
+
+        if out_queue is not None:
+            out_queue.put({"day": day, "parquet_file": parquet_file, "table": None if merged else table})
+    return failed_days
+
+
+def convert_pending_stage(out_queue):
+    """ (2) 저장 단계부터 이어서 실행: manifest의 변환 대기 CSV를 Parquet로 변환해 적재 단계로 넘김 (실패한 날짜 리스트 반환) """
+    failed_days = []
+    csv_files = pending_conversions()
+    register_csv_tickers(csv_files)
+    for csv_file in csv_files:
+        result = convert_csv_file(csv_file)
+        record_conversion(result)
+        if result["result"] != "성공":
+            print(f"[Error] {csv_file}: {result['error']}")
+            log_to_db("Parquet 변환", "ERROR", "ALL", f"오류 발생: {result['error']}", result["from_date"],
+                      result["to_date"], result["start_time"], result["end_time"], "실패")
+            failed_days.append(result["from_date"])
+            continue
+
+        log_to_db("Parquet 변환", "INFO", "ALL", f"변환 완료: {result['parquet_file']}", result["from_date"],
+                  result["to_date"], result["start_time"], result["end_time"], "성공")
+        if out_queue is not None:
+            out_queue.put({"day": result["from_date"], "parquet_file": result["parquet_file"], "table": None})
+    return failed_days
+
+
+def pending_loads_stage(out_queue):
+    """ (3) 적재 단계부터 이어서 실행: manifest의 적재 대기 Parquet 파일을 날짜순으로 넘김 """
+    for parquet_file in pending_loads():
+        out_queue.put({"day": day_of_path(parquet_file), "parquet_file": parquet_file, "table": None})
+
+
+def load_day(conn, item, mode=DEFAULT_MERGE_MODE):
+    """ 하루치 테이블(없으면 Parquet 파일)을 적재용 테이블에 COPY 후 stock_data에 upsert 하고 manifest에 기록 (성공 여부 반환) """
+    day, parquet_file, table = item["day"], item["parquet_file"], item["table"]
+    start_time = datetime.now()
+    try:
+        with span("load") as load_span:
+            create_staging_table(conn)
+            tables = iter_table_batches(table) if table is not None else iter_file_batches(parquet_file)
+            copied = copy_tables_to_staging(conn, tables, parquet_file)
+            ensure_partitions_for_table(conn, STAGING_TABLE)
+            ensure_unique_key(conn)
+            sync_ticker_table()
+            counts = merge_staging_to_target(conn, mode=mode)
+            conn.commit()
+
+        mark_status(parquet_file, "load", STATUS_DONE)
+        for result in ("inserted", "updated", "skipped"):
+            count("rows_loaded_total", counts[result], stage="load", result=result)
+        summary = f"COPY {copied}행, 추가 {counts['inserted']}행, 수정 {counts['updated']}행, 건너뜀 {counts['skipped']}행"
+        print(f"[INFO] {parquet_file} → stock_data: {summary}")
+        log_to_db("DB 적재", "INFO", "ALL", f"{parquet_file} 적재 완료 ({summary})", day, day,
+                  start_time=load_span.start_time, end_time=load_span.end_time, result="성공")
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"[Error] DB 적재 실패: {parquet_file}: {e}")
+        mark_status(parquet_file, "load", STATUS_FAILED, error=str(e))
+        log_to_db("DB 적재", "ERROR", "ALL", f"{parquet_file} 적재 실패: {e}", day, day, start_time=start_time,
+                  end_time=datetime.now(), result="실패")
+        return False
+
+
+def load_stage(in_queue, mode=DEFAULT_MERGE_MODE):
+    """
+    (3) 적재: 하나의 DB 연결로 하루치씩 적재 (날짜별로 커밋하므로 중간에 멈춰도 끝난 날짜는 manifest에 완료로 남음)
+
+    적재에 실패한 날짜 리스트를 반환한다.
+    """
+    failed_days = []
+    with get_connection() as conn:
+        create_stock_data_table(conn)
+        for item in iter_queue(in_queue):
+            if not load_day(conn, item, mode=mode):
+                failed_days.append(item["day"])
+    return failed_days
+
+
+def run_pipeline(tickers, from_date, to_date, from_stage="fetch", to_stage="features", workers=DEFAULT_WORKERS,
+                 max_rps=DEFAULT_MAX_RPS, incremental=None, mode=DEFAULT_MERGE_MODE, queue_days=QUEUE_DAYS):
+    """
+    수집 → 저장 → 적재 → 수정 계수 → 피처를 한 프로세스에서 실행 (성공 여부 반환)
+
+    수집/저장/적재는 각각 스레드로 동시에 실행하고 하루치 Arrow 테이블을 큐(최대 queue_days일)로 넘긴다.
+    from_stage / to_stage 로 실행할 단계 범위를 정한다. 저장/적재 단계부터 시작하면 manifest의 변환/적재 대기 파일을
+    입력으로 사용하므로 중단된 실행을 그 단계부터 이어서 처리할 수 있다.
+    """
+    stages = STAGES[STAGES.index(from_stage):STAGES.index(to_stage) + 1]
+    start_time = datetime.now()
+    log_to_db("파이프라인", "INFO", "ALL", f"파이프라인 시작 ({' → '.join(stages)})", from_date, to_date,
+              start_time=start_time, end_time=start_time, result="진행 중")
+
+    errors = []
+    threads = []
+    persisted = queue.Queue(maxsize=queue_days) if "load" in stages else None
+
+    if "fetch" in stages:
+        register(tickers)  # 수집 스레드를 시작하기 전에 새 종목의 ticker_id 를 정함
+        plan = plan_fetch(tickers, from_date, to_date, source=incremental) if incremental else None
+        fetched = queue.Queue(maxsize=queue_days)
+        threads.append(start_stage("fetch", lambda: fetch_stage(tickers, from_date, to_date, fetched, workers=workers,
+                                                                max_rps=max_rps, plan=plan), None, fetched, errors))
+        threads.append(start_stage("persist", lambda: persist_stage(fetched, persisted), fetched, persisted, errors))
+    elif "persist" in stages:
+        threads.append(start_stage("persist", lambda: convert_pending_stage(persisted), None, persisted, errors))
+    elif "load" in stages:
+        threads.append(start_stage("pending", lambda: pending_loads_stage(persisted), None, persisted, errors))
+
+    if "load" in stages:
+        threads.append(start_stage("load", lambda: load_stage(persisted, mode=mode), persisted, None, errors))
+
+    for thread in threads:
+        thread.join()
+
+    # 수정 계수/피처는 일별 Parquet 파일 전체 기준으로 바뀐 부분만 다시 계산하므로 앞 단계가 모두 끝난 뒤 실행
+    for stage, work in (("adjust", update_factors), ("features", build_features)):
+        if stage in stages and not errors:
+            try:
+                with span(stage):
+                    work()
+            except Exception as e:
+                errors.append(stage)
+                print(f"[ERROR] {stage} 단계 실패: {e}")
+                log_to_db("파이프라인", "ERROR", "ALL", f"{stage} 단계 실패: {e}", from_date, to_date,
+                          start_time=datetime.now(), end_time=datetime.now(), result="실패")
+
+    end_time = datetime.now()
+    if errors:
+        log_to_db("파이프라인", "ERROR", "ALL", f"파이프라인 실패 (실패 단계: {', '.join(errors)})", from_date, to_date,
+                  start_time=start_time, end_time=end_time, result="실패")
+    else:
+        log_to_db("파이프라인", "INFO", "ALL", "파이프라인 완료", from_date, to_date, start_time=start_time,
+                  end_time=end_time, result="성공")
+    print(f"[INFO] 파이프라인 {'실패' if errors else '완료'} (소요 시간: {end_time - start_time})")
+    return not errors
+
+
+if __name__ == "__main__":
+    yesterday = (datetime.today() - timedelta(days=1)).strftime("%Y-%m-%d")
+
+    parser = argparse.ArgumentParser(description="수집 → Parquet 저장 → DB 적재 → 수정 계수 → 피처를 한 번에 실행하는 프로그램")
+    parser.add_argument("--tickers", nargs="+", default=DEFAULT_TICKERS,
+                        help="조회할 종목 코드 리스트 (예: AAPL MSFT TSLA, all, exchange:KRX, group:us_top20)")
+    parser.add_argument("--from_date", type=str, default=yesterday, help="시작 날짜 (예: 2024-01-01, 기본: 어제)")
+    parser.add_argument("--to_date", type=str, default=yesterday, help="종료 날짜 (예: 2024-01-05, 기본: 어제)")
+    parser.add_argument("--from_stage", choices=STAGES, default=STAGES[0],
+                        help="이 단계부터 실행 (persist: 변환 대기 CSV부터, load: 적재 대기 Parquet부터 이어서 처리)")
+    parser.add_argument("--to_stage", choices=STAGES[1:], default=STAGES[-1], help="이 단계까지 실행")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="종목 동시 요청 스레드 수 (1이면 순차 실행)")
+    parser.add_argument("--max-rps", dest="max_rps", type=float, default=DEFAULT_MAX_RPS,
+                        help="초당 최대 요청 수 (0 이하이면 제한 없음)")
+    parser.add_argument("--incremental", choices=["parquet", "db"],
+                        help="이미 저장된 (날짜, 종목)은 건너뛰고 빠진 것만 수집 (확인 위치: parquet 또는 db)")
+    parser.add_argument("--on_conflict", choices=MERGE_MODES, default=DEFAULT_MERGE_MODE,
+                        help="이미 있는 (date, ticker) 처리 방식 (nothing: 건너뜀, update: 수정 주가 덮어쓰기)")
+    parser.add_argument("--queue_days", type=int, default=QUEUE_DAYS, help="단계 사이에 쌓아 둘 최대 일수")
+    args = parser.parse_args()
+    args.tickers = select_tickers(args.tickers)
+
+    if STAGES.index(args.from_stage) > STAGES.index(args.to_stage):
+        parser.error("--from_stage 가 --to_stage 보다 뒤 단계임")
+
+    create_log_tables_if_not_exists()
+    run_started_at = datetime.now()
+
+    success = run_pipeline(args.tickers, datetime.strptime(args.from_date, "%Y-%m-%d").date(),
+                           datetime.strptime(args.to_date, "%Y-%m-%d").date(), from_stage=args.from_stage,
+                           to_stage=args.to_stage, workers=args.workers, max_rps=args.max_rps,
+                           incremental=args.incremental, mode=args.on_conflict, queue_days=args.queue_days)
+    export_metrics("pipeline", run_started_at)
+    sys.exit(0 if success else 1)
+
+
+"""
+# 어제 데이터 수집 → parquet/ 저장 → stock_data 적재 → 수정 계수 → 피처 (run_stock_processing.sh 에서 사용)
+python pipeline.py
+# 기간/종목 지정, 8개 스레드로 수집
+python pipeline.py --tickers AAPL MSFT --from_date 2025-01-14 --to_date 2025-01-22 --workers 8
+# 한국 종목만 (종목 목록 tickers.csv 의 거래소 기준)
+python pipeline.py --tickers exchange:KRX exchange:KOSDAQ
+# 중단된 실행 이어서: 적재 대기 파일부터 적재 → 수정 계수 → 피처
+python pipeline.py --from_stage load
+# 수집/저장만 (DB 적재 이후 생략)
+python pipeline.py --to_stage persist
+"""
@@ -0,0 +1,294 @@
+import argparse
+import re
+from datetime import date, datetime
+from db_config import get_connection
+
+DEFAULT_TABLE = "stock_data"
+INTRADAY_TABLE = "stock_intraday"
+GRANULARITIES = ["month", "year"]
+DEFAULT_GRANULARITY = "month"
+
+# 적재 범위 이후로 미리 만들어 둘 파티션 개수
+DEFAULT_AHEAD = 1
+
+# 테이블별 파티션 키 컬럼 (TIMESTAMPTZ 컬럼은 UTC 자정 기준으로 나눔)
+PARTITION_COLUMNS = {
+    DEFAULT_TABLE: "date",
+    INTRADAY_TABLE: "ts",
+}
+TIMESTAMP_PARTITION_TABLES = {INTRADAY_TABLE}
+
+# pg_get_expr(relpartbound) 결과에서 범위 추출 (예: FOR VALUES FROM ('2025-01-01') TO ('2025-02-01'))
+PARTITION_BOUND_PATTERN = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def create_stock_data_table(conn, table=DEFAULT_TABLE):
+    """
+    date 기준 RANGE 파티션 테이블(stock_data)과 인덱스 생성
+
+    파티션은 ensure_partitions()로 적재할 날짜 범위에 맞춰 만든다. 부모 테이블에 만든 인덱스는 각 파티션에 자동으로 생성된다.
+    """
+    cur = conn.cursor()
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            date DATE NOT NULL,
+            ticker VARCHAR(20) NOT NULL,
+            ticker_id INTEGER,
+            open NUMERIC,
+            high NUMERIC,
+            low NUMERIC,
+            close NUMERIC,
+            volume BIGINT,
+            dividends NUMERIC,
+            stock_splits NUMERIC,
+            PRIMARY KEY (date, ticker)
+        ) PARTITION BY RANGE (date);
+    """)
+    # ticker_id 가 생기기 전에 만든 테이블 (빈 값은 python ticker_registry.py --backfill 로 채움)
+    cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS ticker_id INTEGER;")
+    # 종목별 기간 조회용 (부모 테이블 인덱스 → 모든 파티션에 자동 생성)
+    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ticker_date ON {table} (ticker, date);")
+    conn.commit()
+    cur.close()
+
+
+def create_intraday_table(conn, table=INTRADAY_TABLE):
+    """
+    분/시간 봉 테이블(stock_intraday) 생성 - 키: (ts, ticker, interval), ts 기준 RANGE 파티션
+
+    일봉보다 행이 수백 배 많으므로 stock_data와 분리하고, 파티션은 ensure_partitions()로 UTC 월 단위로 만든다.
+    """
+    cur = conn.cursor()
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            ts TIMESTAMPTZ NOT NULL,
+            ticker VARCHAR(20) NOT NULL,
+            interval VARCHAR(5) NOT NULL,
+            open NUMERIC,
+            high NUMERIC,
+            low NUMERIC,
+            close NUMERIC,
+            volume BIGINT,
+            PRIMARY KEY (ts, ticker, interval)
+        ) PARTITION BY RANGE (ts);
+    """)
+    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ticker_ts ON {table} (ticker, interval, ts);")
+    conn.commit()
+    cur.close()
+
+
+def partition_bound(day, table=DEFAULT_TABLE):
+    """ 파티션 경계 값 (TIMESTAMPTZ 파티션은 세션 시간대와 관계없이 UTC 자정) """
+    return f"{day} 00:00:00+00" if table in TIMESTAMP_PARTITION_TABLES else str(day)
+
+
+def is_partitioned(conn, table=DEFAULT_TABLE):
+    """ 테이블이 파티션 테이블인지 확인 (테이블이 없으면 None) """
+    cur = conn.cursor()
+    cur.execute("SELECT relkind FROM pg_class WHERE relname = %s AND relkind IN ('r', 'p') AND pg_table_is_visible(oid);",
+                (table,))
+    row = cur.fetchone()
+    cur.close()
+    return None if row is None else row[0] == "p"
+
+
+def period_start(day, granularity=DEFAULT_GRANULARITY):
+    """ 날짜가 속한 파티션의 시작일 """
+    return date(day.year, 1, 1) if granularity == "year" else date(day.year, day.month, 1)
+
+
+def next_period(start, granularity=DEFAULT_GRANULARITY):
+    """ 다음 파티션의 시작일 """
+    if granularity == "year":
+        return date(start.year + 1, 1, 1)
+    return date(start.year + 1, 1, 1) if start.month == 12 else date(start.year, start.month + 1, 1)
+
+
+def partition_name(start, table=DEFAULT_TABLE, granularity=DEFAULT_GRANULARITY):
+    """ 파티션 테이블 이름 (예: stock_data_y2025m01, stock_data_y2025) """
+    return f"{table}_y{start:%Y}" if granularity == "year" else f"{table}_y{start:%Y}m{start:%m}"
+
+
+def list_partitions(conn, table=DEFAULT_TABLE):
+    """ 현재 붙어 있는 파티션 목록 [(이름, 시작일, 종료일(미포함))] """
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s AND pg_table_is_visible(parent.oid)
+        ORDER BY child.relname;
+    """, (table,))
+    partitions = []
+    for name, bound in cur.fetchall():
+        match = PARTITION_BOUND_PATTERN.search(bound or "")
+        if match:
+            start, end = (date.fromisoformat(value[:10]) for value in match.groups())
+            partitions.append((name, start, end))
+        else:
+            partitions.append((name, None, None))   # DEFAULT 파티션 등
+    cur.close()
+    return partitions
+
+
+def ensure_partitions(conn, from_date, to_date, table=DEFAULT_TABLE, granularity=DEFAULT_GRANULARITY,
+                      ahead=DEFAULT_AHEAD):
+    """
+    from_date ~ to_date 를 덮는 파티션 + 이후 ahead개 파티션을 미리 생성 (이미 있거나 기존 파티션과 겹치는 구간은 건너뜀)
+
+    커밋은 호출한 쪽에서 한다. (적재 중에는 COPY/병합과 같은 트랜잭션이라 병합이 실패해 롤백하면 파티션 생성도 함께 취소)
+
+    :return: 새로 만든 파티션 이름 리스트
+    """
+    if not is_partitioned(conn, table):
+        print(f"[WARN] {table} 는 파티션 테이블이 아니므로 파티션을 만들지 않음 (schema_manager.py --migrate 참고)")
+        return []
+
+    existing = [(start, end) for _, start, end in list_partitions(conn, table) if start is not None]
+
+    start = period_start(from_date, granularity)
+    last = period_start(to_date, granularity)
+    for _ in range(ahead):
+        last = next_period(last, granularity)
+
+    created = []
+    cur = conn.cursor()
+    while start <= last:
+        end = next_period(start, granularity)
+        if not any(start < existing_end and existing_start < end for existing_start, existing_end in existing):
+            name = partition_name(start, table, granularity)
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table}
+                FOR VALUES FROM ('{partition_bound(start, table)}') TO ('{partition_bound(end, table)}');
+            """)
+            existing.append((start, end))
+            created.append(name)
+        start = end
+    cur.close()
+
+    if created:
+        print(f"[INFO] 파티션 생성: {', '.join(created)}")
+    return created
+
+
+def ensure_partitions_for_table(conn, source_table, table=DEFAULT_TABLE, granularity=DEFAULT_GRANULARITY):
+    """ 적재용 테이블(source_table)에 들어 있는 날짜 범위에 맞춰 파티션 생성 (커밋은 호출한 쪽에서) """
+    column = PARTITION_COLUMNS.get(table, "date")
+    if table in TIMESTAMP_PARTITION_TABLES:
+        column = f"({column} AT TIME ZONE 'UTC')::DATE"
+
+    cur = conn.cursor()
+    cur.execute(f"SELECT MIN({column}), MAX({column}) FROM {source_table};")
+    from_date, to_date = cur.fetchone()
+    cur.close()
+
+    if from_date is None:
+        return []
+    return ensure_partitions(conn, from_date, to_date, table=table, granularity=granularity)
+
+
+def detach_partition(conn, name, table=DEFAULT_TABLE):
+    """ 파티션을 부모 테이블에서 분리 (데이터는 독립 테이블로 남음, 보관/백업/삭제용) """
+    cur = conn.cursor()
+    cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name};")
+    conn.commit()
+    cur.close()
+    print(f"[INFO] 파티션 분리: {name}")
+
+
+def attach_partition(conn, name, from_date, to_date, table=DEFAULT_TABLE):
+    """ 독립 테이블(name)을 from_date ~ to_date(미포함) 범위의 파티션으로 다시 붙임 """
+    cur = conn.cursor()
+    cur.execute(f"""
+        ALTER TABLE {table} ATTACH PARTITION {name}
+        FOR VALUES FROM ('{partition_bound(from_date, table)}') TO ('{partition_bound(to_date, table)}');
+    """)
+    conn.commit()
+    cur.close()
+    print(f"[INFO] 파티션 연결: {name} ({from_date} ~ {to_date})")
+
+
+def migrate_to_partitioned(conn, table=DEFAULT_TABLE, granularity=DEFAULT_GRANULARITY):
+    """
+    파티션이 없는 기존 stock_data 를 파티션 테이블로 옮김
+
+    기존 테이블은 {table}_legacy 로 이름을 바꿔 남겨 두고, 데이터 범위만큼 파티션을 만든 뒤 복사한다.
+    """
+    if is_partitioned(conn, table) is not False:
+        print(f"[INFO] {table} 는 이미 파티션 테이블이거나 없음")
+        return
+
+    legacy = f"{table}_legacy"
+    cur = conn.cursor()
+    cur.execute(f"ALTER TABLE {table} RENAME TO {legacy};")
+    cur.execute(f"ALTER INDEX IF EXISTS {table}_date_ticker_key RENAME TO {legacy}_date_ticker_key;")
+    conn.commit()
+    cur.close()
+
+    create_stock_data_table(conn, table)
+    ensure_partitions_for_table(conn, legacy, table=table, granularity=granularity)
+
+    cur = conn.cursor()
+    # ticker_id 가 생기기 전에 만든 테이블이면 빈 열을 추가해서 같은 INSERT 로 옮김 (빈 값은 --backfill 로 채움)
+    cur.execute(f"ALTER TABLE {legacy} ADD COLUMN IF NOT EXISTS ticker_id INTEGER;")
+    cur.execute(f"""
+        INSERT INTO {table} (date, ticker, ticker_id, open, high, low, close, volume, dividends, stock_splits)
+        SELECT date, ticker, ticker_id, open, high, low, close, volume, dividends, stock_splits FROM {legacy}
+        WHERE date IS NOT NULL AND ticker IS NOT NULL
+        ON CONFLICT (date, ticker) DO NOTHING;
+    """)
+    moved = cur.rowcount
+    conn.commit()
+    cur.close()
+    print(f"[INFO] {legacy} → {table} 이동 완료 ({moved}행)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="stock_data / stock_intraday 파티션 관리 프로그램")
+    parser.add_argument("--table", choices=[DEFAULT_TABLE, INTRADAY_TABLE], default=DEFAULT_TABLE, help="대상 테이블")
+    parser.add_argument("--from_date", type=str, help="파티션 시작 날짜 (예: 2020-01-01)")
+    parser.add_argument("--to_date", type=str, help="파티션 종료 날짜 (예: 2025-12-31)")
+    parser.add_argument("--granularity", choices=GRANULARITIES, default=DEFAULT_GRANULARITY, help="파티션 단위")
+    parser.add_argument("--list", action="store_true", help="파티션 목록 출력")
+    parser.add_argument("--detach", type=str, help="분리할 파티션 이름")
+    parser.add_argument("--attach", type=str, help="붙일 테이블 이름 (--from_date, --to_date(미포함) 필요)")
+    parser.add_argument("--migrate", action="store_true", help="파티션 없는 기존 stock_data 를 파티션 테이블로 이동")
+    args = parser.parse_args()
+
+    with get_connection() as conn:
+        if args.table == INTRADAY_TABLE:
+            create_intraday_table(conn)
+        elif args.migrate:
+            migrate_to_partitioned(conn, granularity=args.granularity)
+        else:
+            create_stock_data_table(conn)
+
+        if args.detach:
+            detach_partition(conn, args.detach, table=args.table)
+        elif args.attach:
+            attach_partition(conn, args.attach, args.from_date, args.to_date, table=args.table)
+        elif args.from_date and args.to_date:
+            ensure_partitions(conn, datetime.strptime(args.from_date, "%Y-%m-%d").date(),
+                              datetime.strptime(args.to_date, "%Y-%m-%d").date(), table=args.table,
+                              granularity=args.granularity)
+            conn.commit()
+
+        if args.list:
+            for name, start, end in list_partitions(conn, table=args.table):
+                print(f"{name}: {start} ~ {end}")
+
+
+"""
+# 2020~2025년 월 단위 파티션 생성
+python schema_manager.py --from_date 2020-01-01 --to_date 2025-12-31
+# 파티션 목록
+python schema_manager.py --list
+# 오래된 파티션 분리 / 다시 연결
+python schema_manager.py --detach stock_data_y2020m01
+python schema_manager.py --attach stock_data_y2020m01 --from_date 2020-01-01 --to_date 2020-02-01
+# 분/시간 봉 테이블(stock_intraday) 생성 및 파티션 목록
+python schema_manager.py --table stock_intraday --list
+# 기존(파티션 없는) stock_data 를 파티션 테이블로 이동
+python schema_manager.py --migrate
+"""
@@ -0,0 +1,343 @@
+import io                                   # COPY로 보낼 메모리 버퍼
+import os
+from datetime import datetime
+import numpy as np                          # COPY 바이너리 형식 직렬화 (컬럼 단위 벡터 연산)
+import pyarrow as pa
+import pyarrow.csv as pacsv                 # Arrow 배치를 COPY용 CSV로 직렬화
+import pyarrow.parquet as pq                # Parquet 파일을 row group/배치 단위로 읽기
+from db_config import get_connection
+from db_logger import log_to_db
+from archive_manifest import STATUS_DONE, STATUS_FAILED, day_of_path, mark_status
+from metrics import count, span
+from data_quality import validated          # 적재 전 데이터 검증 (실패한 행은 quarantine/ 에 격리)
+from schema_manager import ensure_partitions_for_table
+from parquet_store import iter_csv_tables, normalize_table, register_csv_tickers
+from ticker_registry import sync_ticker_table  # 종목 목록 → stock_ticker (ticker_id 조인용)
+
+STAGING_TABLE = "stock_data_staging"   # COPY 대상 임시(세션) 테이블
+
+# 한 번에 읽어서 COPY로 보낼 최대 행 수 (파일 크기와 관계없이 메모리 사용량을 이 범위로 제한)
+COPY_BATCH_ROWS = 50_000
+
+# COPY ... (FORMAT binary) 헤더/끝 표시 및 DATE 기준일 (PostgreSQL DATE = 2000-01-01 이후 일 수)
+PG_COPY_HEADER = np.frombuffer(b"PGCOPY\n\xff\r\n\x00" + b"\x00" * 8, dtype=np.uint8)
+PG_COPY_TRAILER = np.array([0xFF, 0xFF], dtype=np.uint8)
+PG_EPOCH_DAYS = 10957
+
+# Arrow 타입 → (COPY 바이너리 값 타입, 바이트 수) (적재용 테이블 컬럼 타입과 같아야 함: DATE / INTEGER / BIGINT / DOUBLE PRECISION)
+BINARY_TYPES = {
+    pa.date32(): (">i4", 4),
+    pa.int32(): (">i4", 4),
+    pa.int64(): (">i8", 8),
+    pa.float64(): (">f8", 8),
+}
+
+# upsert 모드: nothing (기존 행 유지) / update (값이 바뀐 행 덮어쓰기)
+MERGE_MODES = ["nothing", "update"]
+DEFAULT_MERGE_MODE = "nothing"
+
+# DB 컬럼 순서, upsert 키 및 Parquet(STOCK_SCHEMA) 컬럼 매핑
+DB_COLUMNS = ["date", "ticker", "ticker_id", "open", "high", "low", "close", "volume", "dividends", "stock_splits"]
+KEY_COLUMNS = ["date", "ticker"]
+SOURCE_COLUMNS = {
+    "date": "Trade Date",
+    "ticker_id": "Ticker ID",
+    "open": "Open",
+    "high": "High",
+    "low": "Low",
+    "close": "Close",
+    "volume": "Volume",
+    "dividends": "Dividends",
+    "stock_splits": "Stock Splits",
+}
+
+
+def create_staging_table(conn, staging_table=STAGING_TABLE, temporary=True, like_table=None):
+    """
+    타입이 지정된 적재용 테이블 생성 (이미 있으면 비움)
+
+    가격은 Parquet 의 float64 를 바이너리 COPY 로 그대로 받도록 DOUBLE PRECISION (stock_data 로 옮길 때 NUMERIC 으로 변환)
+
+    like_table을 주면 그 테이블과 같은 컬럼/타입으로 만든다. (예: stock_intraday)
+    """
+    cur = conn.cursor()
+    if like_table:
+        cur.execute(f"CREATE {'TEMP ' if temporary else ''}TABLE IF NOT EXISTS {staging_table} (LIKE {like_table});")
+        cur.execute(f"TRUNCATE {staging_table};")
+        cur.close()
+        return
+
+    cur.execute(f"""
+        CREATE {"TEMP " if temporary else ""}TABLE IF NOT EXISTS {staging_table} (
+            date DATE NOT NULL,
+            ticker VARCHAR(20) NOT NULL,
+            ticker_id INTEGER,
+            open DOUBLE PRECISION,
+            high DOUBLE PRECISION,
+            low DOUBLE PRECISION,
+            close DOUBLE PRECISION,
+            volume BIGINT,
+            dividends DOUBLE PRECISION,
+            stock_splits DOUBLE PRECISION
+        );
+    """)
+    cur.execute(f"TRUNCATE {staging_table};")
+    cur.close()
+
+
+def iter_file_batches(file_path, batch_rows=COPY_BATCH_ROWS):
+    """
+    Parquet/CSV 파일을 batch_rows 행씩 STOCK_SCHEMA 타입의 Arrow 테이블로 읽어서 반환 (generator)
+
+    Parquet는 row group 단위 배치로, CSV는 chunksize 단위로 읽으므로 파일 전체를 메모리에 올리지 않는다.
+    """
+    if file_path.endswith(".parquet"):
+        parquet = pq.ParquetFile(file_path)
+        for batch in parquet.iter_batches(batch_size=batch_rows):
+            yield normalize_table(pa.Table.from_batches([batch]))
+    else:
+        yield from iter_csv_tables(file_path, batch_rows)
+
+
+def to_db_table(table):
+    """ STOCK_SCHEMA 테이블을 DB 컬럼 이름/순서의 테이블로 변환 (date는 저장할 때 계산해 둔 거래소 현지 거래일) """
+    columns = {"ticker": table.column("Ticker").combine_chunks().dictionary_decode()}
+    for db_column, source_column in SOURCE_COLUMNS.items():
+        columns[db_column] = table.column(source_column)
+    return pa.table([columns[name] for name in DB_COLUMNS], names=DB_COLUMNS)
+
+
+def binary_field(column):
+    """
+    Arrow 컬럼 하나를 COPY 바이너리 형식 필드로 변환: (행별 필드 길이(길이 4바이트 포함), 버퍼에 쓰는 함수)
+
+    고정 길이 타입은 big-endian 값 배열을, 문자열은 Arrow 의 offsets/data 버퍼를 그대로 사용한다. (행 단위 반복 없음)
+    """
+    column = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    rows = len(column)
+
+    if pa.types.is_string(column.type):
+        if column.null_count:
+            raise ValueError("문자열 컬럼에 null 이 있음")
+        offsets = np.frombuffer(column.buffers()[1], dtype=np.int32)[column.offset:column.offset + rows + 1]
+        data = np.frombuffer(column.buffers()[2], dtype=np.uint8) if column.buffers()[2] else np.empty(0, np.uint8)
+        lengths = np.diff(offsets)
+
+        def write(buffer, positions):
+            buffer[positions[:, None] + np.arange(4)] = lengths.astype(">i4").view(np.uint8).reshape(rows, 4)
+            owners = np.repeat(np.arange(rows), lengths)
+            source = np.arange(offsets[0], offsets[-1])
+            buffer[positions[owners] + 4 + (source - offsets[:-1][owners])] = data[source]
+        return lengths.astype(np.int64) + 4, write
+
+    if column.type not in BINARY_TYPES:
+        raise ValueError(f"COPY 바이너리 형식으로 보낼 수 없는 타입: {column.type}")
+    dtype, width = BINARY_TYPES[column.type]
+    nulls = column.is_null().to_numpy(zero_copy_only=False)
+    values = column.fill_null(0) if column.null_count else column
+    if pa.types.is_date32(column.type):
+        values = np.asarray(values.cast(pa.int32()).to_numpy(), dtype=np.int64) - PG_EPOCH_DAYS
+    else:
+        values = values.to_numpy()
+    encoded = values.astype(dtype).view(np.uint8).reshape(rows, width)
+    prefix = np.where(nulls, -1, width).astype(">i4").view(np.uint8).reshape(rows, 4)
+
+    def write(buffer, positions):
+        buffer[positions[:, None] + np.arange(4)] = prefix
+        valid = ~nulls
+        buffer[positions[valid][:, None] + 4 + np.arange(width)] = encoded[valid]
+    return np.where(nulls, 4, 4 + width), write
+
+
+def binary_copy_buffer(db_table):
+    """
+    DB 컬럼 이름으로 된 Arrow 테이블을 COPY ... (FORMAT binary) 입력 바이트로 변환
+
+    DATE 는 2000-01-01 이후 일 수(int32), 가격은 float64 그대로 보내므로 PostgreSQL 이 문자열을 해석하지 않는다.
+    필드마다 행별 시작 위치를 계산해 한 번에 써 넣으므로 행 수와 관계없이 컬럼 수만큼의 벡터 연산으로 끝난다.
+    """
+    rows = db_table.num_rows
+    fields = [binary_field(column) for column in db_table.columns]
+    row_sizes = 2 + sum(sizes for sizes, _ in fields)
+    row_starts = len(PG_COPY_HEADER) + np.concatenate([[0], np.cumsum(row_sizes)[:-1]]).astype(np.int64)
+
+    buffer = np.empty(len(PG_COPY_HEADER) + int(row_sizes.sum()) + len(PG_COPY_TRAILER), dtype=np.uint8)
+    buffer[:len(PG_COPY_HEADER)] = PG_COPY_HEADER
+    buffer[row_starts[:, None] + np.arange(2)] = np.full(rows, len(fields), dtype=">i2").view(np.uint8).reshape(rows, 2)
+    positions = row_starts + 2
+    for sizes, write in fields:
+        write(buffer, positions)
+        positions = positions + sizes
+    buffer[-len(PG_COPY_TRAILER):] = PG_COPY_TRAILER
+    return buffer
+
+
+def copy_table(cur, db_table, staging_table=STAGING_TABLE, binary=False):
+    """
+    DB 컬럼 이름으로 된 Arrow 테이블 하나를 COPY ... FROM STDIN 으로 전송
+
+    binary=True 이면 바이너리 형식 (적재용 테이블 컬럼 타입이 BINARY_TYPES 와 맞아야 함), 아니면 CSV
+    """
+    if binary:
+        buffer = io.BytesIO(binary_copy_buffer(db_table).tobytes())
+        copy_format = "binary"
+    else:
+        buffer = io.BytesIO()
+        pacsv.write_csv(db_table, buffer, write_options=pacsv.WriteOptions(include_header=False))
+        buffer.seek(0)
+        copy_format = "csv"
+    cur.copy_expert(f"COPY {staging_table} ({', '.join(db_table.column_names)}) FROM STDIN WITH (FORMAT {copy_format})",
+                    buffer)
+
+
+def iter_table_batches(table, batch_rows=COPY_BATCH_ROWS):
+    """ 메모리에 있는 STOCK_SCHEMA 테이블을 batch_rows 행씩 나누어 반환 (복사 없이 slice) """
+    for offset in range(0, table.num_rows, batch_rows):
+        yield table.slice(offset, batch_rows)
+
+
+def copy_tables_to_staging(conn, tables, source, staging_table=STAGING_TABLE):
+    """
+    STOCK_SCHEMA 테이블 묶음(generator)을 검증한 뒤 통과한 행만 적재용 테이블에 COPY (적재한 행 수 반환, 커밋은 호출한 쪽에서)
+
+    source: 원본 일별 파일 경로 (격리 파일 이름과 검증 로그의 날짜에 사용)
+    """
+    rows = 0
+    cur = conn.cursor()
+    for table in validated(tables, source):
+        if table.num_rows:
+            copy_table(cur, to_db_table(table), staging_table, binary=True)
+            rows += table.num_rows
+    cur.close()
+    return rows
+
+
+def copy_file_to_staging(conn, file_path, staging_table=STAGING_TABLE, batch_rows=COPY_BATCH_ROWS):
+    """ 파일을 배치 단위로 적재용 테이블에 COPY (적재한 행 수 반환, 커밋은 호출한 쪽에서) """
+    return copy_tables_to_staging(conn, iter_file_batches(file_path, batch_rows), file_path, staging_table)
+
+
+def ensure_unique_key(conn, target_table="stock_data", key_columns=KEY_COLUMNS):
+    """ ON CONFLICT (키 컬럼) 에 필요한 유니크 인덱스가 없으면 생성 (기본: (date, ticker)) """
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indrelid
+        WHERE c.relname = %s AND pg_table_is_visible(c.oid)
+          AND i.indisunique
+          AND (SELECT array_agg(a.attname::TEXT ORDER BY a.attname)
+               FROM pg_attribute a
+               WHERE a.attrelid = c.oid AND a.attnum = ANY(i.indkey)) = %s::TEXT[];
+    """, (target_table, sorted(key_columns)))
+    if cur.fetchone() is None:
+        cur.execute(f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS {target_table}_{"_".join(key_columns)}_key
+            ON {target_table} ({", ".join(key_columns)});
+        """)
+    cur.close()
+
+
+def merge_staging_to_target(conn, staging_table=STAGING_TABLE, target_table="stock_data", mode=DEFAULT_MERGE_MODE,
+                            db_columns=DB_COLUMNS, key_columns=KEY_COLUMNS):
+    """
+    적재용 테이블의 행을 target_table에 upsert (ON CONFLICT (key_columns), 기본: (date, ticker))
+
+    :param mode: 'nothing' - 이미 있는 키는 건너뜀
+                 'update'  - 값이 달라진 행(수정 주가 등)은 덮어씀, 같은 값이면 건너뜀
+    :param db_columns: 적재할 컬럼 목록
+    :param key_columns: upsert 키 컬럼 목록
+    :return: {"inserted": 추가 행 수, "updated": 수정 행 수, "skipped": 건너뛴 행 수}
+    """
+    if mode not in MERGE_MODES:
+        raise ValueError(f"알 수 없는 merge 모드: {mode}")
+
+    value_columns = [column for column in db_columns if column not in key_columns]
+    columns = ", ".join(db_columns)
+    keys = ", ".join(key_columns)
+
+    if mode == "update":
+        conflict_action = f"""
+            DO UPDATE SET {", ".join(f"{column} = EXCLUDED.{column}" for column in value_columns)}
+            WHERE ({", ".join(f"{target_table}.{column}" for column in value_columns)})
+                IS DISTINCT FROM ({", ".join(f"EXCLUDED.{column}" for column in value_columns)})
+        """
+    else:
+        conflict_action = "DO NOTHING"
+
+    # 모든 CTE는 같은 스냅샷을 보므로 existing은 upsert 이전의 기존 행 수
+    # (파티션 테이블은 RETURNING 에서 xmax 를 읽을 수 없어 기존 행 수로 추가/수정 건수를 구분)
+    cur = conn.cursor()
+    cur.execute(f"""
+        WITH source AS (
+            SELECT DISTINCT ON ({keys}) {columns}
+            FROM {staging_table}
+            ORDER BY {keys}
+        ),
+        existing AS (
+            SELECT COUNT(*) AS count
+            FROM source s
+            JOIN {target_table} t ON {" AND ".join(f"t.{key} = s.{key}" for key in key_columns)}
+        ),
+        merged AS (
+            INSERT INTO {target_table} ({columns})
+            SELECT {columns} FROM source
+            ON CONFLICT ({keys}) {conflict_action}
+            RETURNING 1
+        )
+        SELECT
+            (SELECT COUNT(*) FROM source),
+            (SELECT count FROM existing),
+            (SELECT COUNT(*) FROM merged);
+    """)
+    total, existing, merged = cur.fetchone()
+    cur.close()
+
+    inserted = total - existing
+    return {"inserted": inserted, "updated": merged - inserted, "skipped": total - merged}
+
+
+def load_file_to_db(file_path, target_table="stock_data", batch_rows=COPY_BATCH_ROWS, mode=DEFAULT_MERGE_MODE):
+    """
+    Parquet/CSV 파일을 COPY로 적재용 테이블에 올린 뒤 target_table에 upsert (외부 프로세스/임시 CSV 없음)
+
+    :param file_path: 적재할 Parquet 또는 CSV 파일 경로
+    :param target_table: 최종 저장할 PostgreSQL 테이블명
+    :param mode: upsert 모드 ('nothing' 또는 'update')
+    :return: 성공 여부
+    """
+    start_time = datetime.now()
+    file_date = day_of_path(file_path)  # 로그의 from_date / to_date (일별 파일명이 아니면 None)
+
+    if not os.path.exists(file_path):
+        print(f"[ERROR] 파일 없음: {file_path}")
+        log_to_db("DB 적재", "ERROR", "ALL", f"파일 없음: {file_path}", file_date, file_date, start_time=start_time,
+                  end_time=datetime.now(), result="실패")
+        return False
+
+    try:
+        if file_path.endswith(".csv"):
+            register_csv_tickers([file_path])
+        with span("load") as load_span, get_connection() as conn:
+            create_staging_table(conn)
+            copied = copy_file_to_staging(conn, file_path, batch_rows=batch_rows)
+            ensure_partitions_for_table(conn, STAGING_TABLE, table=target_table)
+            ensure_unique_key(conn, target_table)
+            sync_ticker_table()
+            counts = merge_staging_to_target(conn, target_table=target_table, mode=mode)
+            conn.commit()
+
+        mark_status(file_path, "load", STATUS_DONE)
+        for result in ("inserted", "updated", "skipped"):
+            count("rows_loaded_total", counts[result], stage="load", result=result)
+        summary = f"COPY {copied}행, 추가 {counts['inserted']}행, 수정 {counts['updated']}행, 건너뜀 {counts['skipped']}행"
+        print(f"[INFO] {file_path} → {target_table}: {summary}")
+        log_to_db("DB 적재", "INFO", "ALL", f"{file_path} 적재 완료 ({summary})", file_date, file_date,
+                  start_time=load_span.start_time, end_time=load_span.end_time, result="성공")
+        return True
+    except Exception as e:
+        print(f"[Error] DB 적재 실패: {file_path}: {e}")
+        mark_status(file_path, "load", STATUS_FAILED, error=str(e))
+        log_to_db("DB 적재", "ERROR", "ALL", f"{file_path} 적재 실패: {e}", file_date, file_date,
+                  start_time=start_time, end_time=datetime.now(), result="실패")
+        return False
@@ -0,0 +1,201 @@
+import argparse
+import os
+from datetime import datetime, timedelta
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds                # 파티션 데이터셋 조회 (경로/row group 통계 기반 필터)
+import pyarrow.parquet as pq
+from parquet_dataset import DATASET_FOLDERS, day_of_file, file_signature, list_day_files, load_state
+from parquet_store import DEFAULT_PARQUET_FOLDER, STOCK_SCHEMA, normalize_table, trade_dates
+from ticker_registry import select_tickers
+
+# 조회 대상
+#   - auto:    압축 데이터셋이 기간 내 일별 파일을 모두 반영하고 있으면 데이터셋, 아니면 일별 파일
+#   - parquet: parquet/YYYY/MM/ 일별 파일
+#   - month / ticker: parquet_dataset.py 로 만든 데이터셋
+SOURCES = ["auto", "parquet", "month", "ticker"]
+DEFAULT_SOURCE = "auto"
+
+KEY_COLUMNS = ["Date", "Ticker"]
+VALUE_COLUMNS = [field.name for field in STOCK_SCHEMA if field.name not in KEY_COLUMNS]
+
+
+def read_columns_for(columns):
+    """ 읽을 컬럼 (Date, Ticker 는 항상 포함, columns가 없으면 전체) """
+    if not columns:
+        return KEY_COLUMNS + VALUE_COLUMNS
+    unknown = [column for column in columns if column not in VALUE_COLUMNS + KEY_COLUMNS]
+    if unknown:
+        raise ValueError(f"알 수 없는 컬럼: {', '.join(unknown)} (사용 가능: {', '.join(VALUE_COLUMNS)})")
+    return KEY_COLUMNS + [column for column in columns if column not in KEY_COLUMNS]
+
+
+def day_files_in_range(from_date=None, to_date=None, root=DEFAULT_PARQUET_FOLDER):
+    """ 경로(파일명)의 날짜로 기간 밖 일별 파일을 걸러냄 (파일을 열지 않음) """
+    return [file_path for file_path in list_day_files(root)
+            if (from_date is None or day_of_file(file_path) >= from_date)
+            and (to_date is None or day_of_file(file_path) <= to_date)]
+
+
+def dataset_covers(layout, day_files):
+    """ 데이터셋 상태 파일에 day_files 가 모두 현재 내용(크기, 수정 시각) 그대로 반영되어 있는지 확인 """
+    sources = load_state(DATASET_FOLDERS[layout]).get("sources", {})
+    return bool(sources) and all(sources.get(file_path) == file_signature(file_path) for file_path in day_files)
+
+
+def choose_source(tickers, day_files):
+    """ auto 모드: 종목을 지정했으면 ticker, 아니면 month 데이터셋 순으로 최신인 것을 사용 """
+    layouts = ["ticker", "month"] if tickers else ["month"]
+    for layout in layouts:
+        if dataset_covers(layout, day_files):
+            return layout
+    return "parquet"
+
+
+def is_current_format(table):
+    """ 읽은 컬럼이 모두 STOCK_SCHEMA 와 같은 타입인지 (다르면 이전 형식 파일이므로 변환 필요) """
+    return all(STOCK_SCHEMA.get_field_index(field.name) >= 0 and field.type == STOCK_SCHEMA.field(field.name).type
+               for field in table.schema)
+
+
+def read_day_file(file_path, read_columns, filters):
+    """ 일별 파일에서 read_columns 만 읽음 (이전 형식 파일만 STOCK_SCHEMA 로 변환, 현재 형식은 그대로 반환) """
+    try:
+        table = pq.read_table(file_path, columns=read_columns, filters=filters)
+    except pa.ArrowInvalid:
+        # 이전 형식 파일에 없는 컬럼(Trade Date, Ticker ID)은 전체를 읽어 변환하면서 채움
+        table = pq.read_table(file_path, filters=filters)
+    if is_current_format(table) and table.schema.names == read_columns:
+        return table
+    if not table.num_rows:
+        return STOCK_SCHEMA.empty_table().select(read_columns)
+    return normalize_table(table).select(read_columns)
+
+
+def query_day_files(day_files, tickers, read_columns):
+    """ 일별 파일 조회 - 필요한 컬럼만 읽고 종목 조건은 row group 통계로 걸러냄 """
+    filters = [("Ticker", "in", list(tickers))] if tickers else None
+    tables = []
+    for file_path in day_files:
+        table = read_day_file(file_path, read_columns, filters)
+        if table.num_rows:
+            tables.append(table)
+    if not tables:
+        return STOCK_SCHEMA.empty_table().select(read_columns)
+    return pa.concat_tables(tables).unify_dictionaries().combine_chunks()
+
+
+def query_dataset(layout, tickers, from_date, to_date, read_columns):
+    """
+    데이터셋 조회 - 파티션 경로(year/month 또는 ticker)로 파일을 고르고, 종목/날짜 조건은 row group 통계로 걸러냄
+
+    월 파티션은 거래일 기준으로 나뉘어 있고, Date는 UTC이므로 거래소 시차(최대 하루)만큼 넓게 읽은 뒤 거래소 현지 거래일로 정확히 자름
+    """
+    dataset = ds.dataset(DATASET_FOLDERS[layout], format="parquet", partitioning="hive",
+                         exclude_invalid_files=True, ignore_prefixes=[".", "_"])
+
+    conditions = []
+    if tickers:
+        if layout == "ticker":
+            conditions.append(ds.field("ticker").isin(list(tickers)))
+        conditions.append(ds.field("Ticker").isin(list(tickers)))
+    if from_date:
+        if layout == "month":
+            conditions.append(ds.field("year") * 100 + ds.field("month") >= from_date.year * 100 + from_date.month)
+        conditions.append(ds.field("Date") >= pa.scalar(datetime.combine(from_date - timedelta(days=1), datetime.min.time()),
+                                                        type=pa.timestamp("ns", tz="UTC")))
+    if to_date:
+        if layout == "month":
+            conditions.append(ds.field("year") * 100 + ds.field("month") <= to_date.year * 100 + to_date.month)
+        conditions.append(ds.field("Date") < pa.scalar(datetime.combine(to_date + timedelta(days=2), datetime.min.time()),
+                                                       type=pa.timestamp("ns", tz="UTC")))
+
+    condition = None
+    for expression in conditions:
+        condition = expression if condition is None else condition & expression
+    table = dataset.to_table(columns=read_columns, filter=condition)
+
+    if from_date or to_date:
+        days = trade_dates(table)
+        keep = pa.array([True] * table.num_rows)
+        if from_date:
+            keep = pc.and_(keep, pc.greater_equal(days, pa.scalar(from_date, type=pa.date32())))
+        if to_date:
+            keep = pc.and_(keep, pc.less_equal(days, pa.scalar(to_date, type=pa.date32())))
+        table = table.filter(keep)
+    return table
+
+
+def query(tickers=None, from_date=None, to_date=None, columns=None, source=DEFAULT_SOURCE, root=DEFAULT_PARQUET_FOLDER):
+    """
+    Parquet 보관 데이터를 DB 없이 조회
+
+    :param tickers: 종목 코드 리스트 (None 이면 전체)
+    :param from_date: 시작 거래일 (date, 포함, None 이면 처음부터)
+    :param to_date: 종료 거래일 (date, 포함, None 이면 끝까지)
+    :param columns: 읽을 값 컬럼 (예: ['Close', 'Volume'], None 이면 전체), Date와 Ticker는 항상 포함
+    :param source: 조회 대상 ('auto', 'parquet', 'month', 'ticker')
+    :param root: 일별 Parquet 루트 폴더
+    :return: (Ticker, Date) 순으로 정렬된 Arrow 테이블
+    """
+    read_columns = read_columns_for(columns)
+
+    if source in ("auto", "parquet"):
+        day_files = day_files_in_range(from_date, to_date, root)
+        if source == "auto":
+            source = choose_source(tickers, day_files)
+
+    if source == "parquet":
+        table = query_day_files(day_files, tickers, read_columns)
+    else:
+        table = query_dataset(source, tickers, from_date, to_date, read_columns)
+
+    sort_keys = pa.table({"Ticker": table.column("Ticker").combine_chunks().dictionary_decode(),
+                          "Date": table.column("Date")})
+    return table.take(pc.sort_indices(sort_keys, sort_keys=[("Ticker", "ascending"), ("Date", "ascending")]))
+
+
+def query_df(tickers=None, from_date=None, to_date=None, columns=None, source=DEFAULT_SOURCE, root=DEFAULT_PARQUET_FOLDER):
+    """ query() 결과를 pandas 데이터프레임으로 반환 """
+    return query(tickers, from_date, to_date, columns, source, root).to_pandas()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parquet 주가 데이터 조회 프로그램")
+    parser.add_argument("--tickers", nargs="+", help="조회할 종목 코드 또는 exchange:KRX, group:us_top20 (없으면 전체)")
+    parser.add_argument("--from_date", type=str, help="시작 날짜 (예: 2020-01-01)")
+    parser.add_argument("--to_date", type=str, help="종료 날짜 (예: 2025-01-31)")
+    parser.add_argument("--columns", nargs="+", help=f"조회할 컬럼 ({', '.join(VALUE_COLUMNS)})")
+    parser.add_argument("--source", choices=SOURCES, default=DEFAULT_SOURCE, help="조회 대상")
+    parser.add_argument("--output", type=str, help="결과 저장 파일 (.csv 또는 .parquet, 없으면 화면 출력)")
+    args = parser.parse_args()
+
+    from_date = datetime.strptime(args.from_date, "%Y-%m-%d").date() if args.from_date else None
+    to_date = datetime.strptime(args.to_date, "%Y-%m-%d").date() if args.to_date else None
+
+    start_time = datetime.now()
+    result = query(select_tickers(args.tickers) if args.tickers else None, from_date, to_date, args.columns, args.source)
+    print(f"[INFO] {result.num_rows}행 조회 (소요 시간: {datetime.now() - start_time})")
+
+    if args.output and args.output.endswith(".parquet"):
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        pq.write_table(result, args.output)
+    elif args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        result.to_pandas().to_csv(args.output, index=False)
+    else:
+        with pd.option_context("display.max_rows", 20, "display.width", 200):
+            print(result.to_pandas())
+
+
+"""
+# AAPL 5년치 종가
+python stock_query.py --tickers AAPL --from_date 2020-01-01 --to_date 2024-12-31 --columns Close
+# 기간 내 전체 종목을 CSV로 저장
+python stock_query.py --from_date 2025-01-01 --to_date 2025-01-31 --output out/2025-01.csv
+# 압축 데이터셋이 최신이 아니어도 일별 파일에서 직접 조회
+python stock_query.py --tickers 005930.KS --source parquet
+# 코스닥 종목 전체 (종목 목록 tickers.csv 기준)
+python stock_query.py --tickers exchange:KOSDAQ --from_date 2025-01-01 --to_date 2025-01-31
+"""
@@ -0,0 +1,317 @@
+import argparse
+import contextlib
+import csv                                  # 종목 목록 파일(tickers.csv) 읽기/쓰기
+import fcntl                                # 여러 프로세스가 동시에 종목 목록 파일을 고치지 않도록 파일 잠금
+import glob
+import os
+import threading                            # 여러 스레드(병렬 수집)에서 새 종목 등록
+import numpy as np
+from psycopg2.extras import execute_values  # 종목 목록을 한 번의 INSERT로 DB에 반영
+from db_config import get_connection
+from market_calendar import EXCHANGES, exchange_for_ticker
+
+# 종목 목록 파일 (코드와 함께 관리, STOCK_TICKER_REGISTRY 환경 변수로 변경)
+# ticker_id 는 한 번 정해지면 바뀌지 않는 정수 키 (Parquet 의 Ticker ID, stock_data.ticker_id)
+# 새 종목은 수집/변환을 시작하는 쪽(부모 프로세스) 또는 --register 로만 등록하고, 저장 경로(ticker_ids)는 읽기만 한다.
+REGISTRY_FILE = os.environ.get("STOCK_TICKER_REGISTRY",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), "tickers.csv"))
+REGISTRY_COLUMNS = ["ticker_id", "ticker", "exchange", "currency", "calendar", "name", "korean_name", "groups", "active"]
+
+# 종목 목록을 옮겨 두는 DB 테이블 (stock_data.ticker_id 와 조인)
+TICKER_TABLE = "stock_ticker"
+
+# 거래소 → 거래 통화 (목록에 없는 종목을 자동 등록할 때 사용)
+EXCHANGE_CURRENCY = {
+    "NYSE": "USD",
+    "KRX": "KRW",
+    "KOSDAQ": "KRW",
+}
+
+# --tickers 선택자: all (활성 종목 전체), exchange:KRX, group:default
+ALL_SELECTOR = "all"
+EXCHANGE_PREFIX = "exchange:"
+GROUP_PREFIX = "group:"
+DEFAULT_GROUP = "default"
+
+registry_lock = threading.RLock()
+registry = None                     # 종목 코드 → 행(dict), 파일 순서 유지 (처음 사용할 때 읽음)
+synced_values = None                # 마지막으로 stock_ticker 에 커밋한 목록 내용 (바뀌었을 때만 다시 반영)
+
+
+def read_registry(file_path=None):
+    """ 종목 목록 파일을 {종목 코드: 행} 으로 읽음 (같은 종목이 여러 번 있으면 처음 행만 사용) """
+    file_path = file_path or REGISTRY_FILE
+    rows = {}
+    if not os.path.exists(file_path):
+        return rows
+
+    with open(file_path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            ticker = row["ticker"].strip()
+            if ticker in rows:
+                print(f"[INFO] 종목 목록 중복 무시: {ticker} (ticker_id {row['ticker_id']})")
+                continue
+            row["ticker"] = ticker
+            row["ticker_id"] = int(row["ticker_id"])
+            row["active"] = row.get("active", "1").strip() not in ("0", "false", "False", "")
+            rows[ticker] = row
+    return rows
+
+
+def write_registry(rows, file_path=None):
+    """ 종목 목록 파일 저장 (임시 파일에 쓴 뒤 교체) """
+    file_path = file_path or REGISTRY_FILE
+    with open(file_path + ".tmp", "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=REGISTRY_COLUMNS, lineterminator="\n")
+        writer.writeheader()
+        for row in rows.values():
+            writer.writerow({**row, "active": int(row["active"])})
+    os.replace(file_path + ".tmp", file_path)
+
+
+def load_registry():
+    """ 메모리에 올린 종목 목록 반환 (처음 한 번만 파일을 읽음) """
+    global registry
+    with registry_lock:
+        if registry is None:
+            registry = read_registry()
+        return registry
+
+
+def reload_registry():
+    """ 다른 프로세스가 등록한 종목까지 반영하도록 파일을 다시 읽음 (이미 넘겨준 dict 를 그대로 갱신) """
+    with registry_lock:
+        rows = load_registry()
+        rows.clear()
+        rows.update(read_registry())
+        return rows
+
+
+@contextlib.contextmanager
+def registry_file_lock():
+    """ 종목 목록 파일 읽기-수정-쓰기 구간 잠금 (스레드: registry_lock, 프로세스: 옆의 .lock 파일에 flock) """
+    with registry_lock, open(REGISTRY_FILE + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def new_row(ticker, ticker_id):
+    """ 목록에 없는 종목의 기본 행 (거래소는 종목 코드 접미사로 판별) """
+    exchange = exchange_for_ticker(ticker)
+    return {
+        "ticker_id": ticker_id,
+        "ticker": ticker,
+        "exchange": exchange,
+        "currency": EXCHANGE_CURRENCY.get(exchange, ""),
+        "calendar": EXCHANGES[exchange]["calendar"],
+        "name": "",
+        "korean_name": "",
+        "groups": "",
+        "active": True,
+    }
+
+
+def register(tickers):
+    """
+    목록에 없는 종목을 다음 ticker_id 로 추가하고 파일에 저장 (추가한 종목 수 반환)
+
+    다른 프로세스가 먼저 등록한 종목과 번호가 겹치지 않도록 파일 잠금 안에서 목록을 다시 읽은 뒤 번호를 정한다.
+    """
+    with registry_file_lock():
+        rows = reload_registry()
+        missing = [ticker for ticker in dict.fromkeys(tickers) if ticker not in rows]
+        if not missing:
+            return 0
+
+        next_id = max((row["ticker_id"] for row in rows.values()), default=0) + 1
+        for offset, ticker in enumerate(missing):
+            rows[ticker] = new_row(ticker, next_id + offset)
+        write_registry(rows)
+        print(f"[INFO] 종목 목록에 {len(missing)}개 추가: {', '.join(missing[:10])}{' ...' if len(missing) > 10 else ''}")
+        return len(missing)
+
+
+def ticker_ids(tickers):
+    """
+    종목 코드 리스트(중복 없는 값)에 대응하는 ticker_id 배열
+
+    목록에 없는 종목은 등록하지 않고 ValueError (병렬 변환 작업 프로세스가 각자 번호를 정하지 않도록,
+    등록은 작업을 시작하는 쪽의 register 또는 python ticker_registry.py --register 로 먼저 한다)
+    """
+    rows = load_registry()
+    if any(ticker not in rows for ticker in tickers):
+        rows = reload_registry()  # 부모 프로세스 등 다른 프로세스가 그 사이 등록했을 수 있음
+        missing = [ticker for ticker in tickers if ticker not in rows]
+        if missing:
+            raise ValueError(f"종목 목록({REGISTRY_FILE})에 없는 종목: {', '.join(missing[:10])}"
+                             f"{' ...' if len(missing) > 10 else ''} (python ticker_registry.py --register 로 먼저 등록)")
+    return np.array([rows[ticker]["ticker_id"] for ticker in tickers], dtype=np.int32)
+
+
+def select_tickers(selectors):
+    """
+    --tickers 값을 종목 코드 리스트로 변환 (입력 순서 유지, 중복 제거)
+
+    - all: 활성 종목 전체
+    - exchange:KRX / group:default: 해당 거래소 / 그룹의 활성 종목
+    - 그 외 값은 종목 코드 그대로 (목록에 없는 종목은 수집/저장할 때 자동 등록)
+    """
+    rows = load_registry()
+    selected = []
+    for selector in selectors:
+        if selector == ALL_SELECTOR:
+            selected.extend(ticker for ticker, row in rows.items() if row["active"])
+        elif selector.startswith(EXCHANGE_PREFIX):
+            exchange = selector[len(EXCHANGE_PREFIX):].upper()
+            selected.extend(ticker for ticker, row in rows.items() if row["active"] and row["exchange"] == exchange)
+        elif selector.startswith(GROUP_PREFIX):
+            group = selector[len(GROUP_PREFIX):]
+            selected.extend(ticker for ticker, row in rows.items() if row["active"] and group in row["groups"].split())
+        else:
+            selected.append(selector.strip())
+    return list(dict.fromkeys(selected))
+
+
+def import_names(csv_files):
+    """
+    예전 CSV(Ticker, Korean Name 컬럼)의 한글 종목명을 종목 목록에 옮김 (비어 있는 korean_name 만 채움)
+
+    목록에 없는 종목은 새로 등록한다. 채운 종목 수를 반환한다.
+    """
+    names = {}
+    for csv_file in csv_files:
+        with open(csv_file, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                if row.get("Korean Name"):
+                    names.setdefault(row["Ticker"].strip(), row["Korean Name"].strip())
+
+    register(list(names))
+    with registry_file_lock():
+        rows = reload_registry()
+        filled = 0
+        for ticker, korean_name in names.items():
+            if not rows[ticker]["korean_name"]:
+                rows[ticker]["korean_name"] = korean_name
+                filled += 1
+        if filled:
+            write_registry(rows)
+    return filled
+
+
+def sync_ticker_table(force=False):
+    """
+    종목 목록을 stock_ticker 테이블에 반영 (테이블이 없으면 생성, 별도 연결에서 바로 커밋)
+
+    적재 트랜잭션과 분리해서 커밋하므로 적재가 실패해 롤백되어도 반영한 종목은 남는다. (stock_data.ticker_id 가 항상
+    stock_ticker 에 있는 행을 가리킴) 다른 프로세스가 등록한 종목도 반영하도록 매번 파일을 다시 읽고,
+    마지막으로 커밋한 내용과 같으면 아무것도 하지 않는다.
+    """
+    global synced_values
+    with registry_lock:
+        rows = reload_registry()
+        values = [(row["ticker_id"], row["ticker"], row["exchange"], row["currency"], row["calendar"],
+                   row["name"] or None, row["korean_name"] or None, row["groups"].split(), row["active"])
+                  for row in rows.values()]
+        if values == synced_values and not force:
+            return
+
+    with get_connection() as conn:
+        write_ticker_table(conn, values)
+        conn.commit()
+    with registry_lock:
+        synced_values = values
+
+
+def write_ticker_table(conn, values):
+    """ stock_ticker 테이블 생성 후 종목 행 upsert (커밋은 호출한 쪽에서) """
+    cur = conn.cursor()
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TICKER_TABLE} (
+            ticker_id INTEGER PRIMARY KEY,
+            ticker VARCHAR(20) NOT NULL UNIQUE,
+            exchange VARCHAR(10) NOT NULL,
+            currency VARCHAR(3),
+            calendar VARCHAR(10),
+            name TEXT,
+            korean_name TEXT,
+            groups TEXT[],
+            active BOOLEAN NOT NULL DEFAULT TRUE
+        );
+    """)
+    if values:
+        execute_values(cur, f"""
+            INSERT INTO {TICKER_TABLE} (ticker_id, ticker, exchange, currency, calendar, name, korean_name, groups, active)
+            VALUES %s
+            ON CONFLICT (ticker_id) DO UPDATE SET
+                ticker = EXCLUDED.ticker, exchange = EXCLUDED.exchange, currency = EXCLUDED.currency,
+                calendar = EXCLUDED.calendar, name = EXCLUDED.name, korean_name = EXCLUDED.korean_name,
+                groups = EXCLUDED.groups, active = EXCLUDED.active;
+        """, values)
+    cur.close()
+
+
+def backfill_ticker_ids(conn, table="stock_data"):
+    """ ticker_id 가 비어 있는 기존 행을 stock_ticker 로 채움 (채운 행 수 반환) """
+    cur = conn.cursor()
+    cur.execute(f"""
+        UPDATE {table} s SET ticker_id = t.ticker_id
+        FROM {TICKER_TABLE} t
+        WHERE s.ticker = t.ticker AND s.ticker_id IS NULL;
+    """)
+    updated = cur.rowcount
+    cur.close()
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="종목 목록(tickers.csv) 확인 및 DB(stock_ticker) 반영 프로그램")
+    parser.add_argument("--tickers", nargs="+", default=[ALL_SELECTOR],
+                        help="출력할 종목 (예: all, exchange:KRX, group:default, AAPL)")
+    parser.add_argument("--register", nargs="+", metavar="TICKER", help="목록에 없는 종목 등록 (예: NFLX 035720.KS)")
+    parser.add_argument("--import_names", nargs="+", metavar="CSV_FOLDER",
+                        help="예전 CSV 폴더에서 한글 종목명(Korean Name)을 가져옴 (예: exe/data)")
+    parser.add_argument("--sync_db", action="store_true", help="stock_ticker 테이블에 반영")
+    parser.add_argument("--backfill", action="store_true", help="stock_ticker 반영 후 stock_data 의 빈 ticker_id 채움")
+    args = parser.parse_args()
+
+    if args.register:
+        print(f"[INFO] 종목 {register(args.register)}개 등록")
+
+    if args.import_names:
+        csv_files = sorted(file_path for folder in args.import_names
+                           for file_path in glob.glob(os.path.join(folder, "**", "*.csv"), recursive=True))
+        print(f"[INFO] 한글 종목명 {import_names(csv_files)}개 추가 (CSV {len(csv_files)}개)")
+
+    if args.sync_db or args.backfill:
+        sync_ticker_table(force=True)
+        print(f"[INFO] {TICKER_TABLE} 반영 완료 (종목 {len(load_registry())}개)")
+        if args.backfill:
+            with get_connection() as conn:
+                print(f"[INFO] stock_data ticker_id {backfill_ticker_ids(conn)}행 채움")
+                conn.commit()
+
+    rows = load_registry()
+    selected = select_tickers(args.tickers)
+    print(f"[INFO] 종목 {len(selected)}개 ({REGISTRY_FILE})")
+    for ticker in selected:
+        row = rows.get(ticker)
+        if row is None:
+            print(f"{'-':>5} {ticker:<12} (목록에 없음)")
+            continue
+        print(f"{row['ticker_id']:>5} {ticker:<12} {row['exchange']:<7} {row['currency']:<4} {row['groups']:<20} "
+              f"{row['korean_name'] or row['name']}")
+
+
+"""
+# 종목 목록 확인 (전체 / 거래소 / 그룹)
+python ticker_registry.py
+python ticker_registry.py --tickers exchange:KOSDAQ
+python ticker_registry.py --tickers group:us_top20
+# 새 종목 등록 (수집/변환은 목록에 없는 종목을 자동으로 등록하지 않음)
+python ticker_registry.py --register NFLX 035720.KS
+# 예전 CSV 의 한글 종목명 가져오기 + DB(stock_ticker) 반영 + 기존 stock_data 의 ticker_id 채우기
+python ticker_registry.py --import_names exe/data --backfill
+"""